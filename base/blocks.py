@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.core.cache import cache
+
 from wagtail.blocks import (
     CharBlock,
     ChoiceBlock,
@@ -15,9 +18,56 @@ from wagtail.documents.blocks import DocumentChooserBlock
 from wagtail.embeds.blocks import EmbedBlock
 from wagtail.images.blocks import ImageChooserBlock
 
+from base.cache import (
+    get_block_cache_key,
+    get_block_value_digest,
+    incr_block_cache_counter,
+    is_block_cache_enabled,
+)
+
 from .struct_values import LinkStructValue, RatingsStructValue
 
 
+class CachedBlockMixin:
+    """
+    Mixin that caches the rendered html of a block across pages and requests.
+
+    The key is a hash of the raw value of the block so an unchanged block (ex: the same
+    link tabs on many stations) is rendered once and reused everywhere. Only use it on
+    blocks whose templates don't depend on the parent context (request, page etc.)
+    """
+
+    def render(self, value, context=None):
+        if not is_block_cache_enabled():
+            return super().render(value, context=context)
+
+        key = get_block_cache_key(self, value)
+        html = cache.get(key)
+
+        if html is not None:
+            incr_block_cache_counter("hit")
+            return html
+
+        incr_block_cache_counter("miss")
+        html = super().render(value, context=context)
+        cache.set(key, html, timeout=getattr(settings, "BLOCK_CACHE_TIMEOUT", None))
+
+        return html
+
+
+class TabsBlockMixin:
+    """
+    Mixin for blocks rendered as bootstrap tabs which need unique dom ids to link each tab
+    to its pane. The ids are derived from the content of the block so the html is the same
+    on every render and two different tab blocks on a page never clash.
+    """
+
+    def get_context(self, value, parent_context=None):
+        context = super().get_context(value, parent_context=parent_context)
+        context["tabs_id"] = f"tabs-{get_block_value_digest(self, value)[:8]}"
+        return context
+
+
 class HeadingBlock(StructBlock):
     """
     Custom `StructBlock` that allows the user to select h2 - h4 sizes for headers.
@@ -40,7 +90,7 @@ class HeadingBlock(StructBlock):
         template = "blocks/heading_block.html"
 
 
-class ImageBlock(StructBlock):
+class ImageBlock(CachedBlockMixin, StructBlock):
     """
     Custom `StructBlock` for utilizing images with associated caption and attribution data.
     """
@@ -52,6 +102,12 @@ class ImageBlock(StructBlock):
     class Meta:
         icon = "image"
         template = "blocks/image_block.html"
+        image_sizes = "(min-width: 1400px) 1296px, 100vw"
+
+    def get_context(self, value, parent_context=None):
+        context = super().get_context(value, parent_context=parent_context)
+        context["image_sizes"] = self.meta.image_sizes
+        return context
 
 
 class InternalLinkBlock(StructBlock):
@@ -120,7 +176,7 @@ class ImageLinkItemBlock(StructBlock):
         icon = "image"
 
 
-class ImageLinkBlock(StructBlock):
+class ImageLinkBlock(CachedBlockMixin, StructBlock):
     """
     A collection of multiple ImageLinks.
     """
@@ -131,6 +187,12 @@ class ImageLinkBlock(StructBlock):
     class Meta:
         icon = "list-ol"
         template = "blocks/image_link_block.html"
+        image_sizes = "(min-width: 768px) 17vw, (min-width: 576px) 33vw, 50vw"
+
+    def get_context(self, value, parent_context=None):
+        context = super().get_context(value, parent_context=parent_context)
+        context["image_sizes"] = self.meta.image_sizes
+        return context
 
 
 class PromotionsBlock(ImageLinkBlock):
@@ -140,6 +202,7 @@ class PromotionsBlock(ImageLinkBlock):
 
     class Meta:
         template = "blocks/promotions_block.html"
+        image_sizes = "(min-width: 576px) 33vw, 50vw"
 
 
 class BlockQuote(StructBlock):
@@ -164,7 +227,7 @@ class FAQItemBlock(StructBlock):
         icon = "title"
 
 
-class FAQBlock(StructBlock):
+class FAQBlock(CachedBlockMixin, StructBlock):
     title = CharBlock(default="Frequently asked questions")
     item = ListBlock(FAQItemBlock())
 
@@ -173,7 +236,7 @@ class FAQBlock(StructBlock):
         template = "blocks/faq_block.html"
 
 
-class LinkBlock(StructBlock):
+class LinkBlock(CachedBlockMixin, StructBlock):
     """
     Used to show a collection of internal links typically for seo purposes.
     """
@@ -195,7 +258,7 @@ class NavTabItemBlock(StructBlock):
         icon = "title"
 
 
-class NavTabBlock(StructBlock):
+class NavTabBlock(CachedBlockMixin, TabsBlockMixin, StructBlock):
     title = CharBlock(required=True)
     item = ListBlock(NavTabItemBlock())
 
@@ -213,7 +276,7 @@ class NavTabLinksItemBlock(StructBlock):
         icon = "title"
 
 
-class NavTabLinksBlock(StructBlock):
+class NavTabLinksBlock(CachedBlockMixin, TabsBlockMixin, StructBlock):
     """Similar to Nav Tab block but purely used to show SEO links"""
 
     title = CharBlock(required=True)
@@ -1,6 +1,36 @@
+import datetime
+import hashlib
+import json
+import logging
+import re
+import time
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.cache import cache_control
 
+from wagtail.models import Page
+
+from base.counters import CacheCounters
+
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_PREFIX = "pagecache"
+BLOCK_CACHE_PREFIX = "blockcache"
+BLOCK_CACHE_VERSION_KEY = f"{BLOCK_CACHE_PREFIX}:version"
+
+block_cache_counters = CacheCounters(f"{BLOCK_CACHE_PREFIX}:counter")
+
+CSRF_TOKEN_RE = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+CSRF_TOKEN_PLACEHOLDER = b'name="csrfmiddlewaretoken" value="__csrf_token__"'
+
 
 def get_cache_control_kwargs():
     """
@@ -29,3 +59,422 @@ def get_default_cache_control_decorator():
     # cache_control_kwargs = get_cache_control_kwargs()
     # return cache_control(**cache_control_kwargs)
     return cache_control(max_age=60 * 60 * 24, immutable=True, public=True)  # one day
+
+
+def _path_prefixes(path):
+    """
+    Treebeard paths are built of fixed size steps so every ancestor path is a prefix of
+    the page path. Ex: '000100020003' -> ['0001', '00010002', '000100020003']
+    """
+
+    steplen = Page.steplen
+    return [path[:i] for i in range(steplen, len(path) + 1, steplen)]
+
+
+def _self_version_key(path):
+    return f"{PAGE_CACHE_PREFIX}:self:{path}"
+
+
+def _tree_version_key(path):
+    return f"{PAGE_CACHE_PREFIX}:tree:{path}"
+
+
+def _translations_version_key(translation_key):
+    return f"{PAGE_CACHE_PREFIX}:translations:{translation_key}"
+
+
+TRANSLATIONS_VERSION_KEY = f"{PAGE_CACHE_PREFIX}:translations:all"
+SHARED_VERSION_KEY = f"{PAGE_CACHE_PREFIX}:shared"
+
+
+def get_versions(keys):
+    """
+    Return the versions under the keys. A missing one (never set yet or culled by the cache)
+    is started at the current time instead of read as 0, so nothing cached under an older
+    version matches it again and the Last-Modified times built from them never go back.
+    """
+
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, timeout=None)
+        versions.update(missing | cache.get_many(list(missing)))
+
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return get_versions([key])[0]
+
+
+def get_page_versions(page):
+    """
+    Return all the versions a cached copy of this page depends on. Versions are the time
+    in nanoseconds of the last change.
+
+    A page depends on its own `self` version and on the `tree` version of itself and
+    each of its ancestors, so bumping the tree version of a page evicts the whole subtree
+    while bumping a self version only evicts that single page. Snippets (authors, services,
+    amenities...), images and documents are shown across pages so they share a global version.
+    """
+
+    keys = [SHARED_VERSION_KEY, _self_version_key(page.path)]
+    keys += [_tree_version_key(path) for path in _path_prefixes(page.path)]
+    return get_versions(keys)
+
+
+def get_page_version(page, versions=None):
+    """
+    Return a digest of all the versions a cached copy of this page depends on.
+    """
+
+    versions = get_page_versions(page) if versions is None else versions
+    raw = ":".join(str(version) for version in versions)
+
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_page_last_modified(page, versions=None):
+    """
+    Last time something rendered on the page changed. That is the latest of its own publish,
+    a change in a page, snippet or image it depends on and the start of the day since some templates
+    depend on the current day.
+    """
+
+    versions = get_page_versions(page) if versions is None else versions
+    start_of_day = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+    candidates = [start_of_day, datetime.datetime.fromtimestamp(max(versions) / 1e9, tz=datetime.timezone.utc)]
+
+    if page.last_published_at:
+        candidates.append(page.last_published_at)
+
+    return max(candidates)
+
+
+def bump_page_versions(self_paths=(), tree_paths=()):
+    version = time.time_ns()
+    new_versions = {_self_version_key(path): version for path in self_paths}
+    new_versions.update({_tree_version_key(path): version for path in tree_paths})
+
+    cache.set_many(new_versions, timeout=None)
+
+
+def bump_shared_version():
+    cache.set(SHARED_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_translations_version(translation_key=None):
+    """
+    Evict the translation map of a single page or of all pages when urls of a whole
+    subtree change (a page is moved or its slug changes).
+    """
+
+    key = _translations_version_key(translation_key) if translation_key else TRANSLATIONS_VERSION_KEY
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_translation_urls(page):
+    """
+    Return the map of the live translations of a page (itself included) as a list of
+    (locale_id, language_code, full_url) tuples shared by all the pages with the same
+    translation_key.
+    """
+
+    version_keys = [_translations_version_key(page.translation_key), TRANSLATIONS_VERSION_KEY]
+    version = ":".join(str(version) for version in get_versions(version_keys))
+    key = f"{PAGE_CACHE_PREFIX}:translations:{page.translation_key}:{hashlib.md5(version.encode()).hexdigest()}"
+
+    urls = cache.get(key)
+
+    if urls is None:
+        translations = Page.objects.live().filter(translation_key=page.translation_key).select_related("locale")
+        urls = [(p.locale_id, p.locale.language_code, p.get_full_url()) for p in translations.order_by("locale_id")]
+        cache.set(key, urls, timeout=getattr(settings, "PAGE_CACHE_TIMEOUT", None))
+
+    return urls
+
+
+def invalidate_page(page):
+    """
+    Evict a page from the page cache along with everything that renders something about it.
+
+        - the page and its descendants (breadcrumbs, urls and titles of the parents)
+        - its ancestors (index pages list their live children)
+        - its translations (hreflang alternate links)
+    """
+
+    translation_paths = (
+        Page.objects.filter(translation_key=page.translation_key).exclude(pk=page.pk).values_list("path", flat=True)
+    )
+    self_paths = _path_prefixes(page.path)[:-1] + list(translation_paths)
+
+    logger.info("evicting page %s from the page cache..." % page.pk)
+    bump_page_versions(self_paths=self_paths, tree_paths=[page.path])
+    bump_translations_version(page.translation_key)
+    bump_block_reference_version(page)
+
+
+def is_page_cache_enabled():
+    return getattr(settings, "PAGE_CACHE_ENABLED", False)
+
+
+def is_request_cacheable(request):
+    """
+    Only anonymous GET | HEAD requests without a session or flash messages are served
+    from the page cache. Query strings other than the allowed ones (pagination) bypass it so
+    bots appending random params can't fill the cache.
+    """
+
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if getattr(request, "is_preview", False):
+        return False
+
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return False
+
+    if settings.SESSION_COOKIE_NAME in request.COOKIES or "messages" in request.COOKIES:
+        return False
+
+    allowed_params = getattr(settings, "PAGE_CACHE_QUERY_PARAMS", [])
+
+    return all(param in allowed_params for param in request.GET)
+
+
+def is_response_cacheable(response):
+    if response.status_code != 200 or response.streaming:
+        return False
+
+    if response.cookies:
+        return False
+
+    return "private" not in response.get("Cache-Control", "")
+
+
+def get_page_cache_key(page, request, version=None):
+    """
+    Cache key of a page is made of its id, the active language, a variant and the page version.
+    The variant is the host, the full path and today's date since some templates depend
+    on the current day (Ex: opening hours of a station)
+    """
+
+    variant = f"{request.get_host()}:{request.get_full_path()}:{timezone.localdate().isoformat()}"
+    variant = hashlib.md5(variant.encode()).hexdigest()
+    language = translation.get_language()
+    version = version or get_page_version(page)
+
+    return f"{PAGE_CACHE_PREFIX}:page:{page.pk}:{language}:{variant}:{version}"
+
+
+def get_breadcrumbs_cache_key(page, request):
+    """
+    Breadcrumbs depend on the titles and urls of the ancestors of a page which are all
+    covered by the page version.
+    """
+
+    host = hashlib.md5(request.get_host().encode()).hexdigest() if request else ""
+    language = translation.get_language()
+    version = get_page_version(page)
+
+    return f"{PAGE_CACHE_PREFIX}:breadcrumbs:{page.path}:{language}:{host}:{version}"
+
+
+def get_cached_page_response(entry, request):
+    content = entry["content"]
+    if CSRF_TOKEN_PLACEHOLDER in content:
+        token = f'name="csrfmiddlewaretoken" value="{get_token(request)}"'
+        content = content.replace(CSRF_TOKEN_PLACEHOLDER, token.encode())
+
+    response = HttpResponse(content, status=entry["status"])
+    for header, value in entry["headers"].items():
+        response[header] = value
+
+    response["X-Page-Cache"] = "hit"
+
+    return response
+
+
+def store_page_response(key, response, last_modified):
+    """
+    Render and store the response in the page cache along with its validators.
+
+    Csrf tokens are user specific so they are swapped with a placeholder which is filled
+    with a fresh token for each visitor when served from the cache. The ETag is a digest of
+    the stored content so it is the same for every visitor, and weak as the bodies sent
+    differ by their token. Responses that can't be cached are rendered for one visitor (ex:
+    logged in, with messages) and get no validators: the page versions don't cover what they
+    show and a digest would need the page rendered anyway.
+
+    Returns the response and the stored entry (None when the response can't be cached).
+    """
+
+    if hasattr(response, "render"):
+        response.render()
+
+    if not is_response_cacheable(response):
+        return response, None
+
+    content = CSRF_TOKEN_RE.sub(CSRF_TOKEN_PLACEHOLDER, response.content)
+
+    response["ETag"] = f"W/{quote_etag(hashlib.md5(content).hexdigest())}"
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+
+    entry = {
+        "content": content,
+        "status": response.status_code,
+        "headers": {header: value for header, value in response.items() if header.lower() != "set-cookie"},
+    }
+
+    cache.set(key, entry, timeout=getattr(settings, "PAGE_CACHE_TIMEOUT", None))
+
+    response["X-Page-Cache"] = "miss"
+
+    return response, entry
+
+
+def get_not_modified_response(request, entry, last_modified):
+    """
+    Answer conditional requests (If-None-Match | If-Modified-Since) with a 304 when the
+    visitor already has the current version of the page.
+    """
+
+    etag = entry["headers"].get("ETag") if entry else None
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+
+    if response is None:
+        return None
+
+    if isinstance(response, HttpResponseNotModified):
+        for header in ("ETag", "Last-Modified", "Cache-Control", "Vary", "Content-Language"):
+            if entry and header in entry["headers"]:
+                response[header] = entry["headers"][header]
+
+        response.setdefault("Last-Modified", http_date(last_modified.timestamp()))
+
+    return response
+
+
+def serve_cached_page(page, request, serve):
+    """
+    Serve the page from the page cache and fallback to `serve` rendering and storing it.
+
+    Conditional requests are answered before rendering: with the ETag of the cached copy
+    or the Last-Modified time of the page when there is none.
+    """
+
+    if not is_page_cache_enabled() or not is_request_cacheable(request):
+        return serve()
+
+    versions = get_page_versions(page)
+    last_modified = get_page_last_modified(page, versions)
+    key = get_page_cache_key(page, request, version=get_page_version(page, versions))
+    entry = cache.get(key)
+
+    if response := get_not_modified_response(request, entry, last_modified):
+        return response
+
+    if entry is not None:
+        return get_cached_page_response(entry, request)
+
+    response, entry = store_page_response(key, serve(), last_modified)
+
+    if entry is not None and (not_modified := get_not_modified_response(request, entry, last_modified)):
+        return not_modified
+
+    return response
+
+
+def is_block_cache_enabled():
+    return getattr(settings, "BLOCK_CACHE_ENABLED", False)
+
+
+def bump_block_cache_version():
+    """
+    Blocks render the urls of the pages they point to, which change with the slug or the
+    place in the tree of any ancestor, so those (rare) changes evict all the cached blocks.
+    """
+
+    cache.set(BLOCK_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _block_reference_version_key(model, pk):
+    # Blocks point to pages as their specific class and signals send either, so pages share one
+    if issubclass(model, Page):
+        model = Page
+
+    return f"{BLOCK_CACHE_PREFIX}:ref:{model._meta.label_lower}:{pk}"
+
+
+def bump_block_reference_version(instance):
+    """
+    Evict the cached blocks that render something of the instance (a page, image, document
+    or snippet), ex: the title of a linked page. Other blocks are left alone.
+    """
+
+    cache.set(_block_reference_version_key(type(instance), instance.pk), time.time_ns(), timeout=None)
+
+
+def _strip_block_ids(raw):
+    """
+    Remove the ids of list and stream children from a raw block value. Children created in
+    code have no id and get a new uuid on every `get_prep_value` call.
+    """
+
+    if isinstance(raw, list):
+        return [_strip_block_ids(item) for item in raw]
+
+    if isinstance(raw, dict):
+        if "type" in raw and "value" in raw:
+            raw = {key: value for key, value in raw.items() if key != "id"}
+        return {key: _strip_block_ids(value) for key, value in raw.items()}
+
+    return raw
+
+
+def get_block_value_digest(block, value):
+    """
+    Return a sha256 hex digest of the raw json value of a block and its template.
+    """
+
+    raw = _strip_block_ids(block.get_prep_value(value))
+    raw = json.dumps(raw, cls=DjangoJSONEncoder, sort_keys=True)
+    template = getattr(block.meta, "template", None)
+
+    return hashlib.sha256(f"{type(block).__name__}:{template}:{raw}".encode()).hexdigest()
+
+
+def get_block_cache_key(block, value):
+    """
+    Cache key of a rendered block made of a hash of its raw json value, its template and
+    the active language so identical blocks on different pages share the same fragment.
+
+    The key also holds the versions of the pages, images, documents and snippets the block
+    points to (`Block.extract_references`) so only the blocks rendering a changed object are
+    evicted.
+    """
+
+    digest = get_block_value_digest(block, value)
+    language = translation.get_language()
+    references = sorted({_block_reference_version_key(model, pk) for model, pk, *__ in block.extract_references(value)})
+    versions = ":".join(str(version) for version in get_versions([BLOCK_CACHE_VERSION_KEY, *references]))
+    version = hashlib.md5(versions.encode()).hexdigest()
+
+    return f"{BLOCK_CACHE_PREFIX}:block:{language}:{version}:{digest}"
+
+
+def incr_block_cache_counter(name):
+    block_cache_counters.incr(name)
+
+
+def get_block_cache_stats():
+    """
+    Return the hit and miss counters of the block cache, shared by all workers.
+    """
+
+    counters = block_cache_counters.get(["hit", "miss"])
+
+    return {"hits": counters["hit"], "misses": counters["miss"]}
@@ -0,0 +1,88 @@
+"""
+Counters of the caches (ex: block cache hits, trip searches saved) shared by all workers.
+
+Counting a hit must not cost more than the hit saves, so each worker counts in memory and
+adds its counts to the shared cache at most every `CACHE_COUNTERS_FLUSH_INTERVAL` seconds,
+one `cache.incr` per counter instead of a cache write per event. Reading the counters
+flushes the counts of the worker reading them first. The totals lag the other workers by up
+to the interval and `incr` is not atomic on every backend (ex: the file based cache), so
+they are a close estimate rather than an exact count.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheCounters:
+    """
+    Counters named `<prefix>:<name>` in the shared cache, counted in memory by each worker.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.counts = Counter()
+        self.flushed_at = time.monotonic()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def get_key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def incr(self, name):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Counted by the parent before the fork, it flushes them itself
+                self.counts.clear()
+                self.pid = os.getpid()
+
+            self.counts[name] += 1
+            if time.monotonic() - self.flushed_at < settings.CACHE_COUNTERS_FLUSH_INTERVAL:
+                return
+
+        self.flush()
+
+    def flush(self):
+        """
+        Add the counts of this worker to the shared cache.
+        """
+
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+
+        for name, count in counts.items():
+            key = self.get_key(name)
+            if not cache.add(key, count, timeout=None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    # the counter expired or was evicted in between
+                    cache.set(key, count, timeout=None)
+
+    def clear(self):
+        """
+        Forget the counts not flushed yet, ex: after clearing the cache in tests.
+        """
+
+        with self.lock:
+            self.counts.clear()
+            self.flushed_at = time.monotonic()
+
+    def get(self, names):
+        """
+        Return the totals of the counters of all the workers.
+        """
+
+        self.flush()
+        counters = cache.get_many([self.get_key(name) for name in names])
+
+        return {name: counters.get(self.get_key(name), 0) for name in names}
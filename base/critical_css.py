@@ -0,0 +1,265 @@
+"""
+Critical (above the fold) css of our page templates.
+
+The `build_critical_css` command renders a sample page of each template listed in
+`CRITICAL_CSS_TEMPLATES`, collects the tags, classes and ids of its first elements and keeps
+only the rules of the global stylesheet that can match them. The `stylesheet` template tag
+inlines that subset in the `<head>` and loads the full stylesheet asynchronously.
+
+Selectors are matched conservatively: pseudo classes and attribute selectors are ignored so
+a rule is dropped only when it names a tag, class or id missing from the top of the page.
+"""
+
+import functools
+import logging
+import posixpath
+import re
+
+from django.conf import settings
+from django.templatetags.static import static
+
+import lxml.html
+
+
+logger = logging.getLogger(__name__)
+
+# At-rules whose body is a list of rules filtered like the top level stylesheet
+GROUPING_AT_RULES = ("@media", "@supports", "@layer", "@container")
+
+# At-rules kept as they are since the rules inlined may need them
+KEPT_AT_RULES = ("@charset", "@font-face", "@property", "@layer")
+
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+ATTRIBUTE_RE = re.compile(r"\[[^\]]*\]")
+PSEUDO_RE = re.compile(r"::?[\w-]+(\((?:[^()]|\([^()]*\))*\))?")
+CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+ID_RE = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+TAG_RE = re.compile(r"(?<![\w.#-])([a-zA-Z][\w-]*)")
+URL_RE = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+def _find_block_end(css, start):
+    """
+    Index of the `}` closing the block opened right before `start`, skipping strings.
+    """
+
+    depth, quote = 1, None
+
+    for index in range(start, len(css)):
+        char = css[index]
+
+        if quote:
+            if char == quote and css[index - 1] != "\\":
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+
+    return len(css)
+
+
+def parse_css(css):
+    """
+    Split a stylesheet into a list of (prelude, body) rules. The body of grouping at-rules
+    like `@media` is itself a list of rules and statements like `@import` have no body.
+    """
+
+    css = COMMENT_RE.sub("", css)
+    rules = []
+    position = 0
+
+    while position < len(css):
+        brace, semicolon = css.find("{", position), css.find(";", position)
+
+        if brace == -1:
+            break
+
+        while css[position].isspace():
+            position += 1
+
+        if css.startswith("@", position) and -1 < semicolon < brace:
+            rules.append((css[position:semicolon].strip(), None))
+            position = semicolon + 1
+            continue
+
+        end = _find_block_end(css, brace + 1)
+        prelude, body = css[position:brace].strip(), css[brace + 1 : end]
+
+        if prelude.startswith(GROUPING_AT_RULES):
+            body = parse_css(body)
+
+        rules.append((prelude, body))
+        position = end + 1
+
+    return rules
+
+
+def serialize_css(rules):
+    output = []
+
+    for prelude, body in rules:
+        if body is None:
+            output.append(f"{prelude};")
+        elif isinstance(body, list):
+            output.append(f"{prelude}{{{serialize_css(body)}}}")
+        else:
+            output.append(f"{prelude}{{{body.strip()}}}")
+
+    return "".join(output)
+
+
+def split_selectors(prelude):
+    """
+    Split a selector list on the commas that are not inside parentheses.
+    """
+
+    selectors, depth, current = [], 0, []
+
+    for char in prelude:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            selectors.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+
+    selectors.append("".join(current).strip())
+
+    return [selector for selector in selectors if selector]
+
+
+def selector_matches(selector, used):
+    """
+    Whether every tag, class and id the selector names is in the `used` dict of sets.
+    """
+
+    selector = PSEUDO_RE.sub("", ATTRIBUTE_RE.sub("", selector))
+
+    return (
+        set(CLASS_RE.findall(selector)) <= used["classes"]
+        and set(ID_RE.findall(selector)) <= used["ids"]
+        and {tag.lower() for tag in TAG_RE.findall(selector)} <= used["tags"]
+    )
+
+
+def get_used_selectors(html, fold=None):
+    """
+    Return the sets of tags, classes and ids of the first `fold` elements of the body.
+    """
+
+    fold = fold or getattr(settings, "CRITICAL_CSS_FOLD_ELEMENTS", 200)
+    used = {"tags": {"html", "body"}, "classes": set(), "ids": set()}
+
+    document = lxml.html.document_fromstring(html)
+    body = document.find("body")
+
+    elements = (element for element in body.iter() if isinstance(element.tag, str))
+    for count, element in enumerate(elements):
+        if count >= fold:
+            break
+
+        used["tags"].add(element.tag.lower())
+        used["classes"].update(element.get("class", "").split())
+        if element.get("id"):
+            used["ids"].add(element.get("id"))
+
+    return used
+
+
+def filter_rules(rules, used):
+    kept = []
+
+    for prelude, body in rules:
+        if prelude.startswith(GROUPING_AT_RULES) and isinstance(body, list):
+            body = filter_rules(body, used)
+            if body:
+                kept.append((prelude, body))
+
+        elif prelude.startswith(KEPT_AT_RULES):
+            kept.append((prelude, body))
+
+        elif prelude.startswith("@"):
+            continue
+
+        else:
+            selectors = [selector for selector in split_selectors(prelude) if selector_matches(selector, used)]
+            if selectors:
+                kept.append((",".join(selectors), body))
+
+    return kept
+
+
+def _absolute_url(match, stylesheet):
+    url = match.group(2).strip()
+
+    if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+        return match.group(0)
+
+    path = posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet), url))
+
+    try:
+        url = static(path)
+    except ValueError:
+        url = settings.STATIC_URL + path
+
+    return f'url("{url}")'
+
+
+def extract_critical_css(css, html, stylesheet, fold=None):
+    """
+    Return the rules of `css` that may apply to the top of `html`. Relative urls are made
+    absolute since the rules move from `stylesheet` into the page.
+    """
+
+    used = get_used_selectors(html, fold=fold)
+    critical = serialize_css(filter_rules(parse_css(css), used))
+    critical = URL_RE.sub(lambda match: _absolute_url(match, stylesheet), critical)
+
+    # Never let the css close the <style> tag it is inlined in
+    return critical.replace("</", "<\\/")
+
+
+def get_critical_css_name(page=None, view_name=None):
+    """
+    Name of the entry of `CRITICAL_CSS_TEMPLATES` of a page or of a view (for urls in the
+    same namespace), if any.
+    """
+
+    for name, target in getattr(settings, "CRITICAL_CSS_TEMPLATES", {}).items():
+        if ":" in target:
+            if view_name and view_name.split(":")[0] == target.split(":")[0]:
+                return name
+        elif page is not None and page._meta.label == target:
+            return name
+
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def _read_critical_css(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def get_critical_css(name):
+    """
+    Return the built critical css of a template or an empty string when it was not built.
+    """
+
+    if not name or not getattr(settings, "CRITICAL_CSS_ENABLED", True):
+        return ""
+
+    path = settings.CRITICAL_CSS_DIR / f"{name}.css"
+
+    try:
+        return _read_critical_css(path, path.stat().st_mtime_ns)
+    except OSError:
+        return ""
@@ -0,0 +1,96 @@
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from wagtail.models import Site
+
+from base.cache import bump_shared_version
+from base.critical_css import extract_critical_css
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that builds the critical css of each template in `CRITICAL_CSS_TEMPLATES` by
+    rendering a live page of its type (or its url) and keeping the rules of the global
+    stylesheet used by the top of the page.
+
+    Run it after `collectstatic` so the urls inside the css point to the hashed files.
+    """
+
+    help = "Build the above the fold css inlined in the head of each page template"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stylesheet", default="assets/css/styles.min.css", help="Static path of the stylesheet")
+        parser.add_argument("--fold", type=int, default=None, help="Number of elements considered above the fold")
+        parser.add_argument("--only", action="append", dest="names", help="Only build this template")
+
+    def handle(self, *args, **kwargs):
+        stylesheet = kwargs["stylesheet"]
+        css = self.read_stylesheet(stylesheet)
+        templates = settings.CRITICAL_CSS_TEMPLATES
+
+        names = kwargs["names"] or list(templates)
+        unknown = set(names) - set(templates)
+        if unknown:
+            raise CommandError(f"Unknown templates: {', '.join(sorted(unknown))}")
+
+        site = Site.objects.filter(is_default_site=True).first()
+        client = Client(HTTP_HOST=site.hostname if site else "localhost")
+
+        settings.CRITICAL_CSS_DIR.mkdir(parents=True, exist_ok=True)
+
+        built = 0
+        for name in names:
+            url = self.get_url(templates[name])
+            if url is None:
+                self.stderr.write(f"{name}: no live page to render, skipping")
+                continue
+
+            response = client.get(url)
+            if response.status_code != 200:
+                self.stderr.write(f"{name}: {url} returned {response.status_code}, skipping")
+                continue
+
+            critical = extract_critical_css(css, response.content, stylesheet, fold=kwargs["fold"])
+            (settings.CRITICAL_CSS_DIR / f"{name}.css").write_text(critical, encoding="utf-8")
+            built += 1
+
+            self.stdout.write(f"{name}: {url} {len(critical) / 1024:.1f}KB of {len(css) / 1024:.1f}KB")
+
+        # Cached pages embed the previous critical css
+        bump_shared_version()
+
+        self.stdout.write(f"Built {built} critical css files.")
+        self.stdout.write("All Done.")
+
+    def read_stylesheet(self, path):
+        """
+        Read the source stylesheet, falling back to the collected copy.
+        """
+
+        location = finders.find(path)
+        if location is None and staticfiles_storage.exists(path):
+            location = staticfiles_storage.path(path)
+
+        if location is None:
+            raise CommandError(f"Stylesheet {path} not found")
+
+        with open(location, encoding="utf-8") as f:
+            return f.read()
+
+    def get_url(self, target):
+        if ":" in target:
+            return reverse(target)
+
+        page = apps.get_model(target).objects.live().public().order_by("path").first()
+
+        return page.get_url() if page else None
@@ -0,0 +1,53 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from wagtail.images import get_image_model
+
+from base.renditions import get_filter_specs, pregenerate_renditions
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that generates the missing renditions of all our images for every filter
+    spec used in the templates so no request has to encode them.
+    """
+
+    help = "Generate missing image renditions in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=None, help="Number of worker processes")
+        parser.add_argument("--image", type=int, action="append", dest="image_ids", help="Only this image id")
+        parser.add_argument("--list-specs", action="store_true", help="Only list the discovered filter specs")
+
+    def handle(self, *args, **kwargs):
+        specs = get_filter_specs()
+
+        self.stdout.write(f"Found {len(specs)} filter specs: {', '.join(specs)}")
+
+        if kwargs["list_specs"]:
+            return
+
+        image_ids = kwargs["image_ids"] or get_image_model().objects.values_list("pk", flat=True)
+
+        self.stdout.write("generating missing renditions...")
+        generated = pregenerate_renditions(
+            image_ids=list(image_ids), specs=specs, processes=kwargs["processes"], progress=self.progress
+        )
+
+        self.stdout.write(f"Generated {generated} renditions.")
+        self.stdout.write("All Done.")
+
+    def progress(self, done, total, result):
+        image_id, generated, error = result
+
+        if error:
+            msg = "Error generating renditions of image %s:%s" % (image_id, error)
+
+            logger.error(msg)
+            self.stderr.write(msg)
+
+        self.stdout.write(f"[{done}/{total}] image {image_id}: {generated} renditions")
@@ -0,0 +1,59 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from wagtail.models import get_page_models
+
+from base.models import BasePage
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that rebuilds the stored JSON-LD schema of all the live pages.
+
+    Schemas are built when a page is published so this is only needed after changing
+    how a page type builds its schema or for pages published before schemas were stored.
+    """
+
+    help = "Rebuild the stored JSON-LD schema of all live pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Pages written per query")
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs["batch_size"]
+        models = [model for model in get_page_models() if issubclass(model, BasePage)]
+
+        self.stdout.write(f"rebuilding ld schemas of {len(models)} page types...")
+
+        total, failed = 0, 0
+
+        for model in models:
+            pages = model.objects.live().order_by("path")
+            count = pages.count()
+            changed = []
+
+            for index, page in enumerate(pages.iterator(chunk_size=batch_size), start=1):
+                try:
+                    page.ld_schema = page.build_ld_entity()
+                except Exception:
+                    logger.exception("could not build the ld schema of page %s" % page.pk)
+                    failed += 1
+                    continue
+
+                changed.append(page)
+
+                if index % batch_size == 0 or index == count:
+                    self.stdout.write(f"{model._meta.label}: {index}/{count}")
+
+            with transaction.atomic():
+                model.objects.bulk_update(changed, ["ld_schema"], batch_size=batch_size)
+
+            total += len(changed)
+
+        self.stdout.write(f"Rebuilt {total} ld schemas. Failed: {failed}")
+        self.stdout.write("All Done.")
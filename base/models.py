@@ -1,3 +1,4 @@
+import json
 import logging
 
 from django.contrib import messages
@@ -5,7 +6,7 @@ from django.db import models
 from django.forms import widgets
 from django.shortcuts import redirect
 from django.utils.decorators import method_decorator
-from django.utils.html import strip_tags
+from django.utils.html import mark_safe, strip_tags
 from django.utils.translation import gettext_lazy as _
 
 from wagtail.admin.panels import (
@@ -30,12 +31,11 @@ from wagtail.models import (
     RevisionMixin,
     WorkflowMixin,
 )
-from wagtail.models.i18n import Locale
 
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
 
-from base.cache import get_default_cache_control_decorator
+from base.cache import get_default_cache_control_decorator, get_translation_urls
 from base.schemas import organisation_schema
 
 from .blocks import BaseStreamBlock
@@ -196,6 +196,12 @@ class BasePage(SocialFields, ListingFields, Page):
         "If unchecked this page will no longer be indexed by search engines.",
     )
 
+    ld_schema = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="JSON-LD schema of the live version of the page. Built when the page is published.",
+    )
+
     promote_panels = (
         Page.promote_panels
         + SocialFields.promote_panels
@@ -208,14 +214,65 @@ class BasePage(SocialFields, ListingFields, Page):
     class Meta:
         abstract = True
 
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+
+        if getattr(request, "is_preview", False):
+            # The stored schema belongs to the live version so previews build it from the draft
+            self.ld_schema = ""
+
+        return context
+
     def canonical_url(self):
         return self.full_url
 
+    def get_ld_graph(self):
+        """
+        Schemas that make up the JSON-LD graph of the page. Override on each page type.
+        """
+
+        return []
+
+    def build_ld_entity(self):
+        graph = self.get_ld_graph()
+        if not graph:
+            return ""
+
+        return json.dumps({"@context": "http://schema.org", "@graph": graph}, ensure_ascii=False)
+
+    def ld_entity(self):
+        """
+        JSON-LD markup rendered on the templates. Served from the schema stored at publish
+        time and only built on the fly for previews or pages published before it existed.
+        """
+
+        return mark_safe(self.ld_schema or self.build_ld_entity())
+
+    def update_ld_schema(self):
+        """
+        Build the schema and store it without saving the page (which would create side effects
+        like a new revision or reindexing).
+        """
+
+        try:
+            self.ld_schema = self.build_ld_entity()
+        except Exception:
+            logger.exception("could not build the ld schema of page %s" % self.pk)
+            return
+
+        type(self).objects.filter(pk=self.pk).update(ld_schema=self.ld_schema)
+
+    def get_alternate_urls(self):
+        """
+        Map of language code -> full url of the live translations of the page used for the
+        hreflang links. Served from the cached translation map so it needs no queries.
+        """
+
+        return {code: url for locale_id, code, url in get_translation_urls(self) if locale_id != self.locale_id}
+
     def get_default_locale_url(self):
-        es = Locale.objects.get(language_code="es")
-        page = self.get_translation_or_none(locale=es)
-        if page and page.live:
-            return page.full_url
+        urls = {code: url for _, code, url in get_translation_urls(self)}
+        return urls.get("es")
 
     def _get_organisation_schema(self):
         return organisation_schema
@@ -0,0 +1,243 @@
+"""
+Keyset (cursor) pagination that never counts.
+
+Django's `Paginator` counts the whole listing to number the pages and skips the rows of the
+previous pages with an OFFSET, both of which get slower as the listing grows. Here a page is
+the `per_page` rows after (or before) the sort key of the last (first) row of the page the
+visitor comes from, read with a single query of `per_page + 1` rows where the extra row only
+tells whether there is a next page.
+
+The cursor is that sort key encoded in the url (`?cursor=...`). Since it points at a row and
+not at a position, the url of the page after a given post keeps showing the same posts when
+new ones are published, which keeps the `rel=next` links crawlers follow stable.
+
+Querysets are ordered by `ordering`, with NULLs last and the primary key added to break ties,
+and sequences already sorted by `key` (ex: the cached search results) are sliced with a
+binary search.
+
+Ex:
+    paginator = KeysetPaginator(posts, 9, ordering=("-first_published_at", "-pk"))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+"""
+
+import base64
+import binascii
+import bisect
+import json
+import logging
+from collections.abc import Sequence
+
+from django.db.models import F, Q, QuerySet
+
+
+logger = logging.getLogger(__name__)
+
+CURSOR_PARAM = "cursor"
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+    data = json.dumps([direction, *values], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return the (direction, values) of a cursor, raising `InvalidCursor` for anything that
+    was not made by `encode_cursor`.
+    """
+
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+    if not isinstance(data, list) or len(data) < 2 or data[0] not in (NEXT, PREVIOUS):
+        raise InvalidCursor(cursor)
+
+    return data[0], data[1:]
+
+
+def get_order_by(ordering, forward=True):
+    """
+    The ordering, reversed going backwards, with NULLs after every value (ex: pages imported
+    without a `first_published_at`) whatever the database sorts them by default.
+    """
+
+    nulls = {"nulls_last": True} if forward else {"nulls_first": True}
+
+    order_by = []
+    for field in ordering:
+        expression = F(field.lstrip("-"))
+        order_by.append(expression.desc(**nulls) if field.startswith("-") == forward else expression.asc(**nulls))
+
+    return order_by
+
+
+def get_keyset_filter(ordering, values, forward=True):
+    """
+    Filter of the rows after (or before) the given values of the ordering fields, ie. for
+    `("-first_published_at", "-pk")`:
+
+        first_published_at < date OR first_published_at IS NULL
+        OR (first_published_at = date AND pk < pk)
+
+    NULLs come after every value (see `get_order_by`), so nothing but other NULLs comes after
+    a NULL and every value comes before it.
+    """
+
+    condition = Q()
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+
+        if value is None:
+            if not forward:
+                condition |= equal & Q(**{f"{name}__isnull": False})
+            equal &= Q(**{f"{name}__isnull": True})
+            continue
+
+        lookup = "lt" if field.startswith("-") == forward else "gt"
+        beyond = Q(**{f"{name}__{lookup}": value})
+        if forward:
+            beyond |= Q(**{f"{name}__isnull": True})
+
+        condition |= equal & beyond
+        equal &= Q(**{name: value})
+
+    return condition
+
+
+class KeysetPage(Sequence):
+    """
+    A page of a `KeysetPaginator`, a drop in for django's `Page` in templates except there
+    are no page numbers.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<KeysetPage of %s objects>" % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_cursor(self):
+        return self.next_cursor
+
+    def previous_page_cursor(self):
+        return self.previous_cursor
+
+
+class KeysetPaginator:
+    def __init__(self, object_list, per_page, ordering=None, key=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.key = key
+
+        if isinstance(object_list, QuerySet):
+            ordering = tuple(ordering or object_list.query.order_by)
+            if not ordering:
+                raise ValueError("Keyset pagination of a queryset needs an ordering")
+
+            # The primary key makes the sort key unique so no row is skipped or repeated
+            if ordering[-1].lstrip("-") not in ("pk", object_list.model._meta.pk.name):
+                ordering += ("-pk" if ordering[-1].startswith("-") else "pk",)
+
+            self.ordering = ordering
+
+        elif key is None:
+            raise ValueError("Keyset pagination of a sequence needs a key")
+
+    def get_values(self, obj):
+        if self.key is not None:
+            return list(self.key(obj))
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def to_python(self, values):
+        if self.key is not None:
+            return tuple(values)
+
+        opts = self.object_list.model._meta
+        fields = [opts.pk if name == "pk" else opts.get_field(name) for name in (f.lstrip("-") for f in self.ordering)]
+
+        return [field.to_python(value) for field, value in zip(fields, values)]
+
+    def get_page(self, cursor=None):
+        """
+        Return the page at the cursor, or the first page when the cursor is missing or invalid.
+        """
+
+        direction, values = NEXT, None
+
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+                values = self.to_python(values)
+            except (InvalidCursor, ValueError, TypeError, LookupError):
+                logger.info("invalid pagination cursor %s" % cursor)
+                direction, values = NEXT, None
+
+        forward = direction == NEXT
+
+        if isinstance(self.object_list, QuerySet):
+            rows = self.get_queryset_rows(values, forward)
+        else:
+            rows = self.get_sequence_rows(values, forward)
+
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else values is not None
+        has_previous = values is not None if forward else has_more
+
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=encode_cursor(NEXT, self.get_values(rows[-1])) if rows and has_next else None,
+            previous_cursor=encode_cursor(PREVIOUS, self.get_values(rows[0])) if rows and has_previous else None,
+        )
+
+    def get_queryset_rows(self, values, forward):
+        queryset = self.object_list.order_by(*get_order_by(self.ordering, forward=forward))
+        if values is not None:
+            queryset = queryset.filter(get_keyset_filter(self.ordering, values, forward=forward))
+
+        return list(queryset[: self.per_page + 1])
+
+    def get_sequence_rows(self, values, forward):
+        keys = [tuple(self.key(obj)) for obj in self.object_list]
+
+        if forward:
+            start = bisect.bisect_right(keys, values) if values is not None else 0
+            return list(self.object_list[start : start + self.per_page + 1])
+
+        end = bisect.bisect_left(keys, values)
+        return list(reversed(self.object_list[max(end - self.per_page - 1, 0) : end]))
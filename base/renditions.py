@@ -0,0 +1,298 @@
+"""
+Off-request generation of image renditions.
+
+AVIF renditions are slow to encode and would otherwise be created inside the first request
+that renders an image, easily hitting the gunicorn timeout. Instead we discover every filter
+spec our templates use and generate the missing renditions in a pool of processes, either from
+the `pregenerate_renditions` command or after an image is uploaded or a page is published.
+
+Worker processes are spawned (not forked) so they never share database connections with the
+parent. They import this module before django is set up so models are imported lazily.
+"""
+
+import atexit
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Filter specs requested from python code rather than templates
+EXTRA_FILTER_SPECS = [
+    "fill-50x50",  # Person.thumb_image
+]
+
+_executor = None
+
+
+def get_responsive_filter_specs(width):
+    """
+    Filter specs of the responsive renditions of an image `width` pixels wide.
+
+    The ladder stops at the first width wider than the image since wagtail never upscales,
+    so that rendition is the image at its original size.
+    """
+
+    widths = [w for w in settings.RESPONSIVE_IMAGE_WIDTHS if w < width]
+    widths += [w for w in settings.RESPONSIVE_IMAGE_WIDTHS if w >= width][:1]
+    formats = settings.RESPONSIVE_IMAGE_FORMATS + [settings.RESPONSIVE_IMAGE_FALLBACK_FORMAT]
+
+    return [f"width-{w}|format-{fmt}" for fmt in formats for w in widths]
+
+
+def _get_template_names():
+    """
+    Names of all the templates of our own apps, skipping the ones of installed packages.
+    """
+
+    from django.template.utils import get_app_template_dirs
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    dirs = [Path(d) for template in settings.TEMPLATES for d in template.get("DIRS", [])]
+    dirs += [Path(d) for d in get_app_template_dirs("templates")]
+
+    for directory in dirs:
+        directory = directory.resolve()
+        if base_dir not in directory.parents:
+            continue
+
+        for path in directory.rglob("*.html"):
+            yield path.relative_to(directory).as_posix()
+
+
+@functools.cache
+def get_filter_specs():
+    """
+    Return the sorted tuple of filter specs used by the `image`, `srcset_image` and `picture`
+    tags across our templates (including block templates) plus the extra specs used in code.
+    """
+
+    from django.template import TemplateSyntaxError, engines
+
+    from wagtail.images.templatetags.wagtailimages_tags import ImageNode, SrcsetImageNode
+
+    engine = engines["django"]
+    specs = set(EXTRA_FILTER_SPECS)
+
+    for name in set(_get_template_names()):
+        try:
+            template = engine.get_template(name).template
+        except TemplateSyntaxError:
+            logger.exception("could not parse template %s" % name)
+            continue
+
+        for node in template.nodelist.get_nodes_by_type(ImageNode):
+            if isinstance(node, SrcsetImageNode):
+                specs.update(f.spec for f in node.get_filters())
+            else:
+                specs.add(node.get_filter().spec)
+
+    return tuple(sorted(specs))
+
+
+def get_missing_renditions(image_ids, specs):
+    """
+    Return a dict of image id -> filter specs that have no rendition yet. Besides the given
+    specs every image gets the responsive renditions matching its width.
+    """
+
+    from wagtail.images import get_image_model
+
+    image_model = get_image_model()
+    rendition_model = image_model.get_rendition_model()
+
+    widths = dict(image_model.objects.filter(pk__in=image_ids).values_list("pk", "width"))
+    existing = set(rendition_model.objects.filter(image_id__in=image_ids).values_list("image_id", "filter_spec"))
+
+    missing = {}
+    for image_id, width in widths.items():
+        image_specs = list(specs) + get_responsive_filter_specs(width)
+        image_specs = [spec for spec in image_specs if (image_id, spec) not in existing]
+        if image_specs:
+            missing[image_id] = image_specs
+
+    return missing
+
+
+def generate_image_renditions(image_id, specs):
+    """
+    Generate the renditions of a single image. Runs inside the worker processes.
+
+    Returns a tuple of (image_id, number of renditions generated, error message).
+    """
+
+    from django.db import close_old_connections
+
+    from wagtail.images import get_image_model
+    from wagtail.images.models import SourceImageIOError
+
+    close_old_connections()
+
+    try:
+        image = get_image_model().objects.get(pk=image_id)
+        image.get_renditions(*specs)
+
+    except (get_image_model().DoesNotExist, SourceImageIOError) as err:
+        return image_id, 0, str(err)
+
+    except Exception as err:
+        logger.exception("could not generate renditions of image %s" % image_id)
+        return image_id, 0, str(err)
+
+    return image_id, len(specs), None
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _create_executor(processes):
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def pregenerate_renditions(image_ids, specs=None, processes=None, progress=None):
+    """
+    Generate the missing renditions of the given images in a pool of `processes` workers.
+
+    `progress` is called with (done, total, result) after each image. With a single process
+    renditions are generated inline which is handy for tests and small batches.
+    """
+
+    specs = specs or get_filter_specs()
+    processes = processes or getattr(settings, "RENDITIONS_PREGENERATE_PROCESSES", 2)
+    missing = get_missing_renditions(list(image_ids), specs)
+    total = len(missing)
+
+    if not missing:
+        return 0
+
+    generated = 0
+
+    if processes <= 1:
+        results = (generate_image_renditions(image_id, image_specs) for image_id, image_specs in missing.items())
+        for done, result in enumerate(results, start=1):
+            generated += result[1]
+            if progress:
+                progress(done, total, result)
+
+        return generated
+
+    with _create_executor(processes) as executor:
+        futures = [executor.submit(generate_image_renditions, *item) for item in missing.items()]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            generated += result[1]
+            if progress:
+                progress(done, total, result)
+
+    return generated
+
+
+def _get_executor():
+    """
+    Pool shared by all the background jobs of this process. Created lazily since gunicorn
+    preloads the app before forking its workers.
+    """
+
+    global _executor
+
+    if _executor is None:
+        _executor = _create_executor(getattr(settings, "RENDITIONS_PREGENERATE_PROCESSES", 2))
+        atexit.register(_shutdown_executor)
+
+    return _executor
+
+
+def _shutdown_executor():
+    """
+    Stop the pool when the process exits. Queued jobs are dropped, the missing renditions are
+    generated on the next request or by `pregenerate_renditions`.
+    """
+
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def _submit_renditions(image_ids):
+    missing = get_missing_renditions(image_ids, get_filter_specs())
+
+    for image_id, specs in missing.items():
+        future = _get_executor().submit(generate_image_renditions, image_id, specs)
+        future.add_done_callback(_log_result)
+
+
+def _log_result(future):
+    image_id, generated, error = future.result()
+
+    if error:
+        logger.warning("could not generate renditions of image %s: %s" % (image_id, error))
+    else:
+        logger.info("generated %s renditions of image %s" % (generated, image_id))
+
+
+def schedule_renditions(image_ids):
+    """
+    Generate the missing renditions of the images in the background once the current
+    transaction commits so the request that triggered it returns right away.
+    """
+
+    image_ids = [image_id for image_id in set(image_ids) if image_id]
+
+    if not image_ids or not getattr(settings, "RENDITIONS_PREGENERATE_ENABLED", False):
+        return
+
+    transaction.on_commit(lambda: _submit_renditions(image_ids))
+
+
+def _get_image_ids(obj, image_model):
+    """
+    Ids of the images the object points to with a foreign key, a streamfield or a rich text
+    field, and the ones of its inline models.
+    """
+
+    from modelcluster.models import ClusterableModel, get_all_child_relations
+
+    for field in obj._meta.get_fields():
+        if field.many_to_one and field.concrete and field.related_model is image_model:
+            yield field.value_from_object(obj)
+
+        elif hasattr(field, "extract_references"):
+            value = field.value_from_object(obj)
+            if value is not None:
+                for model, object_id, *__ in field.extract_references(value):
+                    if issubclass(model, image_model):
+                        yield object_id
+
+    if isinstance(obj, ClusterableModel):
+        for relation in get_all_child_relations(obj):
+            for child in getattr(obj, relation.get_accessor_name()).all():
+                yield from _get_image_ids(child, image_model)
+
+
+def get_page_image_ids(page):
+    """
+    Ids of the images a page uses in its fields, inline models and streamfields.
+
+    References are extracted from the page itself since the reference index is updated by
+    a task that may not have run yet when the page is published.
+    """
+
+    from wagtail.images import get_image_model
+
+    return [int(image_id) for image_id in _get_image_ids(page, get_image_model()) if image_id is not None]
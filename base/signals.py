@@ -0,0 +1,110 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtail.models import Page
+from wagtail.signals import page_published, page_slug_changed, page_unpublished, post_page_move
+
+from base.cache import (
+    bump_block_cache_version,
+    bump_block_reference_version,
+    bump_page_versions,
+    bump_shared_version,
+    bump_translations_version,
+    invalidate_page,
+)
+from base.models import BasePage, Person
+from base.renditions import get_page_image_ids, schedule_renditions
+from blog.models import BlogCategory
+from locations.models import Service
+from partners.models import Amenity
+
+
+logger = logging.getLogger(__name__)
+
+
+def update_subtree_ld_schemas(page):
+    """
+    Schemas embed the url of the page and its parents so a new url means rebuilding them
+    for the whole subtree.
+    """
+
+    for descendant in page.get_descendants(inclusive=True).live().specific():
+        if isinstance(descendant, BasePage):
+            descendant.update_ld_schema()
+
+
+def page_published_receiver(sender, instance, **kwargs):
+    if isinstance(instance, BasePage):
+        instance.update_ld_schema()
+
+    invalidate_page(instance)
+    schedule_renditions(get_page_image_ids(instance))
+
+
+def page_slug_changed_receiver(sender, instance, **kwargs):
+    update_subtree_ld_schemas(instance)
+    bump_translations_version()
+    bump_block_cache_version()
+
+
+def page_unpublished_receiver(sender, instance, **kwargs):
+    invalidate_page(instance)
+
+
+def post_page_move_receiver(sender, instance, parent_page_before, parent_page_after, **kwargs):
+    """
+    A moved page changes the url of its whole subtree and the children listed by both parents.
+    """
+
+    update_subtree_ld_schemas(instance)
+    invalidate_page(instance)
+    bump_translations_version()
+    bump_page_versions(self_paths=[parent_page_before.path, parent_page_after.path])
+    bump_block_cache_version()
+
+
+def post_page_delete_receiver(sender, instance, **kwargs):
+    invalidate_page(instance)
+
+
+def image_saved_receiver(sender, instance, **kwargs):
+    """
+    Renditions are deleted when the focal point of an image changes so they are
+    regenerated on every save, not only on upload.
+    """
+
+    schedule_renditions([instance.pk])
+    media_changed_receiver(sender, instance, **kwargs)
+
+
+def media_changed_receiver(sender, instance, **kwargs):
+    """
+    Cached pages and blocks render the urls and titles of images and documents.
+    """
+
+    bump_shared_version()
+    bump_block_reference_version(instance)
+
+
+def snippet_changed_receiver(sender, instance, **kwargs):
+    bump_shared_version()
+    bump_block_reference_version(instance)
+
+
+page_published.connect(page_published_receiver, dispatch_uid="page_published_receiver")
+page_slug_changed.connect(page_slug_changed_receiver, dispatch_uid="page_slug_changed_receiver")
+page_unpublished.connect(page_unpublished_receiver, dispatch_uid="page_unpublished_receiver")
+post_page_move.connect(post_page_move_receiver, dispatch_uid="post_page_move_receiver")
+post_delete.connect(post_page_delete_receiver, sender=Page, dispatch_uid="post_page_delete_receiver")
+post_save.connect(image_saved_receiver, sender=get_image_model(), dispatch_uid="image_saved_receiver")
+post_delete.connect(media_changed_receiver, sender=get_image_model(), dispatch_uid="image_deleted_receiver")
+post_save.connect(media_changed_receiver, sender=get_document_model(), dispatch_uid="document_saved_receiver")
+post_delete.connect(media_changed_receiver, sender=get_document_model(), dispatch_uid="document_deleted_receiver")
+
+for snippet_model in (Person, BlogCategory, Service, Amenity):
+    name = snippet_model._meta.model_name
+    post_save.connect(snippet_changed_receiver, sender=snippet_model, dispatch_uid=f"{name}_saved_receiver")
+    post_delete.connect(snippet_changed_receiver, sender=snippet_model, dispatch_uid=f"{name}_deleted_receiver")
@@ -0,0 +1,93 @@
+"""
+Static files storage that hashes file names and precompresses them.
+
+`collectstatic` copies every asset under a content hashed name (`styles.min.3f2a1c.css`)
+listed in `staticfiles.json` so the `static` template tag references the hashed names and
+assets can be cached forever. Each hashed text asset also gets a gzip and, when the `brotli`
+package is installed, a brotli sibling so nginx serves them without compressing per request:
+
+    location /static/ {
+        gzip_static on;
+        brotli_static on;
+        expires max;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+"""
+
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, we only write gzip files without it
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that writes `.gz` and `.br` siblings of the hashed files.
+
+    Files that are already compressed (images, fonts) are skipped by extension and small
+    files or files that do not shrink are left alone since they gain nothing over the wire.
+    """
+
+    # Fall back to the unhashed name instead of failing the request when collectstatic was not run
+    manifest_strict = False
+
+    compress_extensions = (".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".xml", ".webmanifest", ".ico")
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        hashed_names.add(self.manifest_name)
+
+        for name in sorted(hashed_names):
+            if name.endswith(self.compress_extensions):
+                self.compress(name)
+
+    def compress(self, name):
+        """
+        Write the compressed siblings of a file. Returns the names written.
+        """
+
+        with self.open(name) as original:
+            content = original.read()
+
+        if len(content) < self.compress_min_size:
+            return []
+
+        compressed = {name + ".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed[name + ".br"] = brotli.compress(content, quality=11)
+
+        written = []
+        for compressed_name, data in compressed.items():
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+
+            if len(data) >= len(content):
+                continue
+
+            self._save(compressed_name, ContentFile(data))
+            written.append(compressed_name)
+
+        logger.debug("compressed %s: %s" % (name, ", ".join(written) or "no gain"))
+
+        return written
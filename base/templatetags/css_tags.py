@@ -0,0 +1,28 @@
+from django import template
+from django.templatetags.static import static
+
+from base.critical_css import get_critical_css, get_critical_css_name
+
+
+register = template.Library()
+
+
+@register.inclusion_tag("tags/stylesheet.html", takes_context=True)
+def stylesheet(context, path):
+    """
+    Render the stylesheet at the static `path`. When the critical css of the current page
+    type (or view) has been built it is inlined and the stylesheet is loaded without
+    blocking the first paint.
+
+    Ex: {% stylesheet 'assets/css/styles.min.css' %}
+    """
+
+    request = context.get("request")
+    resolver_match = getattr(request, "resolver_match", None)
+
+    name = get_critical_css_name(
+        page=context.get("page"),
+        view_name=resolver_match.view_name if resolver_match else None,
+    )
+
+    return {"href": static(path), "critical_css": get_critical_css(name)}
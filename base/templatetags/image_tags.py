@@ -0,0 +1,27 @@
+from django import template
+
+from wagtail.images.models import Picture
+from wagtail.images.shortcuts import get_renditions_or_not_found
+
+from base.renditions import get_responsive_filter_specs
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, sizes="100vw", **attrs):
+    """
+    Render a `<picture>` of the image over our width ladder with a `<source>` per modern
+    format and a jpeg `<img>` fallback, letting the browser pick the smallest rendition
+    that fits `sizes`.
+
+    Ex: {% responsive_image page.image sizes="(min-width: 768px) 50vw, 100vw" class="img-fluid" %}
+    """
+
+    if not image:
+        return ""
+
+    renditions = get_renditions_or_not_found(image, get_responsive_filter_specs(image.width))
+
+    return Picture(renditions, {"sizes": sizes, **attrs})
@@ -1,9 +1,38 @@
 from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from base.cache import get_breadcrumbs_cache_key
 
 
 register = template.Library()
 
 
+def get_breadcrumbs(page, request):
+    """
+    Return the title and url of each ancestor of the page (itself included) skipping the root.
+
+    Ancestors only change when a page in the path is published, moved or renamed so they
+    are cached across requests and previews (with unsaved titles) always skip the cache.
+    """
+
+    is_preview = getattr(request, "is_preview", False)
+
+    if not is_preview:
+        key = get_breadcrumbs_cache_key(page, request)
+        crumbs = cache.get(key)
+        if crumbs is not None:
+            return crumbs
+
+    ancestors = list(page.get_ancestors().filter(depth__gt=1)) + [page]
+    crumbs = [{"title": ancestor.title, "url": ancestor.get_url(request)} for ancestor in ancestors]
+
+    if not is_preview:
+        cache.set(key, crumbs, timeout=getattr(settings, "PAGE_CACHE_TIMEOUT", None))
+
+    return crumbs
+
+
 @register.inclusion_tag("tags/breadcrumbs.html", takes_context=True)
 def breadcrumbs(context):
     """
@@ -16,7 +45,7 @@ def breadcrumbs(context):
     if page is None or page.depth <= 2:
         ancestors = ()
     else:
-        ancestors = page.get_ancestors(inclusive=True).filter(depth__gt=1)
+        ancestors = get_breadcrumbs(page, request)
 
     context_breadcrumb = dict(ancestors=ancestors, request=request)
 
@@ -0,0 +1,65 @@
+from django import template
+
+from base.pagination import CURSOR_PARAM
+
+
+register = template.Library()
+
+
+def get_cursor_url(request, cursor):
+    """
+    Path of the current request at the given cursor keeping the other query params.
+    """
+
+    query = request.GET.copy()
+    query.pop("page", None)
+    query.pop(CURSOR_PARAM, None)
+
+    if cursor:
+        query[CURSOR_PARAM] = cursor
+
+    return f"{request.path}?{query.urlencode()}" if query else request.path
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    """
+    Ex: <a href="{% cursor_url page_obj.next_page_cursor %}">Next</a>
+    """
+
+    return get_cursor_url(context["request"], cursor)
+
+
+@register.inclusion_tag("tags/pagination.html", takes_context=True)
+def pagination(context, page_obj):
+    """
+    Previous / next links of a keyset page.
+
+    Ex: {% pagination page_obj %}
+    """
+
+    request = context["request"]
+
+    return {
+        "page_obj": page_obj,
+        "previous_url": get_cursor_url(request, page_obj.previous_page_cursor()) if page_obj.has_previous() else None,
+        "next_url": get_cursor_url(request, page_obj.next_page_cursor()) if page_obj.has_next() else None,
+    }
+
+
+@register.inclusion_tag("tags/pagination_links.html", takes_context=True)
+def pagination_links(context, page_obj):
+    """
+    `rel=prev` and `rel=next` links of a keyset page for the <head>, absolute so crawlers
+    follow them on any host.
+    """
+
+    request = context["request"]
+    links = {}
+
+    if page_obj.has_previous():
+        links["prev"] = request.build_absolute_uri(get_cursor_url(request, page_obj.previous_page_cursor()))
+    if page_obj.has_next():
+        links["next"] = request.build_absolute_uri(get_cursor_url(request, page_obj.next_page_cursor()))
+
+    return {"links": links}
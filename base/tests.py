@@ -1 +1,836 @@
-# Create your tests here.
+import gzip
+import json
+import logging
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone, translation
+
+from wagtail.images import get_image_model
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Locale, Page, Site, get_page_models
+from wagtail.test.utils import WagtailPageTestCase
+
+from base.blocks import FAQBlock, LinkBlock, NavTabLinksBlock
+from base.cache import (
+    BLOCK_CACHE_PREFIX,
+    CSRF_TOKEN_RE,
+    SHARED_VERSION_KEY,
+    block_cache_counters,
+    get_block_cache_stats,
+    get_version,
+)
+from base.critical_css import extract_critical_css
+from base.models import FormPage, Person, StandardPage
+from base.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from base.renditions import (
+    get_filter_specs,
+    get_page_image_ids,
+    get_responsive_filter_specs,
+    pregenerate_renditions,
+)
+from base.storage import brotli
+from base.templatetags.navigation_tags import get_breadcrumbs
+from blog.models import BlogIndexPage, BlogPage
+from help.models import HelpArticlePage, HelpCategoryPage, HelpIndexPage
+from home.models import HomePage
+from locations.models import CityIndexPage, CityPage, StationIndexPage, StationPage
+from partners.models import PartnerIndexPage, PartnerPage
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageCacheTests(WagtailPageTestCase):
+    """
+    Test suite for the server side page cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        try:
+            default_home = Page.objects.get(title="Welcome to your new Wagtail site!")
+            default_home.slug = "home-old"
+            default_home.save_revision().publish()
+            default_home.save()
+
+        except Page.DoesNotExist:
+            pass
+
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home")
+        cls.standard_page = StandardPage(title="About", slug="about")
+
+        # Set Home Page as child of root
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        # Set default Home Page as root page for Site
+        cls.site = Site.objects.get(id=1)
+        cls.site.root_page = cls.home_page
+        cls.site.save()
+
+        # Add StandardPage as child of HomePage
+        cls.home_page.add_child(instance=cls.standard_page)
+        cls.standard_page.first_published_at = timezone.now()
+        cls.standard_page.last_published_at = timezone.now()
+        cls.standard_page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def _strip_csrf_tokens(self, content):
+        return CSRF_TOKEN_RE.sub(b"", content)
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.standard_page.url)
+        second = self.client.get(self.standard_page.url)
+
+        self.assertEqual(first["X-Page-Cache"], "miss")
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertEqual(self._strip_csrf_tokens(first.content), self._strip_csrf_tokens(second.content))
+
+    def test_publish_evicts_page(self):
+        self.client.get(self.standard_page.url)
+
+        self.standard_page.title = "About us"
+        self.standard_page.save_revision().publish()
+        response = self.client.get(self.standard_page.url)
+
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "About us")
+
+    def test_publish_evicts_parent_page(self):
+        self.client.get(self.home_page.url)
+
+        self.standard_page.save_revision().publish()
+        response = self.client.get(self.home_page.url)
+
+        self.assertEqual(response["X-Page-Cache"], "miss")
+
+    def test_publish_does_not_evict_sibling_page(self):
+        sibling = StandardPage(title="Terms", slug="terms")
+        self.home_page.add_child(instance=sibling)
+        sibling.save_revision().publish()
+
+        self.client.get(sibling.url)
+        self.standard_page.save_revision().publish()
+        response = self.client.get(sibling.url)
+
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_lost_version_does_not_serve_old_page(self):
+        self.client.get(self.standard_page.url)
+        version = get_version(SHARED_VERSION_KEY)
+
+        # ex: culled by the cache, the page stored under the old version must not be served
+        cache.delete(SHARED_VERSION_KEY)
+        response = self.client.get(self.standard_page.url)
+
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertGreater(get_version(SHARED_VERSION_KEY), version)
+
+    def test_authenticated_users_bypass_cache(self):
+        user = get_user_model().objects.create_user(username="veer", email="veer@email.com", password="secret")
+        self.client.force_login(user)
+
+        self.client.get(self.standard_page.url)
+        response = self.client.get(self.standard_page.url)
+
+        self.assertNotIn("X-Page-Cache", response)
+
+    def test_unknown_query_params_bypass_cache(self):
+        self.client.get(self.standard_page.url, {"utm_source": "bot"})
+        response = self.client.get(self.standard_page.url, {"utm_source": "bot"})
+
+        self.assertNotIn("X-Page-Cache", response)
+
+    def test_csrf_token_is_fresh_for_each_visitor(self):
+        self.client.get(self.standard_page.url)
+        response = self.client.get(self.standard_page.url)
+
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, "__csrf_token__")
+
+
+class BreadcrumbsTests(WagtailPageTestCase):
+    """
+    Test suite for the cached breadcrumbs of a page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home-crumbs")
+        cls.about_page = StandardPage(title="About", slug="about")
+        cls.team_page = StandardPage(title="Team", slug="team")
+
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+        cls.home_page.add_child(instance=cls.about_page)
+        cls.about_page.save_revision().publish()
+        cls.about_page.add_child(instance=cls.team_page)
+        cls.team_page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_breadcrumbs_list_ancestors_without_root(self):
+        crumbs = get_breadcrumbs(self.team_page, request=None)
+
+        self.assertEqual([crumb["title"] for crumb in crumbs], ["Home", "About", "Team"])
+
+    def test_cached_breadcrumbs_cost_no_queries(self):
+        get_breadcrumbs(self.team_page, request=None)
+
+        with self.assertNumQueries(0):
+            get_breadcrumbs(self.team_page, request=None)
+
+    def test_renaming_an_ancestor_evicts_breadcrumbs(self):
+        get_breadcrumbs(self.team_page, request=None)
+
+        self.about_page.title = "About us"
+        self.about_page.save_revision().publish()
+        crumbs = get_breadcrumbs(self.team_page, request=None)
+
+        self.assertEqual(crumbs[1]["title"], "About us")
+
+    def test_moving_a_page_evicts_breadcrumbs(self):
+        get_breadcrumbs(self.team_page, request=None)
+
+        self.team_page.move(self.home_page, pos="last-child")
+        self.team_page.refresh_from_db()
+        crumbs = get_breadcrumbs(self.team_page, request=None)
+
+        self.assertEqual([crumb["title"] for crumb in crumbs], ["Home", "Team"])
+
+
+class TranslationUrlsTests(WagtailPageTestCase):
+    """
+    Test suite for the cached translation map used by the hreflang links.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home-translations")
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        cls.site = Site.objects.get(id=1)
+        cls.site.root_page = cls.home_page
+        cls.site.save()
+
+        cls.english = Locale.objects.create(language_code="en")
+        cls.english_home_page = cls.home_page.copy_for_translation(cls.english)
+        cls.english_home_page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_alternate_urls_list_other_live_translations(self):
+        urls = self.home_page.get_alternate_urls()
+
+        self.assertEqual(urls, {"en": "http://localhost/en/"})
+
+    def test_default_locale_url_is_the_spanish_translation(self):
+        self.assertEqual(self.english_home_page.get_default_locale_url(), "http://localhost/")
+
+    def test_cached_alternate_urls_cost_no_queries(self):
+        self.home_page.get_alternate_urls()
+
+        with self.assertNumQueries(0):
+            self.home_page.get_alternate_urls()
+            self.english_home_page.get_alternate_urls()
+            self.english_home_page.get_default_locale_url()
+
+    def test_unpublishing_a_translation_evicts_the_map(self):
+        self.home_page.get_alternate_urls()
+
+        self.english_home_page.refresh_from_db()
+        self.english_home_page.unpublish()
+
+        self.assertEqual(self.home_page.get_alternate_urls(), {})
+
+
+class LdSchemaTests(WagtailPageTestCase):
+    """
+    Test suite for the JSON-LD schema stored at publish time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home-ld")
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+    def test_publish_stores_ld_schema(self):
+        self.home_page.refresh_from_db()
+
+        self.assertIn('"@graph"', self.home_page.ld_schema)
+        self.assertEqual(self.home_page.ld_entity(), self.home_page.ld_schema)
+
+    def test_ld_entity_is_built_on_the_fly_without_stored_schema(self):
+        HomePage.objects.filter(pk=self.home_page.pk).update(ld_schema="")
+        page = HomePage.objects.get(pk=self.home_page.pk)
+
+        self.assertEqual(page.ld_entity(), page.build_ld_entity())
+
+    def test_rebuild_ld_schemas_command(self):
+        HomePage.objects.filter(pk=self.home_page.pk).update(ld_schema="")
+
+        call_command("rebuild_ld_schemas", stdout=StringIO())
+
+        self.home_page.refresh_from_db()
+        self.assertIn('"@graph"', self.home_page.ld_schema)
+
+
+class RenditionsTests(WagtailPageTestCase):
+    """
+    Test suite for the rendition pre-generation.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.image = get_image_model().objects.create(title="Bus", file=get_test_image_file())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_filter_specs_are_discovered_from_templates(self):
+        specs = get_filter_specs()
+
+        self.assertIn("original", specs)  # partner logos
+        self.assertIn("fill-400x300", specs)  # blog index cards
+        self.assertIn("fill-50x50", specs)  # Person.thumb_image
+
+    def test_pregenerate_renditions_creates_missing_renditions(self):
+        generated = pregenerate_renditions([self.image.pk], specs=["width-100", "fill-10x10"], processes=1)
+        responsive_specs = get_responsive_filter_specs(self.image.width)
+
+        self.assertEqual(generated, 2 + len(responsive_specs))
+        self.assertEqual(self.image.renditions.count(), 2 + len(responsive_specs))
+
+    def test_pregenerate_renditions_skips_existing_renditions(self):
+        self.image.get_rendition("width-100")
+
+        generated = pregenerate_renditions([self.image.pk], specs=["width-100", "fill-10x10"], processes=1)
+
+        self.assertEqual(generated, 1 + len(get_responsive_filter_specs(self.image.width)))
+
+    def test_page_image_ids(self):
+        page = StandardPage(title="About", slug="about", image=self.image)
+
+        self.assertEqual(get_page_image_ids(page), [self.image.pk])
+
+    def test_page_image_ids_of_streamfields(self):
+        other = get_image_model().objects.create(title="Terminal", file=get_test_image_file())
+        page = StandardPage(title="About", slug="about", body=[("image_block", {"image": other})])
+
+        self.assertEqual(get_page_image_ids(page), [other.pk])
+
+
+class ResponsiveImageTests(WagtailPageTestCase):
+    """
+    Test suite for the `responsive_image` template tag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.image = get_image_model().objects.create(title="Bus", file=get_test_image_file(size=(1000, 500)))
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, template_string, **context):
+        return Template("{% load image_tags %}" + template_string).render(Context(context))
+
+    def test_ladder_stops_at_the_image_width(self):
+        specs = get_responsive_filter_specs(1000)
+
+        self.assertEqual(
+            [spec for spec in specs if spec.endswith("jpeg")],
+            [
+                "width-320|format-jpeg",
+                "width-480|format-jpeg",
+                "width-640|format-jpeg",
+                "width-960|format-jpeg",
+                "width-1280|format-jpeg",
+            ],
+        )
+
+    def test_responsive_image_renders_sources_and_fallback(self):
+        html = self.render('{% responsive_image image sizes="50vw" class="img-fluid" %}', image=self.image)
+
+        self.assertIn('<source sizes="50vw" srcset="', html)
+        self.assertIn('type="image/avif"', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(".width-960.format-jpeg.jpg 960w", html)
+        self.assertIn('class="img-fluid"', html)
+
+    def test_responsive_image_without_image_renders_nothing(self):
+        self.assertEqual(self.render("{% responsive_image image %}", image=None), "")
+
+    def test_responsive_renditions_are_pregenerated(self):
+        generated = pregenerate_renditions([self.image.pk], specs=["width-100"], processes=1)
+
+        self.assertEqual(generated, 1 + len(get_responsive_filter_specs(1000)))
+
+
+class BlockCacheTests(WagtailPageTestCase):
+    """
+    Test suite for the fragment cache of rendered blocks.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home-blocks")
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        cls.site = Site.objects.get(id=1)
+        cls.site.root_page = cls.home_page
+        cls.site.save()
+
+    def setUp(self):
+        cache.clear()
+        block_cache_counters.clear()
+
+        self.faq_block = FAQBlock()
+        self.faq_value = self.faq_block.to_python(
+            {"title": "Preguntas", "item": [{"question": "Hay wifi?", "answer": "<p>Si</p>"}]}
+        )
+
+    def test_identical_blocks_are_rendered_once(self):
+        first = self.faq_block.render(self.faq_value)
+        second = FAQBlock().render(self.faq_block.to_python(self.faq_block.get_prep_value(self.faq_value)))
+
+        self.assertEqual(first, second)
+        self.assertEqual(get_block_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_counters_are_written_to_the_cache_once_per_interval(self):
+        for _ in range(3):
+            self.faq_block.render(self.faq_value)
+
+        self.assertIsNone(cache.get(f"{BLOCK_CACHE_PREFIX}:counter:hit"))
+        self.assertEqual(get_block_cache_stats(), {"hits": 2, "misses": 1})
+
+        with self.settings(CACHE_COUNTERS_FLUSH_INTERVAL=0):
+            self.faq_block.render(self.faq_value)
+
+        self.assertEqual(cache.get(f"{BLOCK_CACHE_PREFIX}:counter:hit"), 3)
+
+    def test_changed_block_is_a_miss(self):
+        self.faq_block.render(self.faq_value)
+        self.faq_value["title"] = "FAQ"
+        html = self.faq_block.render(self.faq_value)
+
+        self.assertIn("FAQ", html)
+        self.assertEqual(get_block_cache_stats(), {"hits": 0, "misses": 2})
+
+    def test_blocks_are_cached_per_language(self):
+        self.faq_block.render(self.faq_value)
+
+        with translation.override("en"):
+            self.faq_block.render(self.faq_value)
+
+        self.assertEqual(get_block_cache_stats(), {"hits": 0, "misses": 2})
+
+    def test_publishing_a_linked_page_evicts_blocks(self):
+        block = LinkBlock()
+        raw_value = {"heading_text": "Links", "item": [{"title": "", "page": self.home_page.pk}]}
+        block.render(block.to_python(raw_value))
+
+        self.home_page.title = "Inicio"
+        self.home_page.save_revision().publish()
+        html = block.render(block.to_python(raw_value))
+
+        self.assertIn("Inicio", html)
+
+    def test_publishing_another_page_keeps_blocks(self):
+        block = LinkBlock()
+        raw_value = {"heading_text": "Links", "item": [{"title": "", "page": self.home_page.pk}]}
+        block.render(block.to_python(raw_value))
+        self.faq_block.render(self.faq_value)
+
+        page = StandardPage(title="Terms", slug="terms")
+        self.home_page.add_child(instance=page)
+        page.save_revision().publish()
+        block.render(block.to_python(raw_value))
+        self.faq_block.render(self.faq_value)
+
+        self.assertEqual(get_block_cache_stats(), {"hits": 2, "misses": 2})
+
+
+class ConditionalGetTests(WagtailPageTestCase):
+    """
+    Test suite for the ETag | Last-Modified validators of cached pages.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.home_page = HomePage(title="Home", slug="home-conditional")
+        cls.standard_page = StandardPage(title="About", slug="about")
+
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        cls.site = Site.objects.get(id=1)
+        cls.site.root_page = cls.home_page
+        cls.site.save()
+
+        cls.home_page.add_child(instance=cls.standard_page)
+        cls.standard_page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_response_has_validators(self):
+        response = self.client.get(self.standard_page.url)
+
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+    def test_logged_in_response_has_no_validators(self):
+        user = get_user_model().objects.create_user(username="veer", email="veer@email.com", password="secret")
+        self.client.force_login(user)
+
+        response = self.client.get(self.standard_page.url)
+
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_etag_is_the_same_for_every_visitor(self):
+        first = self.client.get(self.standard_page.url)
+        self.client.cookies.clear()
+        second = self.client.get(self.standard_page.url)
+
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.standard_page.url)["ETag"]
+
+        with self.assertTemplateNotUsed("base/standard_page.html"):
+            response = self.client.get(self.standard_page.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since_is_not_modified_before_rendering(self):
+        last_modified = self.client.get(self.standard_page.url)["Last-Modified"]
+        cache.clear()
+
+        with self.assertTemplateNotUsed("base/standard_page.html"):
+            response = self.client.get(self.standard_page.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_publish_changes_validators(self):
+        etag = self.client.get(self.standard_page.url)["ETag"]
+
+        self.standard_page.title = "About us"
+        self.standard_page.save_revision().publish()
+        response = self.client.get(self.standard_page.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_snippet_change_evicts_page(self):
+        response = self.client.get(self.standard_page.url)
+        last_modified = response["Last-Modified"]
+
+        time.sleep(1)
+        Person.objects.create(first_name="Veer", last_name="Singh", job_title="Editor")
+        response = self.client.get(self.standard_page.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, BLOCK_CACHE_ENABLED=False)
+class DeterministicRenderTests(WagtailPageTestCase):
+    """
+    Every page type has to render byte for byte the same html on each request between
+    publishes, otherwise cached html and ETags are useless. The csrf token is the only
+    thing allowed to change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Page.objects.get(id=1).specific
+        cls.image = get_image_model().objects.create(title="Bus", file=get_test_image_file())
+
+        nav_tab = {
+            "type": "nav_tab",
+            "value": {"title": "Info", "item": [{"title": "Horarios", "content": "<p>Todos los dias</p>"}]},
+        }
+        nav_tab_links = {
+            "type": "Links",
+            "value": {"title": "Rutas", "item": [{"title": "Norte", "item": []}, {"title": "Sur", "item": []}]},
+        }
+
+        cls.home_page = HomePage(title="Home", slug="home-render", body=[nav_tab])
+        cls.root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        cls.site = Site.objects.get(id=1)
+        cls.site.root_page = cls.home_page
+        cls.site.save()
+
+        cls.pages = [cls.home_page]
+
+        def add(parent, page):
+            parent.add_child(instance=page)
+            page.save_revision().publish()
+            cls.pages.append(page)
+            return page
+
+        add(cls.home_page, StandardPage(title="About", slug="about", body=[nav_tab]))
+        add(cls.home_page, FormPage(title="Feedback", slug="article-feedback-form"))
+
+        blog_index = add(cls.home_page, BlogIndexPage(title="Blog", slug="blog"))
+        add(blog_index, BlogPage(title="Post", slug="post", body=[nav_tab]))
+
+        city_index = add(cls.home_page, CityIndexPage(title="Cities", slug="cities"))
+        city = add(city_index, CityPage(title="Asuncion", slug="asuncion", body=[nav_tab], links=[nav_tab_links]))
+
+        station_index = add(cls.home_page, StationIndexPage(title="Stations", slug="stations"))
+        station = StationPage(
+            title="Terminal",
+            slug="terminal",
+            address="Asuncion",
+            lat_long="-25.29,-57.64",
+            image=cls.image,
+            links=[nav_tab_links],
+        )
+        add(city, station)
+        cls.pages.append(station_index)
+
+        partner_index = add(cls.home_page, PartnerIndexPage(title="Partners", slug="partners"))
+        add(
+            partner_index,
+            PartnerPage(
+                title="Nsa",
+                slug="nsa",
+                info=[{**nav_tab, "type": "Info"}],
+                links=[nav_tab_links],
+                routes=[nav_tab_links],
+            ),
+        )
+
+        help_index = add(cls.home_page, HelpIndexPage(title="Help", slug="help"))
+        help_category = add(help_index, HelpCategoryPage(title="Tickets", slug="tickets"))
+        add(help_category, HelpArticlePage(title="Refunds", slug="refunds", body=[nav_tab]))
+
+    def test_every_page_type_is_covered(self):
+        page_types = {type(page) for page in self.pages}
+
+        self.assertEqual(page_types, set(get_page_models()) - {Page})
+
+    def test_pages_render_the_same_html_twice(self):
+        for page in self.pages:
+            with self.subTest(page=type(page).__name__):
+                first = self.client.get(page.url)
+                self.client.cookies.clear()
+                second = self.client.get(page.url)
+
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(CSRF_TOKEN_RE.sub(b"", first.content), CSRF_TOKEN_RE.sub(b"", second.content))
+
+    def test_tab_ids_are_derived_from_content(self):
+        block = NavTabLinksBlock()
+        value = block.to_python({"title": "Rutas", "item": [{"title": "Norte", "item": []}]})
+        other_value = block.to_python({"title": "Destinos", "item": [{"title": "Norte", "item": []}]})
+
+        self.assertEqual(block.render(value), block.render(value))
+        self.assertNotEqual(block.get_context(value)["tabs_id"], block.get_context(other_value)["tabs_id"])
+
+
+class StaticStorageTests(SimpleTestCase):
+    """
+    Test suite for the hashed and precompressed static files storage.
+    """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        self.source = Path(tmp.name) / "static"
+        self.root = Path(tmp.name) / "staticfiles"
+        (self.source / "css").mkdir(parents=True)
+        (self.source / "img").mkdir()
+
+        (self.source / "css" / "styles.css").write_text(
+            "body { background: url('../img/bus.png'); }\n" + ".card { margin: 0; }\n" * 100
+        )
+        (self.source / "css" / "tiny.css").write_text("a { color: red; }")
+        (self.source / "img" / "bus.png").write_bytes(b"\x89PNG" + b"0" * 1024)
+
+        settings = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STORAGES={"staticfiles": {"BACKEND": "base.storage.CompressedManifestStaticFilesStorage"}},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_files_are_hashed_in_the_manifest(self):
+        manifest = json.loads((self.root / "staticfiles.json").read_text())
+        hashed_name = manifest["paths"]["css/styles.css"]
+
+        self.assertRegex(hashed_name, r"^css/styles\.[0-9a-f]{12}\.css$")
+        self.assertEqual(staticfiles_storage.url("css/styles.css"), f"/static/{hashed_name}")
+
+        css = (self.root / hashed_name).read_text()
+        self.assertIn(manifest["paths"]["img/bus.png"].removeprefix("img/"), css)
+
+    def test_text_files_get_a_gzip_sibling(self):
+        hashed_name = staticfiles_storage.stored_name("css/styles.css")
+        gzipped = self.root / f"{hashed_name}.gz"
+
+        self.assertTrue(gzipped.exists())
+        self.assertEqual(gzip.decompress(gzipped.read_bytes()), (self.root / hashed_name).read_bytes())
+
+    def test_small_and_binary_files_are_not_compressed(self):
+        self.assertFalse(list(self.root.glob("css/tiny.*.css.gz")))
+        self.assertFalse(list(self.root.glob("img/*.gz")))
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_text_files_get_a_brotli_sibling(self):
+        hashed_name = staticfiles_storage.stored_name("css/styles.css")
+        compressed = self.root / f"{hashed_name}.br"
+
+        self.assertEqual(brotli.decompress(compressed.read_bytes()), (self.root / hashed_name).read_bytes())
+
+
+class CriticalCssTests(WagtailPageTestCase):
+    """
+    Test suite for the critical css extracted and inlined per page template.
+    """
+
+    css = (
+        '@charset "utf-8";:root{--bs-blue:#0d6efd}body{margin:0}'
+        ".navbar,.footer{display:flex}.navbar .nav-link:hover{color:red}.modal{display:none}"
+        "#main-content{min-height:75vh}table td{padding:0}"
+        "@media (min-width:768px){.navbar{padding:1rem}.modal-dialog{margin:auto}}"
+        "@keyframes spin{to{transform:rotate(360deg)}}"
+        ".hero{background:url(../img/bus.png)}"
+    )
+    html = (
+        "<html><body><nav class='navbar'><a class='nav-link' href='/'>Home</a></nav>"
+        "<main id='main-content'><section class='hero'></section></main>"
+        "<div class='modal'><div class='modal-dialog'></div></div></body></html>"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+        cls.home_page = HomePage(title="Home", slug="home-critical")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+    def setUp(self):
+        cache.clear()
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        self.critical_dir = Path(tmp.name) / "critical"
+        self.static_dir = Path(tmp.name) / "static"
+        (self.static_dir / "assets" / "css").mkdir(parents=True)
+        (self.static_dir / "assets" / "css" / "styles.min.css").write_text(self.css)
+
+        settings = override_settings(CRITICAL_CSS_DIR=self.critical_dir, STATICFILES_DIRS=[self.static_dir])
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_keeps_only_rules_matching_the_top_of_the_page(self):
+        critical = extract_critical_css(self.css, self.html, "assets/css/styles.min.css", fold=5)
+
+        self.assertIn(":root{--bs-blue:#0d6efd}", critical)
+        self.assertIn(".navbar{display:flex}", critical)
+        self.assertIn(".navbar .nav-link:hover{color:red}", critical)
+        self.assertIn("#main-content{min-height:75vh}", critical)
+        self.assertIn("@media (min-width:768px){.navbar{padding:1rem}}", critical)
+        self.assertNotIn(".modal", critical)
+        self.assertNotIn("table", critical)
+        self.assertNotIn("@keyframes", critical)
+
+    def test_relative_urls_point_to_the_static_files(self):
+        critical = extract_critical_css(self.css, self.html, "assets/css/styles.min.css")
+
+        self.assertIn('.hero{background:url("/static/assets/img/bus.png")}', critical)
+
+    def test_stylesheet_blocks_without_critical_css(self):
+        html = Template("{% load css_tags %}{% stylesheet 'assets/css/styles.min.css' %}").render(
+            Context({"page": self.home_page})
+        )
+
+        self.assertIn('<link rel="stylesheet" type="text/css" href="/static/assets/css/styles.min.css" />', html)
+        self.assertNotIn("<style>", html)
+
+    def test_build_command_inlines_critical_css_in_the_page(self):
+        out = StringIO()
+        with override_settings(ALLOWED_HOSTS=["localhost", "testserver"]):
+            call_command("build_critical_css", only=["home"], stdout=out, stderr=StringIO())
+
+        self.assertIn("Built 1 critical css files.", out.getvalue())
+        self.assertTrue((self.critical_dir / "home.css").exists())
+
+        response = self.client.get(self.home_page.url)
+
+        self.assertContains(response, "<style>")
+        self.assertContains(response, ":root{--bs-blue:#0d6efd}")
+        self.assertContains(response, 'rel="preload" href="/static/assets/css/styles.min.css" as="style"')
+        self.assertNotContains(response, ".modal{display:none}")
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    """
+    Test suite for the keyset pagination of sequences.
+    """
+
+    def setUp(self):
+        # (id, score) sorted by score then id like the search results
+        self.results = sorted([(i, i % 3) for i in range(25)], key=lambda result: (-result[1], result[0]))
+        self.paginator = KeysetPaginator(self.results, 10, key=lambda result: (-result[1], result[0]))
+
+    def test_cursors_round_trip(self):
+        now = timezone.now()
+
+        self.assertEqual(decode_cursor(encode_cursor("n", [now, 3])), ("n", [now.isoformat(), 3]))
+
+    def test_pages_follow_the_cursors(self):
+        first = self.paginator.get_page()
+        second = self.paginator.get_page(first.next_page_cursor())
+        third = self.paginator.get_page(second.next_page_cursor())
+
+        self.assertEqual(list(first) + list(second) + list(third), self.results)
+        self.assertEqual([first.has_previous(), first.has_next()], [False, True])
+        self.assertEqual([third.has_previous(), third.has_next()], [True, False])
+
+        self.assertEqual(list(self.paginator.get_page(second.previous_page_cursor())), self.results[:10])
+        self.assertEqual(list(self.paginator.get_page(third.previous_page_cursor())), self.results[10:20])
+
+    def test_invalid_cursor_is_the_first_page(self):
+        for cursor in ("garbage", encode_cursor("x", [1]), "W10"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.paginator.get_page(cursor)), self.results[:10])
@@ -5,13 +5,16 @@ at certain points in Wagtail’s execution, such as when a page is saved or when
 main menu is constructed.
 """
 
+from wagtail import hooks
 from wagtail.snippets.models import register_snippet
 from wagtail.snippets.views.snippets import SnippetViewSet, SnippetViewSetGroup
 
-from base.models import Person
+from base.cache import serve_cached_page
+from base.models import BasePage, Person
 from blog.models import BlogCategory
 from locations.models import Service
 from partners.models import Amenity
+from trips.models import Departure, Operator, Route, Stop
 
 
 class ServiceViewSet(SnippetViewSet):
@@ -50,3 +53,60 @@ class MiscSnippetViewSetGroup(SnippetViewSetGroup):
 
 
 register_snippet(MiscSnippetViewSetGroup)
+
+
+class OperatorViewSet(SnippetViewSet):
+    model = Operator
+    icon = "group"
+    list_display = ("name", "partner", "is_active")
+    search_fields = ("name",)
+
+
+class StopViewSet(SnippetViewSet):
+    model = Stop
+    icon = "site"
+    list_display = ("name", "city", "station")
+    search_fields = ("name",)
+
+
+class RouteViewSet(SnippetViewSet):
+    model = Route
+    icon = "redirect"
+    list_display = ("name", "operator", "code", "is_active")
+    list_filter = ("operator", "is_active")
+    search_fields = ("name", "code")
+
+
+class DepartureViewSet(SnippetViewSet):
+    model = Departure
+    icon = "date"
+    list_display = ("route", "departs_at", "seats", "is_cancelled")
+    list_filter = ("route", "is_cancelled")
+
+
+class TripsSnippetViewSetGroup(SnippetViewSetGroup):
+    menu_label = "Trips"
+    menu_icon = "calendar-alt"
+    menu_order = 310
+    items = (OperatorViewSet, StopViewSet, RouteViewSet, DepartureViewSet)
+
+
+register_snippet(TripsSnippetViewSetGroup)
+
+
+@hooks.register("on_serve_page")
+def page_cache(next_serve_page):
+    """
+    Serve anonymous visitors from the server side page cache. See `base.cache`
+    """
+
+    def inner(page, request, args, kwargs):
+        def serve():
+            return next_serve_page(page, request, args, kwargs)
+
+        if not isinstance(page, BasePage):
+            return serve()
+
+        return serve_cached_page(page, request, serve)
+
+    return inner
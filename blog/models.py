@@ -1,14 +1,12 @@
-import json
 import logging
 
 from django import forms
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db import models
 from django.db.models import Count
 from django.shortcuts import redirect, render
 from django.utils.functional import cached_property
-from django.utils.html import mark_safe, strip_tags
+from django.utils.html import strip_tags
 
 from wagtail.admin.panels import FieldPanel, InlinePanel, MultiFieldPanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
@@ -23,6 +21,7 @@ from taggit.models import Tag, TaggedItemBase
 from base.blocks import BaseStreamBlock
 from base.forms import PageFeedbackForm
 from base.models import BasePage
+from base.pagination import CURSOR_PARAM, KeysetPaginator
 
 
 logger = logging.getLogger(__name__)
@@ -76,13 +75,7 @@ class BlogIndexPage(RoutablePageMixin, BasePage):
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
 
-        qs = self.get_children().live().order_by("-first_published_at")
-
-        paginator = Paginator(qs, 9)
-        page_number = request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
-
-        context["posts"] = context["page_obj"] = page_obj
+        context["posts"] = context["page_obj"] = self.paginate_posts(request, self.get_posts())
 
         return context
 
@@ -111,8 +104,8 @@ class BlogIndexPage(RoutablePageMixin, BasePage):
                 messages.info(request, msg)
             return redirect(self.url)
 
-        posts = self.get_posts(tag=tag)
-        context = {"tag": tag, "posts": posts}
+        posts = self.paginate_posts(request, self.get_posts(tag=tag))
+        context = {"tag": tag, "posts": posts, "page_obj": posts}
         return render(request, "blog/blog_index_page.html", context)
 
     @route(r"^categories/$", name="category_archive")
@@ -130,9 +123,9 @@ class BlogIndexPage(RoutablePageMixin, BasePage):
                 messages.info(request, msg)
             return redirect(self.url)
 
-        posts = self.get_posts().filter(categories=category)
+        posts = self.paginate_posts(request, self.get_posts().filter(categories=category))
 
-        context = {"category": category, "posts": posts}
+        context = {"category": category, "posts": posts, "page_obj": posts}
         return render(request, "blog/blog_index_page.html", context)
 
     def get_posts(self, tag=None):
@@ -145,22 +138,23 @@ class BlogIndexPage(RoutablePageMixin, BasePage):
         posts = posts.filter(tags=tag) if tag else posts
         return posts
 
-    @cached_property
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_article_schema(),
-                    self._get_faq_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def paginate_posts(self, request, posts):
+        """
+        Newest posts first, a page after the other by keyset so no page counts the posts.
+        See `base.pagination`
+        """
+
+        paginator = KeysetPaginator(posts.defer_streamfields(), 9, ordering=("-first_published_at", "-pk"))
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_article_schema(),
+            self._get_faq_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
@@ -329,22 +323,14 @@ class BlogPage(BasePage):
         words = len(text.split(" "))
         return round(words / 200)
 
-    @cached_property
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_article_schema(),
-                    self._get_faq_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_article_schema(),
+            self._get_faq_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
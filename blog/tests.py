@@ -1,12 +1,17 @@
 import logging
+from datetime import timedelta
 from unittest import skip
 
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from wagtail.models import Page, Site
 from wagtail.test.utils import WagtailPageTestCase
 from wagtail.test.utils.form_data import nested_form_data, streamfield
 
+from base.templatetags.pagination_tags import get_cursor_url
 from blog.models import BlogIndexPage, BlogPage
 from home.models import HomePage
 
@@ -182,3 +187,124 @@ class BlogPageTests(WagtailPageTestCase):
 
     def test_blog_page_subpages(self):
         self.assertAllowedSubpageTypes(parent_model=BlogPage, child_models={})
+
+
+class BlogPaginationTests(WagtailPageTestCase):
+    """
+    Test suite for the keyset pagination of the blog index and its archives.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+
+        cls.home_page = HomePage(title="Home", slug="home-blog-pagination")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        cls.blog_index_page = BlogIndexPage(title="Blog", slug="blog")
+        cls.home_page.add_child(instance=cls.blog_index_page)
+        cls.blog_index_page.save_revision().publish()
+
+        # Pairs of posts published at the same time to check ties are neither skipped nor repeated
+        now = timezone.now()
+        for i in range(20):
+            post = BlogPage(title=f"Post {i}", slug=f"post-{i}")
+            cls.blog_index_page.add_child(instance=post)
+            post.save_revision().publish()
+            BlogPage.objects.filter(pk=post.pk).update(first_published_at=now - timedelta(hours=i // 2))
+
+        cls.posts = list(BlogPage.objects.order_by("-first_published_at", "-pk"))
+
+    def setUp(self):
+        cache.clear()
+
+    def get_pages(self, url):
+        """
+        Follow the next links from the url returning the posts of each page.
+        """
+
+        pages = []
+        while url:
+            response = self.client.get(url)
+            page_obj = response.context["page_obj"]
+            pages.append(list(page_obj))
+            url = get_cursor_url(response.wsgi_request, page_obj.next_page_cursor()) if page_obj.has_next() else None
+
+        return pages
+
+    def test_next_links_walk_every_post_once(self):
+        pages = self.get_pages(self.blog_index_page.url)
+
+        self.assertEqual([len(page) for page in pages], [9, 9, 2])
+        self.assertEqual([post for page in pages for post in page], self.posts)
+
+    def test_previous_links_walk_back(self):
+        response = self.client.get(self.blog_index_page.url)
+        response = self.client.get(
+            get_cursor_url(response.wsgi_request, response.context["page_obj"].next_page_cursor())
+        )
+        second_page = response.context["page_obj"]
+
+        response = self.client.get(get_cursor_url(response.wsgi_request, second_page.previous_page_cursor()))
+        first_page = response.context["page_obj"]
+
+        self.assertEqual(list(first_page), self.posts[:9])
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+    def test_pages_are_never_counted(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_pages(self.blog_index_page.url)
+
+        self.assertFalse([query for query in queries if "COUNT(" in query["sql"].upper()])
+
+    def test_crawlers_get_rel_links(self):
+        response = self.client.get(self.blog_index_page.url)
+        next_url = get_cursor_url(response.wsgi_request, response.context["page_obj"].next_page_cursor())
+
+        self.assertContains(response, f'<link rel="next" href="http://testserver{next_url}" />', html=True)
+        self.assertNotContains(response, 'rel="prev"')
+
+    def test_next_link_is_stable_when_a_post_is_published(self):
+        response = self.client.get(self.blog_index_page.url)
+        next_url = get_cursor_url(response.wsgi_request, response.context["page_obj"].next_page_cursor())
+
+        post = BlogPage(title="Newest", slug="newest")
+        self.blog_index_page.add_child(instance=post)
+        post.save_revision().publish()
+
+        response = self.client.get(next_url)
+
+        self.assertEqual(list(response.context["page_obj"]), self.posts[9:18])
+
+    def test_posts_without_a_publish_date_come_last(self):
+        legacy = self.posts[3:6]
+        BlogPage.objects.filter(pk__in=[post.pk for post in legacy]).update(first_published_at=None)
+        posts = [post for post in self.posts if post not in legacy] + sorted(legacy, key=lambda post: -post.pk)
+
+        pages = self.get_pages(self.blog_index_page.url)
+        self.assertEqual([post for page in pages for post in page], posts)
+
+        cache.clear()
+        response = self.client.get(self.blog_index_page.url)
+        for _ in range(2):
+            next_cursor = response.context["page_obj"].next_page_cursor()
+            response = self.client.get(get_cursor_url(response.wsgi_request, next_cursor))
+
+        # The last page starts with a post without a date
+        previous_cursor = response.context["page_obj"].previous_page_cursor()
+        response = self.client.get(get_cursor_url(response.wsgi_request, previous_cursor))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_obj"]), posts[9:18])
+
+    def test_invalid_cursor_shows_the_first_page(self):
+        response = self.client.get(self.blog_index_page.url, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["page_obj"]), self.posts[:9])
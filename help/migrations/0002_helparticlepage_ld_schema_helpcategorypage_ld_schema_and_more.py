@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('help', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='helparticlepage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+        migrations.AddField(
+            model_name='helpcategorypage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+        migrations.AddField(
+            model_name='helpindexpage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_alter_homepage_options_homepage_body_homepage_faq_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homepage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+    ]
@@ -1,7 +1,4 @@
-import json
-
 from django.db import models
-from django.utils.html import mark_safe
 
 from wagtail.admin.panels import FieldPanel
 from wagtail.fields import StreamField
@@ -91,17 +88,10 @@ class HomePage(BasePage):
     def __str__(self):
         return self.title
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_image_schema(),
-                    self._get_article_schema(),
-                    self._get_faq_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_image_schema(),
+            self._get_article_schema(),
+            self._get_faq_schema(),
+            self._get_organisation_schema(),
+        ]
@@ -0,0 +1,273 @@
+"""
+Origin / destination autocomplete over the live cities and stations.
+
+Every worker keeps an in memory prefix index: a sorted list of the folded names of each place
+(titles in every locale plus their `other_names`) starting at each of their words, so a
+prefix lookup is a binary search followed by a short scan and never touches the database.
+
+A place is all the translations of a page. When one is published, unpublished, moved or
+deleted its translation key is added to a log in the cache, one key per change numbered by
+the version of the index (`cache.add` / `incr`), and the other workers reload just those
+places on their next lookup. A worker more than `AUTOCOMPLETE_MAX_CHANGES` changes behind,
+or missing one of them, rebuilds the whole index.
+"""
+
+import bisect
+import logging
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count
+
+from wagtail.models import Locale, Page, ReferenceIndex
+
+from base.cache import get_version
+from locations.models import CityPage, StationPage
+from search.text import WORD_RE, fold
+
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_VERSION_KEY = "autocomplete:version"
+AUTOCOMPLETE_CHANGES_KEY = "autocomplete:changes"
+AUTOCOMPLETE_MAX_CHANGES = 100
+AUTOCOMPLETE_CHANGES_TIMEOUT = 60 * 60 * 24  # one day, workers further behind rebuild the index
+
+# Stop scanning very short prefixes matching most of the index
+AUTOCOMPLETE_MAX_SCAN = 2000
+
+PLACE_KINDS = {CityPage: "city", StationPage: "station"}
+
+_index = None
+
+
+def normalize(text):
+    return " ".join(WORD_RE.findall(fold(text)))
+
+
+@dataclass
+class Place:
+    """
+    A city or station in all its locales.
+    """
+
+    translation_key: str
+    kind: str
+    pages: dict = field(default_factory=dict)  # locale id -> {"id", "name", "url"}
+    other_names: set = field(default_factory=set)
+    popularity: int = 0
+
+    def get_names(self):
+        return {page["name"] for page in self.pages.values()} | self.other_names
+
+    def get_keys(self):
+        """
+        The folded names starting at each of their words with the position of the word,
+        so `del este` and `este` both lead to Ciudad del Este.
+        """
+
+        keys = set()
+        for name in self.get_names():
+            words = normalize(name).split()
+            for position in range(len(words)):
+                keys.add((" ".join(words[position:]), position, self.translation_key))
+
+        return keys
+
+    def get_page(self, locale_id, fallback_locale_id=None):
+        return self.pages.get(locale_id) or self.pages.get(fallback_locale_id) or next(iter(self.pages.values()))
+
+
+def get_popularity(page_ids):
+    """
+    Number of references to each page from the rest of the site, ie. how many routes,
+    partners and articles link to it.
+    """
+
+    counts = (
+        ReferenceIndex.objects.filter(
+            to_content_type=ContentType.objects.get_for_model(Page),
+            to_object_id__in=[str(page_id) for page_id in page_ids],
+        )
+        .values_list("to_object_id")
+        .annotate(count=Count("id"))
+    )
+
+    return {int(object_id): count for object_id, count in counts}
+
+
+def load_places(translation_keys=None):
+    """
+    Return a dict of translation key -> Place of the live cities and stations, optionally
+    only the ones of the given translation keys.
+    """
+
+    places = {}
+
+    for model, kind in PLACE_KINDS.items():
+        pages = model.objects.live().defer_streamfields()
+        if translation_keys is not None:
+            pages = pages.filter(translation_key__in=translation_keys)
+
+        for page in pages:
+            key = str(page.translation_key)
+            place = places.setdefault(key, Place(translation_key=key, kind=kind))
+            place.pages[page.locale_id] = {"id": page.pk, "name": page.title, "url": page.get_url()}
+            place.other_names.update(name.strip() for name in page.other_names.split(",") if name.strip())
+
+    popularity = get_popularity(page["id"] for place in places.values() for page in place.pages.values())
+    for place in places.values():
+        place.popularity = sum(popularity.get(page["id"], 0) for page in place.pages.values())
+
+    return places
+
+
+class AutocompleteIndex:
+    def __init__(self, places, locales, version=None):
+        self.version = version
+        self.places = {}
+        self.keys = []
+        self.locales = locales  # language code -> locale id
+
+        for place in places.values():
+            self.places[place.translation_key] = place
+            self.keys.extend(place.get_keys())
+
+        self.keys.sort()
+
+    @classmethod
+    def load(cls, version=None):
+        return cls(load_places(), dict(Locale.objects.values_list("language_code", "id")), version=version)
+
+    def remove(self, translation_key):
+        place = self.places.pop(translation_key, None)
+        if place is None:
+            return
+
+        for key in place.get_keys():
+            position = bisect.bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+
+    def update(self, translation_keys, places):
+        """
+        Replace the places of the given translation keys, removing the ones not in `places`.
+        """
+
+        for translation_key in translation_keys:
+            self.remove(translation_key)
+
+            place = places.get(translation_key)
+            if place is not None:
+                self.places[translation_key] = place
+                for key in place.get_keys():
+                    bisect.insort(self.keys, key)
+
+    def complete(self, term, language_code=None, kind=None, limit=8):
+        """
+        Return up to `limit` places whose name (or one of its words) starts with `term`.
+        Names starting with the term come first, then the most popular places.
+        """
+
+        prefix = normalize(term)
+        if not prefix:
+            return []
+
+        positions = {}
+        start = bisect.bisect_left(self.keys, (prefix,))
+
+        for key, position, translation_key in self.keys[start : start + AUTOCOMPLETE_MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            positions[translation_key] = min(position, positions.get(translation_key, position))
+
+        locale_id = self.locales.get(language_code)
+        fallback_locale_id = self.locales.get(settings.LANGUAGE_CODE)
+
+        results = []
+        for translation_key, position in positions.items():
+            place = self.places[translation_key]
+            if kind and place.kind != kind:
+                continue
+
+            page = place.get_page(locale_id, fallback_locale_id)
+            results.append((position > 0, -place.popularity, len(page["name"]), page["name"], place.kind, page))
+
+        results.sort(key=lambda result: result[:4])
+
+        return [{**page, "kind": place_kind} for *_, place_kind, page in results[:limit]]
+
+
+def record_place_change(page):
+    """
+    Tell every worker the place of the page has to be reloaded: the change gets the next
+    number of the log and a key of its own, so workers recording changes at the same time
+    never overwrite each other's.
+    """
+
+    translation_key = str(page.translation_key)
+
+    for _attempt in range(3):
+        # Started from the time so a worker never mistakes a new log for the one it read
+        version = time.time_ns()
+        if not cache.add(AUTOCOMPLETE_VERSION_KEY, version, timeout=None):
+            try:
+                version = cache.incr(AUTOCOMPLETE_VERSION_KEY)
+            except ValueError:
+                continue  # the log was evicted in between, start it again
+
+        # `incr` is not atomic on every cache backend, another worker may have got the same number
+        key = f"{AUTOCOMPLETE_CHANGES_KEY}:{version}"
+        if cache.add(key, translation_key, timeout=AUTOCOMPLETE_CHANGES_TIMEOUT):
+            return
+
+    logger.warning("could not record the change of %s in the autocomplete log" % translation_key)
+
+    # Far past the log, every worker rebuilds its index
+    cache.set(AUTOCOMPLETE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_changes(since, version):
+    """
+    The translation keys of the places changed after the version `since` up to `version`,
+    None when some of the changes are not in the log anymore (or not yet).
+    """
+
+    if not since < version <= since + AUTOCOMPLETE_MAX_CHANGES:
+        return None
+
+    keys = [f"{AUTOCOMPLETE_CHANGES_KEY}:{number}" for number in range(since + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+
+    return list(dict.fromkeys(changes[key] for key in keys))
+
+
+def get_autocomplete_index():
+    """
+    The index of this worker, brought up to date with the places changed since it was built.
+    """
+
+    global _index
+
+    # A new log starts from the time, so the next change is a step ahead of this version
+    version = get_version(AUTOCOMPLETE_VERSION_KEY)
+
+    if _index is not None and _index.version == version:
+        return _index
+
+    if _index is not None and (keys := get_changes(_index.version, version)) is not None:
+        _index.update(keys, load_places(keys))
+        _index.version = version
+        logger.info("updated %s places of the autocomplete index" % len(keys))
+        return _index
+
+    start = time.perf_counter()
+    _index = AutocompleteIndex.load(version=version)
+    logger.info("loaded autocomplete index of %s places in %.3fs" % (len(_index.places), time.perf_counter() - start))
+
+    return _index
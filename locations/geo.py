@@ -0,0 +1,244 @@
+"""
+Nearest and within radius lookups of the live stations and cities, answered from memory.
+
+Every worker keeps the places with coordinates in a grid of `GEO_CELL_SIZE` degree cells.
+A nearest lookup measures the places of the cell of the point first and then of the rings
+of cells around it, stopping as soon as the closest places found are nearer than anything
+in the next ring could be. A radius lookup only measures the places of the cells covering
+the bounding box of the circle. Either way a lookup touches a handful of cells instead of
+every stop.
+
+Like the autocomplete a place is all the translations of a page, answered in the language
+of the request. The grid is rebuilt when a city or station is published, unpublished, moved
+or deleted.
+"""
+
+import logging
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+
+from wagtail.models import Locale
+
+from base.cache import get_version
+from locations.autocomplete import PLACE_KINDS
+
+
+logger = logging.getLogger(__name__)
+
+GEO_VERSION_KEY = "geo:version"
+
+GEO_CELL_SIZE = 0.25  # degrees, about 28km of latitude
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_index = None
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance in km between two points.
+    """
+
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@dataclass
+class GeoPlace:
+    """
+    A city or station with coordinates in all its locales.
+    """
+
+    translation_key: str
+    kind: str
+    latitude: float
+    longitude: float
+    pages: dict = field(default_factory=dict)  # locale id -> {"id", "name", "url"}
+
+    def get_page(self, locale_id, fallback_locale_id=None):
+        return self.pages.get(locale_id) or self.pages.get(fallback_locale_id) or next(iter(self.pages.values()))
+
+
+def load_geo_places():
+    """
+    Return the live cities and stations with coordinates, one per translation key.
+    """
+
+    places = {}
+    default_locale_id = Locale.get_default().pk
+
+    for model, kind in PLACE_KINDS.items():
+        pages = model.objects.live().filter(latitude__isnull=False, longitude__isnull=False).defer_streamfields()
+
+        for page in pages:
+            key = str(page.translation_key)
+            place = places.setdefault(key, GeoPlace(key, kind, page.latitude, page.longitude))
+            place.pages[page.locale_id] = {"id": page.pk, "name": page.title, "url": page.get_url()}
+
+            # The coordinates of the default locale win if translations disagree
+            if page.locale_id == default_locale_id:
+                place.latitude, place.longitude = page.latitude, page.longitude
+
+    return list(places.values())
+
+
+class GeoIndex:
+    def __init__(self, places, locales, version=None, cell_size=GEO_CELL_SIZE):
+        self.version = version
+        self.cell_size = cell_size
+        self.locales = locales  # language code -> locale id
+        self.cells = defaultdict(list)
+
+        for place in places:
+            self.cells[self.get_cell(place.latitude, place.longitude)].append(place)
+
+        rows = [row for row, _ in self.cells] or [0]
+        columns = [column for _, column in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(columns), max(columns))
+
+    @classmethod
+    def load(cls, version=None):
+        return cls(load_geo_places(), dict(Locale.objects.values_list("language_code", "id")), version=version)
+
+    def __len__(self):
+        return sum(len(places) for places in self.cells.values())
+
+    def get_cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def get_ring(self, cell, ring):
+        """
+        The cells at `ring` cells from `cell` in either direction.
+        """
+
+        row, column = cell
+        if ring == 0:
+            return [cell]
+
+        cells = [(row + offset, column + side) for offset in range(-ring, ring + 1) for side in (-ring, ring)]
+        cells += [(row + side, column + offset) for offset in range(-ring + 1, ring) for side in (-ring, ring)]
+
+        return cells
+
+    def get_ring_distance(self, latitude, ring):
+        """
+        Lower bound in km of the distance from a point to anything in the cells `ring` cells
+        away from its cell: at least `ring - 1` cells along one axis.
+        """
+
+        if ring <= 1:
+            return 0.0
+
+        degrees = (ring - 1) * self.cell_size
+        shortest_latitude = min(89.9, abs(latitude) + (ring + 1) * self.cell_size)
+
+        return degrees * KM_PER_DEGREE * math.cos(math.radians(shortest_latitude))
+
+    def covers(self, cell, ring):
+        row, column = cell
+        min_row, max_row, min_column, max_column = self.bounds
+
+        return (
+            row - ring <= min_row
+            and row + ring >= max_row
+            and column - ring <= min_column
+            and column + ring >= max_column
+        )
+
+    def get_results(self, matches, language_code, limit):
+        locale_id = self.locales.get(language_code)
+        fallback_locale_id = self.locales.get(settings.LANGUAGE_CODE)
+
+        return [
+            {
+                **place.get_page(locale_id, fallback_locale_id),
+                "kind": place.kind,
+                "lat": place.latitude,
+                "lon": place.longitude,
+                "distance": round(distance, 3),
+            }
+            for distance, place in sorted(matches, key=lambda match: (match[0], match[1].translation_key))[:limit]
+        ]
+
+    def nearest(self, latitude, longitude, limit=10, kind=None, language_code=None):
+        """
+        Return the `limit` places closest to the point with their distance in km.
+        """
+
+        if not self.cells or limit < 1:
+            return []
+
+        cell = self.get_cell(latitude, longitude)
+        matches = []
+
+        ring = 0
+        while True:
+            if len(matches) >= limit:
+                matches.sort(key=lambda match: match[0])
+                if matches[limit - 1][0] <= self.get_ring_distance(latitude, ring):
+                    break
+
+            for ring_cell in self.get_ring(cell, ring):
+                for place in self.cells.get(ring_cell, ()):
+                    if kind and place.kind != kind:
+                        continue
+                    matches.append((haversine(latitude, longitude, place.latitude, place.longitude), place))
+
+            if self.covers(cell, ring):
+                break
+
+            ring += 1
+
+        return self.get_results(matches, language_code, limit)
+
+    def within(self, latitude, longitude, radius, limit=None, kind=None, language_code=None):
+        """
+        Return the places at most `radius` km from the point, closest first.
+        """
+
+        delta_latitude = radius / KM_PER_DEGREE
+        delta_longitude = radius / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+
+        min_row, min_column = self.get_cell(latitude - delta_latitude, longitude - delta_longitude)
+        max_row, max_column = self.get_cell(latitude + delta_latitude, longitude + delta_longitude)
+
+        matches = []
+        for row in range(min_row, max_row + 1):
+            for column in range(min_column, max_column + 1):
+                for place in self.cells.get((row, column), ()):
+                    if kind and place.kind != kind:
+                        continue
+                    distance = haversine(latitude, longitude, place.latitude, place.longitude)
+                    if distance <= radius:
+                        matches.append((distance, place))
+
+        return self.get_results(matches, language_code, limit)
+
+
+def bump_geo_version():
+    cache.set(GEO_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_geo_index():
+    """
+    The grid of this worker, rebuilt when a place changed since it was built.
+    """
+
+    global _index
+
+    version = get_version(GEO_VERSION_KEY)
+
+    if _index is None or _index.version != version:
+        start = time.perf_counter()
+        _index = GeoIndex.load(version=version)
+        logger.info("loaded geo index of %s places in %.3fs" % (len(_index), time.perf_counter() - start))
+
+    return _index
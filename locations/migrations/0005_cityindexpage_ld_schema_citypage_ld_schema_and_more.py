@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_service_stationpage_departamento_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cityindexpage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+        migrations.AddField(
+            model_name='citypage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+        migrations.AddField(
+            model_name='stationindexpage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+        migrations.AddField(
+            model_name='stationpage',
+            name='ld_schema',
+            field=models.TextField(blank=True, editable=False, help_text='JSON-LD schema of the live version of the page. Built when the page is published.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_cityindexpage_ld_schema_citypage_ld_schema_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citypage',
+            name='other_names',
+            field=models.CharField(blank=True, help_text='Other names people search this by, comma separated. (Ex. CDE, Ciudad del Este)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='stationpage',
+            name='other_names',
+            field=models.CharField(blank=True, help_text='Other names people search this by, comma separated. (Ex. CDE, Ciudad del Este)', max_length=255),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+def parse_lat_long(lat_long):
+    lat, _, long = (lat_long or "").partition(",")
+    try:
+        return float(lat), float(long)
+    except ValueError:
+        return None, None
+
+
+def set_coordinates(apps, schema_editor):
+    for model_name in ("CityPage", "StationPage"):
+        model = apps.get_model("locations", model_name)
+        for page in model.objects.exclude(lat_long="").only("lat_long"):
+            page.latitude, page.longitude = parse_lat_long(page.lat_long)
+            page.save(update_fields=["latitude", "longitude"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0006_citypage_other_names_stationpage_other_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citypage',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='citypage',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='stationpage',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='stationpage',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_coordinates, migrations.RunPython.noop),
+    ]
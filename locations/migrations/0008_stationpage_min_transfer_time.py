@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0007_citypage_stationpage_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stationpage',
+            name='min_transfer_time',
+            field=models.PositiveSmallIntegerField(default=15, help_text='Minutes a passenger needs to change buses here', verbose_name='Minimum transfer time'),
+        ),
+    ]
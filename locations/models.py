@@ -1,4 +1,3 @@
-import json
 import logging
 from datetime import time
 
@@ -6,7 +5,6 @@ from django import forms
 from django.core.validators import RegexValidator
 from django.db import models
 from django.utils import timezone
-from django.utils.html import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from wagtail.admin.panels import FieldPanel, FieldRowPanel, InlinePanel, MultiFieldPanel, PageChooserPanel
@@ -27,6 +25,53 @@ from base.validators import validate_phone
 logger = logging.getLogger(__name__)
 
 
+def parse_lat_long(lat_long):
+    """
+    Return the (latitude, longitude) floats of a `lat_long` string or (None, None).
+    """
+
+    lat, _, long = (lat_long or "").partition(",")
+
+    try:
+        return float(lat), float(long)
+    except ValueError:
+        return None, None
+
+
+class GeoMixin(models.Model):
+    """
+    Numeric coordinates parsed from `lat_long` when the page is cleaned (so previews get
+    them too) and saved, so templates, the json-ld and the nearby index never split the
+    string. See `locations.geo`
+    """
+
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def set_coordinates(self):
+        self.latitude, self.longitude = parse_lat_long(self.lat_long)
+
+    def clean(self):
+        super().clean()
+        self.set_coordinates()
+
+    def save(self, *args, **kwargs):
+        self.set_coordinates()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "lat_long" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+
+        return super().save(*args, **kwargs)
+
+    @property
+    def has_coordinates(self):
+        return self.latitude is not None and self.longitude is not None
+
+
 class CityIndexPage(BasePage):
     """
     A Page model that creates an index page (a listview)
@@ -64,21 +109,14 @@ class CityIndexPage(BasePage):
         context["cities"] = self.get_children().live().order_by("title")
         return context
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_faq_schema(),
-                    self._get_article_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_faq_schema(),
+            self._get_article_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
@@ -103,7 +141,7 @@ class CityIndexPage(BasePage):
         return breadcrumb_schema
 
 
-class CityPage(BasePage):
+class CityPage(GeoMixin, BasePage):
     """
     Detail page for a specific city or town.
     """
@@ -119,6 +157,11 @@ class CityPage(BasePage):
         related_name="+",
         help_text="Landscape mode only; horizontal width between 1000px and 3000px.",
     )
+    other_names = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Other names people search this by, comma separated. (Ex. CDE, Ciudad del Este)",
+    )
 
     lat_long = models.CharField(
         max_length=36,
@@ -160,10 +203,11 @@ class CityPage(BasePage):
         collapsed=True,
     )
 
-    search_fields = BasePage.search_fields + [index.SearchField("body")]
+    search_fields = BasePage.search_fields + [index.SearchField("intro"), index.SearchField("body")]
 
     content_panels = BasePage.content_panels + [
         FieldPanel("intro"),
+        FieldPanel("other_names"),
         FieldPanel("image"),
         FieldPanel("lat_long"),
         FieldPanel("body"),
@@ -187,30 +231,20 @@ class CityPage(BasePage):
         alphabetical order.
         """
 
-        lat_long = self.lat_long or ","
-        lat, long = lat_long.split(",")
-
         context = super().get_context(request, *args, **kwargs)
-        context["lat_long"] = {"lat": lat, "long": long}
+        context["lat_long"] = {"lat": self.latitude, "long": self.longitude}
         context["stations"] = self.get_children().live().order_by("title")
 
         return context
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_faq_schema(),
-                    self._get_article_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_faq_schema(),
+            self._get_article_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
@@ -268,21 +302,14 @@ class StationIndexPage(BasePage):
         """
         return self.get_children().specific().live()
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_faq_schema(),
-                    self._get_article_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_faq_schema(),
+            self._get_article_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
@@ -314,7 +341,7 @@ class StationPageManager(PageManager):
         return qs
 
 
-class StationPage(RoutablePageMixin, BasePage):
+class StationPage(RoutablePageMixin, GeoMixin, BasePage):
     """
     A station detail view which represent a stop | terminal | station
     This is a leaf page and the hierarchy is country -> city -> station
@@ -331,6 +358,11 @@ class StationPage(RoutablePageMixin, BasePage):
         related_name="+",
         help_text="Landscape mode only; horizontal width between 1000px and 3000px.",
     )
+    other_names = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Other names people search this by, comma separated. (Ex. CDE, Ciudad del Este)",
+    )
 
     address = models.TextField(_("Address"))
     phone = models.CharField(_("Phone"), max_length=20, blank=True, validators=[validate_phone])
@@ -355,6 +387,11 @@ class StationPage(RoutablePageMixin, BasePage):
         ],
     )
     services = ParentalManyToManyField("locations.Service", blank=True)
+    min_transfer_time = models.PositiveSmallIntegerField(
+        _("Minimum transfer time"),
+        default=15,
+        help_text="Minutes a passenger needs to change buses here",
+    )
     directions = StreamField(BaseStreamBlock(), verbose_name="Directions (Como llegar?)", blank=True, collapsed=True)
     body = StreamField(BaseStreamBlock(), verbose_name="Page body", blank=True, collapsed=True)
 
@@ -390,17 +427,20 @@ class StationPage(RoutablePageMixin, BasePage):
     )
 
     search_fields = BasePage.search_fields + [
+        index.SearchField("intro"),
         index.SearchField("address"),
         index.SearchField("body"),
     ]
 
     content_panels = BasePage.content_panels + [
         FieldPanel("intro"),
+        FieldPanel("other_names"),
         MultiFieldPanel(
             [
                 FieldPanel("phone"),
                 FieldPanel("address"),
                 FieldPanel("lat_long"),
+                FieldPanel("min_transfer_time"),
                 FieldPanel("services", widget=forms.CheckboxSelectMultiple),
                 InlinePanel(
                     "opening_hours",
@@ -440,10 +480,9 @@ class StationPage(RoutablePageMixin, BasePage):
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        lat, long = self.lat_long.split(",")
         options = {
-            "lat": lat,
-            "long": long,
+            "lat": self.latitude,
+            "long": self.longitude,
             "title": self.title,
             "text": self.intro,
             "url": self.get_full_url(),
@@ -462,21 +501,14 @@ class StationPage(RoutablePageMixin, BasePage):
     def get_google_maps_directions_url(self):
         return f"https://www.google.com/maps/dir/?api=1&destination={self.lat_long}"
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_station_schema(),
-                    self._get_image_schema(),
-                    self._get_faq_schema(),
-                    self._get_organisation_schema(),
-                    self._get_breadcrumb_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_station_schema(),
+            self._get_image_schema(),
+            self._get_faq_schema(),
+            self._get_organisation_schema(),
+            self._get_breadcrumb_schema(),
+        ]
 
     def _get_station_schema(self):
         return {
@@ -524,8 +556,9 @@ class StationPage(RoutablePageMixin, BasePage):
         return image_schema
 
     def _get_geo_schema(self):
-        lat, long = self.lat_long.split(",")
-        return {"@type": "GeoCoordinates", "latitude": lat, "longitude": long}
+        if not self.has_coordinates:
+            return None
+        return {"@type": "GeoCoordinates", "latitude": self.latitude, "longitude": self.longitude}
 
     def _get_ratings_schema(self):
         if self.ratings:
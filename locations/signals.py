@@ -0,0 +1,25 @@
+import logging
+
+from django.db.models.signals import post_delete
+
+from wagtail.signals import page_published, page_slug_changed, page_unpublished, post_page_move
+
+from locations.autocomplete import PLACE_KINDS, record_place_change
+from locations.geo import bump_geo_version
+
+
+logger = logging.getLogger(__name__)
+
+
+def place_changed_receiver(sender, instance, **kwargs):
+    record_place_change(instance)
+    bump_geo_version()
+
+
+for place_model in PLACE_KINDS:
+    name = place_model._meta.model_name
+    page_published.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"{name}_published_receiver")
+    page_unpublished.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"{name}_unpublished_receiver")
+    page_slug_changed.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"{name}_slug_receiver")
+    post_page_move.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"{name}_moved_receiver")
+    post_delete.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"{name}_deleted_receiver")
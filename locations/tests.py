@@ -1,5 +1,9 @@
 import logging
+import random
 
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.urls import reverse
 from django.utils import timezone
 
 from wagtail.models import Page, Site
@@ -7,6 +11,8 @@ from wagtail.test.utils import WagtailPageTestCase
 from wagtail.test.utils.form_data import nested_form_data, streamfield
 
 from home.models import HomePage
+from locations.autocomplete import AUTOCOMPLETE_VERSION_KEY, get_autocomplete_index
+from locations.geo import GeoIndex, GeoPlace, get_geo_index, haversine
 from locations.models import CityIndexPage, CityPage, StationIndexPage, StationPage
 
 
@@ -335,3 +341,242 @@ class StationPageTests(WagtailPageTestCase):
 
     def test_cannot_create_wrong_children_or_parents_for_station_page(self):
         self.assertCanNotCreateAt(StationPage, CityPage)
+
+
+class AutocompleteTests(WagtailPageTestCase):
+    """
+    Test suite for the origin / destination autocomplete
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+        cls.home_page = HomePage(title="Home", slug="home-autocomplete")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        cls.city_index_page = CityIndexPage(title="Cities", slug="cities")
+        cls.station_index_page = StationIndexPage(title="Stations", slug="stations")
+        for page in (cls.city_index_page, cls.station_index_page):
+            cls.home_page.add_child(instance=page)
+            page.save_revision().publish()
+
+        cls.asuncion = CityPage(title="Asunción", slug="asuncion")
+        cls.este = CityPage(title="Ciudad del Este", slug="ciudad-del-este", other_names="CDE")
+        cls.san_lorenzo = CityPage(title="San Lorenzo", slug="san-lorenzo")
+        cls.san_bernardino = CityPage(title="San Bernardino", slug="san-bernardino")
+        for page in (cls.asuncion, cls.este, cls.san_lorenzo, cls.san_bernardino):
+            cls.city_index_page.add_child(instance=page)
+            page.save_revision().publish()
+
+        # Referenced by a station so it is more popular than San Lorenzo
+        cls.station = StationPage(
+            title="Terminal de Asunción", slug="terminal", address="Asunción", departamento=cls.san_bernardino
+        )
+        cls.station_index_page.add_child(instance=cls.station)
+        cls.station.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, term, **kwargs):
+        return [result["name"] for result in get_autocomplete_index().complete(term, **kwargs)]
+
+    def test_prefix_is_accent_insensitive(self):
+        self.assertEqual(self.complete("ASU", kind="city"), ["Asunción"])
+        self.assertEqual(self.complete("asunción", kind="city"), ["Asunción"])
+
+    def test_matches_any_word_and_other_names(self):
+        self.assertEqual(self.complete("este"), ["Ciudad del Este"])
+        self.assertEqual(self.complete("cde"), ["Ciudad del Este"])
+
+    def test_names_starting_with_the_term_come_first(self):
+        self.assertEqual(self.complete("asun"), ["Asunción", "Terminal de Asunción"])
+
+    def test_popular_places_come_first(self):
+        self.assertEqual(self.complete("san"), ["San Bernardino", "San Lorenzo"])
+
+    def test_lookups_never_query_the_database(self):
+        get_autocomplete_index()
+
+        with self.assertNumQueries(0):
+            self.complete("asu")
+
+    def test_published_places_are_added_incrementally(self):
+        index = get_autocomplete_index()
+
+        villarrica = CityPage(title="Villarrica", slug="villarrica")
+        self.city_index_page.add_child(instance=villarrica)
+        villarrica.save_revision().publish()
+
+        self.assertEqual(self.complete("villa"), ["Villarrica"])
+        self.assertIs(get_autocomplete_index(), index)
+
+        villarrica.unpublish()
+
+        self.assertEqual(self.complete("villa"), [])
+        self.assertIs(get_autocomplete_index(), index)
+
+    def test_changes_recorded_at_the_same_time_are_all_kept(self):
+        villarrica = CityPage(title="Villarrica", slug="villarrica")
+        caacupe = CityPage(title="Caacupé", slug="caacupe")
+        for city in (villarrica, caacupe):
+            self.city_index_page.add_child(instance=city)
+
+        villarrica.save_revision().publish()
+        index = get_autocomplete_index()
+        version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+
+        caacupe.save_revision().publish()
+        # Another worker got the same number out of a non atomic incr
+        cache.set(AUTOCOMPLETE_VERSION_KEY, version, timeout=None)
+        villarrica.unpublish()
+
+        self.assertEqual(self.complete("villa"), [])
+        self.assertEqual(self.complete("caacu"), ["Caacupé"])
+        self.assertIs(get_autocomplete_index(), index)
+        self.assertEqual(index.version, version + 2)
+
+    def test_view(self):
+        response = self.client.get(reverse("locations:autocomplete"), {"q": "ciudad"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Accept-Language", response["Vary"])
+        self.assertIn("Cookie", response["Vary"])
+        self.assertEqual(
+            response.json(),
+            {"results": [{"id": self.este.pk, "name": "Ciudad del Este", "url": self.este.url, "kind": "city"}]},
+        )
+
+
+class GeoIndexTests(SimpleTestCase):
+    """
+    Test suite for the grid lookups against measuring every place.
+    """
+
+    def setUp(self):
+        generator = random.Random(42)
+        self.places = [
+            GeoPlace(str(i), "station", generator.uniform(-28, -19), generator.uniform(-63, -54), {1: {"id": i}})
+            for i in range(2000)
+        ]
+        self.index = GeoIndex(self.places, {"es": 1})
+        self.points = [(generator.uniform(-30, -17), generator.uniform(-65, -52)) for _ in range(50)]
+
+    def brute_force(self, latitude, longitude):
+        return sorted(
+            (haversine(latitude, longitude, place.latitude, place.longitude), place.translation_key)
+            for place in self.places
+        )
+
+    def test_nearest_matches_brute_force(self):
+        for latitude, longitude in self.points:
+            expected = [int(key) for _, key in self.brute_force(latitude, longitude)[:5]]
+            results = self.index.nearest(latitude, longitude, limit=5, language_code="es")
+
+            self.assertEqual([result["id"] for result in results], expected)
+
+    def test_within_matches_brute_force(self):
+        for latitude, longitude in self.points:
+            expected = [int(key) for distance, key in self.brute_force(latitude, longitude) if distance <= 30]
+            results = self.index.within(latitude, longitude, 30, language_code="es")
+
+            self.assertEqual([result["id"] for result in results], expected)
+
+    def test_far_away_point_still_finds_the_nearest(self):
+        results = self.index.nearest(40.4, -3.7, limit=1)
+
+        self.assertEqual(len(results), 1)
+
+
+class NearbyTests(WagtailPageTestCase):
+    """
+    Test suite for the coordinates of the places and the nearby api.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+        cls.home_page = HomePage(title="Home", slug="home-nearby")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        cls.station_index_page = StationIndexPage(title="Stations", slug="stations")
+        cls.home_page.add_child(instance=cls.station_index_page)
+        cls.station_index_page.save_revision().publish()
+
+        cls.asuncion = StationPage(
+            title="Terminal de Asunción", slug="asuncion", address="Avenida", lat_long="-25.3069, -57.6186"
+        )
+        cls.san_lorenzo = StationPage(
+            title="Terminal de San Lorenzo", slug="san-lorenzo", address="Avenida", lat_long="-25.34,-57.51"
+        )
+        cls.encarnacion = StationPage(
+            title="Terminal de Encarnación", slug="encarnacion", address="Avenida", lat_long="-27.33,-55.87"
+        )
+        cls.unknown = StationPage(title="Parada", slug="parada", address="Avenida")
+        for page in (cls.asuncion, cls.san_lorenzo, cls.encarnacion, cls.unknown):
+            cls.station_index_page.add_child(instance=page)
+            page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+
+    def nearby(self, **params):
+        response = self.client.get(reverse("locations:nearby"), params)
+        return [result["name"] for result in response.json()["results"]]
+
+    def test_coordinates_are_parsed_on_save(self):
+        self.asuncion.refresh_from_db()
+
+        self.assertEqual((self.asuncion.latitude, self.asuncion.longitude), (-25.3069, -57.6186))
+        self.assertEqual(self.asuncion._get_geo_schema()["latitude"], -25.3069)
+        self.assertFalse(self.unknown.has_coordinates)
+
+    def test_nearest_stations(self):
+        self.assertEqual(
+            self.nearby(lat=-25.30, lon=-57.60, limit=2),
+            ["Terminal de Asunción", "Terminal de San Lorenzo"],
+        )
+
+    def test_stations_within_radius(self):
+        self.assertEqual(
+            self.nearby(lat=-25.30, lon=-57.60, radius=20),
+            ["Terminal de Asunción", "Terminal de San Lorenzo"],
+        )
+        self.assertEqual(self.nearby(lat=-27.3, lon=-55.9, radius=20), ["Terminal de Encarnación"])
+
+    def test_lookups_never_query_the_database(self):
+        get_geo_index()
+
+        with self.assertNumQueries(0):
+            get_geo_index().nearest(-25.3, -57.6)
+
+    def test_moved_stations_are_reindexed(self):
+        self.assertEqual(self.nearby(lat=-22.5, lon=-55.7, limit=1), ["Terminal de San Lorenzo"])
+
+        self.unknown.lat_long = "-22.55,-55.73"
+        self.unknown.save_revision().publish()
+
+        self.assertEqual(self.nearby(lat=-22.5, lon=-55.7, limit=1), ["Parada"])
+
+    def test_invalid_coordinates(self):
+        for params in (
+            {},
+            {"lat": "x", "lon": "1"},
+            {"lat": "100", "lon": "0"},
+            {"lat": "0", "lon": "0", "radius": "x"},
+            {"lat": "nan", "lon": "0"},
+            {"lat": "0", "lon": "0", "radius": "nan"},
+            {"lat": "0", "lon": "0", "radius": "inf"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse("locations:nearby"), params).status_code, 400)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views import autocomplete, nearby
+
+
+app_name = "locations"
+
+urlpatterns = [
+    path("autocomplete/", autocomplete, name="autocomplete"),
+    path("nearby/", nearby, name="nearby"),
+]
@@ -0,0 +1,99 @@
+import math
+
+from django.http import HttpRequest, JsonResponse
+from django.utils import translation
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+from django.views.decorators.vary import vary_on_headers
+
+from locations.autocomplete import get_autocomplete_index
+from locations.geo import get_geo_index
+
+
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+NEARBY_LIMIT = 10
+NEARBY_MAX_LIMIT = 50
+NEARBY_MAX_RADIUS = 500  # km
+
+
+# Both apis live outside `i18n_patterns` and name the places in the language of the visitor,
+# picked by LocaleMiddleware from the language cookie or the Accept-Language header. Shared
+# caches must keep a response per language so they vary on both.
+localize = vary_on_headers("Accept-Language", "Cookie")
+
+
+@require_GET
+@cache_control(max_age=60 * 5, public=True)  # five minutes
+@localize
+def autocomplete(request: HttpRequest) -> JsonResponse:
+    """
+    Suggest the cities and stations whose name starts with `q` for the origin and destination
+    inputs of the search form. `kind` limits them to `city` or `station`.
+
+    Ex: /locations/autocomplete/?q=asu&limit=5
+    """
+
+    try:
+        limit = min(int(request.GET.get("limit", AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+
+    results = get_autocomplete_index().complete(
+        request.GET.get("q", "")[:100],
+        language_code=translation.get_language(),
+        kind=request.GET.get("kind"),
+        limit=max(limit, 1),
+    )
+
+    return JsonResponse({"results": results})
+
+
+@require_GET
+@cache_control(max_age=60 * 5, public=True)  # five minutes
+@localize
+def nearby(request: HttpRequest) -> JsonResponse:
+    """
+    The stations closest to the point `lat`, `lon` with their distance in km, or the ones
+    within `radius` km of it. `kind` looks for `city` instead.
+
+    Ex: /locations/nearby/?lat=-25.29&lon=-57.64&limit=5
+        /locations/nearby/?lat=-25.29&lon=-57.64&radius=20
+    """
+
+    try:
+        latitude = float(request.GET["lat"])
+        longitude = float(request.GET["lon"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "lat and lon are required"}, status=400)
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({"error": "lat or lon out of range"}, status=400)
+
+    try:
+        limit = min(int(request.GET.get("limit", NEARBY_LIMIT)), NEARBY_MAX_LIMIT)
+    except ValueError:
+        limit = NEARBY_LIMIT
+
+    options = {
+        "limit": max(limit, 1),
+        "kind": request.GET.get("kind", "station"),
+        "language_code": translation.get_language(),
+    }
+
+    if "radius" in request.GET:
+        try:
+            radius = float(request.GET["radius"])
+        except ValueError:
+            radius = math.nan
+
+        # "nan" and "inf" parse as floats too but no distance compares to them
+        if not math.isfinite(radius):
+            return JsonResponse({"error": "radius must be a number of km"}, status=400)
+
+        results = get_geo_index().within(latitude, longitude, min(max(radius, 0), NEARBY_MAX_RADIUS), **options)
+    else:
+        results = get_geo_index().nearest(latitude, longitude, **options)
+
+    return JsonResponse({"results": results})
@@ -23,7 +23,7 @@ CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED_ORIGINS", default="").split(" ")
 
 INSTALLED_APPS = [
     "home",
-    "search",
+    "search.apps.SearchConfig",
     "base.apps.BaseConfig",
     "pages.apps.PagesConfig",
     "users.apps.UsersConfig",
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "wagtail.contrib.forms",
     "wagtail.contrib.redirects",
     "wagtail.contrib.routable_page",
+    "wagtail.contrib.search_promotions",
     "wagtail.contrib.settings",
     "wagtail.contrib.styleguide",
     "wagtail.embeds",
@@ -251,6 +252,63 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Gunicorn runs several workers so the default cache has to be shared between processes,
+# otherwise an invalidation done by the worker handling a publish is never seen by the others.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", default=str(BASE_DIR / "cache")),
+    }
+}
+
+if CACHES["default"]["BACKEND"].endswith("FileBasedCache"):
+    # Past MAX_ENTRIES (300 by default) a third of the entries are culled at random
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", default=50_000))}
+
+if TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Server side page cache for anonymous visitors. See `base.cache`
+PAGE_CACHE_ENABLED = int(os.getenv("PAGE_CACHE_ENABLED", default=1))
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6  # six hours
+PAGE_CACHE_QUERY_PARAMS = ["cursor"]
+
+# Cache of rendered StreamField blocks shared across pages. See `base.blocks.CachedBlockMixin`
+BLOCK_CACHE_ENABLED = int(os.getenv("BLOCK_CACHE_ENABLED", default=1))
+BLOCK_CACHE_TIMEOUT = 60 * 60 * 24  # one day
+
+# Hit and miss counters of the caches, counted per worker. See `base.counters`
+CACHE_COUNTERS_FLUSH_INTERVAL = 10  # seconds between writes of the counts of a worker to the cache
+
+# Renditions generated in a pool of processes after image uploads and page publishes.
+# See `base.renditions`
+RENDITIONS_PREGENERATE_ENABLED = int(os.getenv("RENDITIONS_PREGENERATE_ENABLED", default=int(not TESTING)))
+RENDITIONS_PREGENERATE_PROCESSES = int(os.getenv("RENDITIONS_PREGENERATE_PROCESSES", default=2))
+
+# Above the fold css inlined per template, built by `python manage.py build_critical_css`.
+# Maps a name to the page type (or url name, matching its whole namespace) rendered to build it.
+# See `base.critical_css`
+CRITICAL_CSS_ENABLED = int(os.getenv("CRITICAL_CSS_ENABLED", default=1))
+CRITICAL_CSS_DIR = BASE_DIR / "critical_css"
+CRITICAL_CSS_FOLD_ELEMENTS = 200
+CRITICAL_CSS_TEMPLATES = {
+    "home": "home.HomePage",
+    "city": "locations.CityPage",
+    "station": "locations.StationPage",
+    "partner": "partners.PartnerPage",
+    "blog": "blog.BlogPage",
+    "help": "help.HelpArticlePage",
+    "trips": "trips:search-results",
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -321,15 +379,18 @@ STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
     },
-    # ManifestStaticFilesStorage is recommended in production, to prevent
-    # outdated JavaScript / CSS assets being served from cache
-    # (e.g. after a Wagtail upgrade).
+    # Hashed file names listed in a manifest so assets can be cached forever plus gzip / brotli
+    # siblings written at collectstatic time for nginx to serve. See base/storage.py
     # See https://docs.djangoproject.com/en/5.1/ref/contrib/staticfiles/#manifeststaticfilesstorage
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",  # Veer changed this to Static
+        "BACKEND": "base.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# Tests run without collectstatic so there is no manifest to look hashed names up in
+if TESTING:
+    STORAGES["staticfiles"] = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+
 # Django sets a maximum of 1000 fields per form by default, but particularly complex page models
 # can exceed this limit within Wagtail's page editor.
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10_000
@@ -347,9 +408,65 @@ SITE_LOGO_URL = os.getenv("SITE_LOGO_URL")
 WAGTAILSEARCH_BACKENDS = {
     "default": {
         "BACKEND": "wagtail.search.backends.database",
+        "AUTO_UPDATE": False,  # updated in batches off the request. See `search.queue`
     }
 }
 
+# Site search engine, see `search.engine`
+SEARCH_PAGE_MODELS = [
+    "locations.CityPage",
+    "locations.StationPage",
+    "partners.PartnerPage",
+    "blog.BlogPage",
+    "help.HelpArticlePage",
+]
+SEARCH_MAX_RESULTS = 100
+SEARCH_FUZZY_MIN_LENGTH = 4  # shorter words only match exactly
+SEARCH_FUZZY_THRESHOLD = 0.3  # trigram similarity, same default as postgres' pg_trgm
+SEARCH_CACHE_TIMEOUT = 60 * 60  # one hour, results are also invalidated by every publish
+
+# Search hits are buffered in memory and written by a background thread. See `search.hits`
+SEARCH_HITS_ASYNC = int(os.getenv("SEARCH_HITS_ASYNC", default=int(not TESTING)))
+SEARCH_HITS_FLUSH_INTERVAL = 30  # seconds
+
+# Search index updates are queued and applied in batches by a background thread. See `search.queue`
+SEARCH_INDEX_ASYNC = int(os.getenv("SEARCH_INDEX_ASYNC", default=int(not TESTING)))
+SEARCH_INDEX_QUEUE_INTERVAL = 5  # seconds
+SEARCH_INDEX_BATCH_SIZE = 200
+
+# Seats picked are held for the buyer while the order is paid. See `trips.seats`
+SEAT_HOLD_TIMEOUT = 10 * 60  # seconds
+
+# Trips with transfers. See `trips.connections` and `trips.transfers`
+TRIP_MAX_TRANSFERS = 2
+TRIP_MIN_TRANSFER_TIME = 20  # minutes, at stops without a station
+TRIP_MAX_WAIT = 6 * 60  # minutes waiting for the next bus
+TRIP_FOOTPATH_MAX_DISTANCE = 1.0  # km
+TRIP_WALKING_SPEED = 4.5  # km/h
+TRIP_CONNECTIONS_BUDGET = 0.05  # seconds per search
+TRIP_CONNECTIONS_CACHE_TIMEOUT = 10 * 60  # seconds, results are also invalidated by every change to the index
+TRIP_CONNECTIONS_PARTIAL_CACHE_TIMEOUT = 15  # seconds, for searches that ran over the budget
+TRIP_TIMETABLE_DAYS = 14  # days of timetable kept in memory by each worker
+
+# Identical trip searches running at the same time are computed once. See `trips.coalesce`
+TRIP_SEARCH_CACHE_TIMEOUT = 30  # seconds, results are also invalidated by every change to the index
+TRIP_SEARCH_COALESCE_TIMEOUT = 10  # seconds waiting for another search before running it again
+
+# Round trips search both ways at once and rank the pairs by total fare. See `trips.roundtrip`
+TRIP_SEARCH_THREADS = int(os.getenv("TRIP_SEARCH_THREADS", default=4))  # per worker, 0 searches one way after the other
+TRIP_ROUND_TRIP_RESULTS = 10
+
+# Cheapest fare of each day for the date picker and the route pages. See `trips.fares`
+FARE_CALENDAR_DAYS = 90
+
+# Operators asked for their trips by their own inventory systems. See `trips.operators`
+TRIP_OPERATOR_ADAPTERS = {}  # operator slug -> {"BACKEND": dotted path of the adapter, "OPTIONS": {...}}
+TRIP_OPERATOR_TIMEOUT = 3  # seconds for each operator unless its OPTIONS say otherwise
+TRIP_OPERATORS_DEADLINE = 5  # seconds for all of them, well under the gunicorn timeout
+TRIP_OPERATOR_FAILURE_THRESHOLD = 5  # failures in a row that stop asking an operator
+TRIP_OPERATOR_RESET_TIMEOUT = 30  # seconds before asking it again
+TRIP_SEARCH_STREAMING = int(os.getenv("TRIP_SEARCH_STREAMING", default=1))  # append each operator as it answers
+
 # Base URL to use when referring to full URLs within the Wagtail admin backend -
 # e.g. in notification emails. Don't include '/admin' or a trailing slash
 WAGTAILADMIN_BASE_URL = os.getenv("WAGTAILADMIN_BASE_URL")
@@ -371,6 +488,12 @@ WAGTAILDOCS_EXTENSIONS = [
     "zip",
 ]
 
+# Responsive images. Widths of the `srcset` ladder and the formats offered in `<source>`
+# elements of `{% responsive_image %}` with a jpeg fallback for older browsers.
+RESPONSIVE_IMAGE_WIDTHS = [320, 480, 640, 960, 1280, 1920]
+RESPONSIVE_IMAGE_FORMATS = ["avif", "webp"]
+RESPONSIVE_IMAGE_FALLBACK_FORMAT = "jpeg"
+
 # Pagination
 DEFAULT_PER_PAGE = 8
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "changeme")
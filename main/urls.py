@@ -32,6 +32,7 @@ urlpatterns = [
     path("i18n/", include("django.conf.urls.i18n")),
     path("documents/", include(wagtaildocs_urls)),
     path("base/", include("base.urls")),
+    path("locations/", include("locations.urls")),
     path("django-admin/", admin.site.urls),
     path("sitemap.xml", sitemap),
     path("favicon.ico", favicon),
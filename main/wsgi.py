@@ -15,3 +15,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
 
 application = get_wsgi_application()
+
+# Each web worker applies the queued search index updates in the background
+from search.queue import worker  # noqa: E402
+
+
+os.register_at_fork(after_in_child=worker.start)
+worker.start()
@@ -1,10 +1,8 @@
-import json
 import logging
 
 from django import forms
 from django.conf import settings
 from django.db import models
-from django.utils.html import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from wagtail.admin.panels import FieldPanel, FieldRowPanel, InlinePanel, MultiFieldPanel
@@ -94,21 +92,14 @@ class PartnerIndexPage(BasePage):
     def children(self):
         return self.get_children().specific().live()
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_faq_schema(),
-                    self._get_article_schema(),
-                    self._get_organisation_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_faq_schema(),
+            self._get_article_schema(),
+            self._get_organisation_schema(),
+        ]
 
     def _get_breadcrumb_schema(self):
         breadcrumb_schema = {
@@ -225,6 +216,7 @@ class PartnerPage(BasePage):
     amenities = ParentalManyToManyField("partners.Amenity", blank=True)
 
     search_fields = BasePage.search_fields + [
+        index.SearchField("intro"),
         index.SearchField("body"),
     ]
 
@@ -316,21 +308,14 @@ class PartnerPage(BasePage):
 
         return tags
 
-    def ld_entity(self):
-        page_schema = json.dumps(
-            {
-                "@context": "http://schema.org",
-                "@graph": [
-                    self._get_breadcrumb_schema(),
-                    self._get_image_schema(),
-                    self._get_article_schema(),
-                    self._get_organisation_schema(),
-                    self._get_faq_schema(),
-                ],
-            },
-            ensure_ascii=False,
-        )
-        return mark_safe(page_schema)
+    def get_ld_graph(self):
+        return [
+            self._get_breadcrumb_schema(),
+            self._get_image_schema(),
+            self._get_article_schema(),
+            self._get_organisation_schema(),
+            self._get_faq_schema(),
+        ]
 
     def _get_organisation_schema(self):
         """
@@ -0,0 +1,374 @@
+"""
+Site search over the page types listed in `SEARCH_PAGE_MODELS`.
+
+Each live page is analysed into a `SearchDocument` when it is published. The documents are
+loaded into an in memory inverted index per process, reloaded when the index version stored
+in the cache changes, and queries are scored with:
+
+- field weighting from the `boost` of the `search_fields` of each page model
+- accent folding and light spanish / portuguese stemming (see `search.text`)
+- trigram fuzzy matching so `asuncoin` still finds Asunción
+- tf-idf so rare words count more than the ones on every page
+
+Pages are fetched already typed with a query per page type of the results.
+"""
+
+import hashlib
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.html import strip_tags
+
+from wagtail.contrib.search_promotions.models import SearchPromotion
+from wagtail.models import Locale
+from wagtail.search import index
+from wagtail.search.utils import normalise_query_string
+
+from base.cache import get_version
+from search.models import SearchDocument
+from search.text import similarity, stem, tokenize, trigrams
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_VERSION_KEY = "search:index:version"
+SEARCH_RESULTS_PREFIX = "search:results"
+SEARCH_PROMOTIONS_VERSION_KEY = "search:promotions:version"
+
+_index = None
+
+
+def get_search_models():
+    return [apps.get_model(label) for label in settings.SEARCH_PAGE_MODELS]
+
+
+def is_searchable(page):
+    return page.live and type(page) in get_search_models()
+
+
+def get_field_text(page, field):
+    """
+    Plain text of a search field of the page. Wagtail already turns streamfields and rich
+    text into a list of their searchable content.
+    """
+
+    value = field.get_value(page)
+
+    if value is None:
+        return ""
+
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(content) for content in value)
+
+    return strip_tags(str(value))
+
+
+def get_page_terms(page):
+    """
+    Map each word of the searchable fields of the page to its weight: the boost of every
+    field it appears in times the number of times it appears there.
+    """
+
+    terms = Counter()
+
+    for field in page.get_search_fields():
+        if not isinstance(field, index.SearchField):
+            continue
+
+        boost = field.boost or 1
+        for word in tokenize(get_field_text(page, field)):
+            terms[word] += boost
+
+    return dict(terms)
+
+
+def bump_search_index_version():
+    cache.set(SEARCH_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_page_document(page, generation=SearchDocument.LIVE):
+    """
+    The unsaved search document of a searchable page.
+    """
+
+    return SearchDocument(
+        page_id=page.pk,
+        generation=generation,
+        content_type=ContentType.objects.get_for_model(page),
+        locale_id=page.locale_id,
+        terms=get_page_terms(page),
+    )
+
+
+def save_documents(documents):
+    """
+    Insert or update the documents with a single query.
+    """
+
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["page", "generation"],
+        update_fields=["content_type", "locale", "terms", "updated_at"],
+    )
+
+
+def index_pages(pages):
+    """
+    Create or update the search documents of the pages, removing the ones no longer
+    searchable, and bump the index version once.
+    """
+
+    pages = [page.specific for page in pages]
+    documents = [get_page_document(page) for page in pages if is_searchable(page)]
+
+    if documents:
+        save_documents(documents)
+
+    removed = remove_pages([page.pk for page in pages if not is_searchable(page)], bump=False)
+
+    if documents or removed:
+        bump_search_index_version()
+
+
+def remove_pages(page_ids, bump=True):
+    """
+    Delete the documents of the pages, returning the number deleted.
+    """
+
+    if not page_ids:
+        return 0
+
+    deleted, _ = SearchDocument.objects.filter(page_id__in=page_ids, generation=SearchDocument.LIVE).delete()
+
+    if deleted and bump:
+        bump_search_index_version()
+
+    return deleted
+
+
+class SearchIndex:
+    """
+    In memory inverted index of all the search documents.
+    """
+
+    def __init__(self, documents, version=None):
+        self.version = version
+        self.documents = {}  # page id -> (content type id, locale id)
+        self.postings = defaultdict(dict)  # stem -> {page id: weight}
+        self.stems = {}  # word -> stem
+        self.word_trigrams = defaultdict(set)  # trigram -> words
+
+        for page_id, content_type_id, locale_id, terms in documents:
+            self.documents[page_id] = (content_type_id, locale_id)
+
+            for word, weight in terms.items():
+                word_stem = self.stems.setdefault(word, stem(word))
+                postings = self.postings[word_stem]
+                postings[page_id] = postings.get(page_id, 0) + weight
+
+        for word in self.stems:
+            for trigram in trigrams(word):
+                self.word_trigrams[trigram].add(word)
+
+    @classmethod
+    def load(cls, version=None):
+        documents = SearchDocument.objects.filter(generation=SearchDocument.LIVE).values_list(
+            "page_id", "content_type_id", "locale_id", "terms"
+        )
+        return cls(documents.iterator(chunk_size=500), version=version)
+
+    def idf(self, word_stem):
+        return math.log(1 + len(self.documents) / len(self.postings[word_stem]))
+
+    def expand(self, word):
+        """
+        Return the stems matching a query word with their similarity: the stem of the word
+        itself and the stems of the indexed words that look like a typo of it.
+        """
+
+        matches = {}
+
+        word_stem = stem(word)
+        if word_stem in self.postings:
+            matches[word_stem] = 1.0
+
+        if len(word) < settings.SEARCH_FUZZY_MIN_LENGTH:
+            return matches
+
+        candidates = {candidate for trigram in trigrams(word) for candidate in self.word_trigrams.get(trigram, ())}
+        for candidate in candidates:
+            score = similarity(word, candidate)
+            if score >= settings.SEARCH_FUZZY_THRESHOLD:
+                candidate_stem = self.stems[candidate]
+                matches[candidate_stem] = max(matches.get(candidate_stem, 0), score)
+
+        return matches
+
+    def search(self, query, locale_id=None):
+        """
+        Return a list of (page id, score) sorted by score. Pages matching every word of the
+        query rank above the ones matching only some of them.
+        """
+
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+
+        for word in words:
+            hits = {}
+            for word_stem, score in self.expand(word).items():
+                idf = self.idf(word_stem)
+                for page_id, weight in self.postings[word_stem].items():
+                    hits[page_id] = max(hits.get(page_id, 0), score * idf * (1 + math.log(max(weight, 1))))
+
+            for page_id, score in hits.items():
+                scores[page_id] += score
+                matched[page_id] += 1
+
+        results = [
+            (page_id, score * (matched[page_id] / len(words)) ** 2)
+            for page_id, score in scores.items()
+            if locale_id is None or self.documents[page_id][1] == locale_id
+        ]
+
+        return sorted(results, key=lambda result: (-result[1], result[0]))
+
+
+def get_search_index():
+    """
+    The index of this process, reloaded when a page was indexed since it was loaded.
+    """
+
+    global _index
+
+    version = get_version(SEARCH_INDEX_VERSION_KEY)
+
+    if _index is None or _index.version != version:
+        start = time.perf_counter()
+        _index = SearchIndex.load(version=version)
+        logger.info("loaded search index of %s pages in %.3fs" % (len(_index.documents), time.perf_counter() - start))
+
+    return _index
+
+
+def get_pages(page_ids, content_type_ids):
+    """
+    Fetch the live pages with a query per content type, keeping the order of `page_ids`.
+    """
+
+    ids_by_content_type = defaultdict(list)
+    for page_id in page_ids:
+        ids_by_content_type[content_type_ids[page_id]].append(page_id)
+
+    pages = {}
+    for content_type_id, ids in ids_by_content_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        pages.update((page.pk, page) for page in model.objects.live().filter(pk__in=ids))
+
+    return [pages[page_id] for page_id in page_ids if page_id in pages]
+
+
+def normalize_query(query):
+    """
+    The analysed words of a query, sorted, so `Asunción Encarnación` and `encarnacion
+    asuncion` share their cached results.
+    """
+
+    return " ".join(sorted(set(tokenize(query))))
+
+
+def get_search_results_cache_key(query, locale_id, version):
+    digest = hashlib.md5(normalize_query(query).encode()).hexdigest()
+    return f"{SEARCH_RESULTS_PREFIX}:{locale_id}:{version}:{digest}"
+
+
+def get_search_results(query, locale_id):
+    """
+    Return the list of (page id, content type id, score) matching the query, cached until
+    the next page is indexed or the cache timeout.
+    """
+
+    version = get_version(SEARCH_INDEX_VERSION_KEY)
+    key = get_search_results_cache_key(query, locale_id, version)
+
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    search_index = get_search_index()
+    results = [
+        (page_id, search_index.documents[page_id][0], score)
+        for page_id, score in search_index.search(query, locale_id=locale_id)[: settings.SEARCH_MAX_RESULTS]
+    ]
+
+    cache.set(key, results, timeout=settings.SEARCH_CACHE_TIMEOUT)
+
+    return results
+
+
+def bump_search_promotions_version():
+    cache.set(SEARCH_PROMOTIONS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_search_promotions(query):
+    """
+    Return the results editors promoted for the query, cached until a promotion changes.
+    """
+
+    query_string = normalise_query_string(query)
+    version = get_version(SEARCH_PROMOTIONS_VERSION_KEY)
+    key = f"search:promotions:{version}:{hashlib.md5(query_string.encode()).hexdigest()}"
+
+    promotions = cache.get(key)
+    if promotions is None:
+        promotions = list(
+            SearchPromotion.objects.filter(query__query_string=query_string)
+            .filter(Q(page__isnull=True) | Q(page__live=True))
+            .select_related("page")
+            .order_by("sort_order")
+        )
+        cache.set(key, promotions, timeout=settings.SEARCH_CACHE_TIMEOUT)
+
+    return promotions
+
+
+def get_result_pages(results):
+    """
+    The typed live pages of a list of (page id, content type id, score) search results
+    with their score in `search_score`.
+    """
+
+    scores = {page_id: score for page_id, _, score in results}
+
+    pages = get_pages(
+        [page_id for page_id, _, _ in results],
+        {page_id: content_type_id for page_id, content_type_id, _ in results},
+    )
+    for page in pages:
+        page.search_score = scores[page.pk]
+
+    return pages
+
+
+def search(query, locale=None, limit=None):
+    """
+    Search the pages of the active (or given) locale, returning the typed pages ordered by
+    relevance with their score in `search_score`.
+    """
+
+    locale = locale or Locale.get_active()
+
+    return get_result_pages(get_search_results(query, locale.pk)[: limit or settings.SEARCH_MAX_RESULTS])
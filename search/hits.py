@@ -0,0 +1,119 @@
+"""
+Search hit counting without a database write per search.
+
+Hits are counted in memory per normalised query and day and written to wagtail's
+`QueryDailyHits` (which feeds the popular searches report and the promoted results admin)
+by a background thread every `SEARCH_HITS_FLUSH_INTERVAL` seconds, one upsert per distinct
+query. Hits still buffered when the worker exits are flushed at exit; a worker killed hard
+loses at most one interval of hits, which is fine for analytics.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wagtail.contrib.search_promotions.models import Query, QueryDailyHits
+from wagtail.search.utils import MAX_QUERY_STRING_LENGTH, normalise_query_string
+
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHitBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.thread = None
+        self.pid = None
+
+    def add(self, query_string):
+        query_string = normalise_query_string(query_string)[:MAX_QUERY_STRING_LENGTH]
+        if not query_string:
+            return
+
+        with self.lock:
+            self.hits[(query_string, timezone.now().date())] += 1
+
+        if getattr(settings, "SEARCH_HITS_ASYNC", True):
+            self.start()
+
+    def start(self):
+        """
+        Start the flushing thread of this process. Checked on every hit since gunicorn forks
+        its workers after importing the app and threads do not survive a fork.
+        """
+
+        if self.thread is not None and self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name="search-hits", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.SEARCH_HITS_FLUSH_INTERVAL)
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("could not flush search hits")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """
+        Write the buffered hits, returning the number of hits written.
+        """
+
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+
+        if not hits:
+            return 0
+
+        try:
+            with transaction.atomic():
+                for (query_string, date), count in hits.items():
+                    query = Query.get(query_string)
+                    daily_hits, _ = QueryDailyHits.objects.get_or_create(query=query, date=date)
+                    QueryDailyHits.objects.filter(pk=daily_hits.pk).update(hits=F("hits") + count)
+
+        except Exception:
+            # Put the hits back so the next flush retries them
+            with self.lock:
+                self.hits.update(hits)
+            raise
+
+        logger.info("flushed %s search hits of %s queries" % (sum(hits.values()), len(hits)))
+
+        return sum(hits.values())
+
+
+search_hits = SearchHitBuffer()
+
+
+def record_search_hit(query_string):
+    search_hits.add(query_string)
+
+
+def flush_search_hits():
+    return search_hits.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        search_hits.flush()
+    except Exception:
+        logger.exception("could not flush search hits at exit")
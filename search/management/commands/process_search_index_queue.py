@@ -0,0 +1,28 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from search.queue import process_all
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that applies the queued search index updates. See `search.queue`
+
+    Web workers drain the queue themselves in the background, this catches up after a
+    deploy or when the workers were restarted before their next flush.
+    """
+
+    help = "Apply the queued search index updates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Number of queued objects per transaction")
+
+    def handle(self, *args, **kwargs):
+        updated = process_all(kwargs["batch_size"])
+
+        self.stdout.write(f"Updated {updated} objects.")
+        self.stdout.write("All Done.")
@@ -0,0 +1,160 @@
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from wagtail.search import index
+
+from search.engine import bump_search_index_version, get_page_document, get_pages, get_search_models, save_documents
+from search.models import IndexQueueEntry, SearchDocument
+from search.queue import process_queue
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_documents(label, page_ids):
+    """
+    Shadow documents of a chunk of pages of the same type, run by the worker processes.
+    """
+
+    model = apps.get_model(label)
+    pages = model.objects.live().filter(pk__in=page_ids)
+
+    return [get_page_document(page, generation=SearchDocument.SHADOW) for page in pages]
+
+
+class Command(BaseCommand):
+    """
+    Command that rebuilds the search documents of all the live searchable pages.
+
+    Pages are split in chunks of the same type whose documents are built by a pool of
+    processes into the shadow generation while searches keep reading the live one. The
+    shadow documents are swapped in with a single transaction at the end, catching up with
+    the pages published or unpublished during the rebuild.
+
+    Documents are updated as pages are published so this is only needed after changing the
+    search fields of a page type or how text is analysed. With `--admin` every indexed
+    object is also queued for wagtail's admin search index and the queue is drained in
+    batches, each its own short transaction, instead of one long `update_index`.
+    """
+
+    help = "Rebuild the search documents of all live searchable pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=200, help="Number of pages per chunk")
+        parser.add_argument(
+            "--workers", type=int, default=min(4, os.cpu_count() or 1), help="Number of processes building documents"
+        )
+        parser.add_argument("--admin", action="store_true", help="Also rebuild wagtail's admin search index")
+
+    def handle(self, *args, **kwargs):
+        started = timezone.now()
+
+        # Leftovers of an interrupted rebuild
+        SearchDocument.objects.filter(generation=SearchDocument.SHADOW).delete()
+
+        chunks = self.get_chunks(kwargs["chunk_size"])
+        totals = Counter()
+        for label, page_ids in chunks:
+            totals[label] += len(page_ids)
+
+        done = Counter()
+        for label, count, documents in self.build(chunks, kwargs["workers"]):
+            SearchDocument.objects.bulk_create(documents, batch_size=500)
+            done[label] += count
+            self.stdout.write(f"{label}: {done[label]}/{totals[label]} pages")
+
+        swapped = self.swap(started)
+        self.stdout.write(f"Indexed {swapped} pages.")
+
+        if kwargs["admin"]:
+            self.rebuild_admin_index()
+
+        self.stdout.write("All Done.")
+
+    def get_chunks(self, chunk_size):
+        """
+        List of (model label, page ids) of at most `chunk_size` live pages of a type.
+        """
+
+        chunks = []
+        for model in get_search_models():
+            page_ids = list(model.objects.live().order_by("pk").values_list("pk", flat=True))
+            for start in range(0, len(page_ids), chunk_size):
+                chunks.append((model._meta.label, page_ids[start : start + chunk_size]))
+
+        return chunks
+
+    def build(self, chunks, workers):
+        """
+        Yield the (model label, number of pages, documents) of each chunk as they are built.
+        """
+
+        if workers <= 1 or len(chunks) <= 1:
+            for label, page_ids in chunks:
+                yield label, len(page_ids), build_documents(label, page_ids)
+            return
+
+        # Every process opens its own connection
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            futures = {
+                executor.submit(build_documents, label, page_ids): (label, len(page_ids)) for label, page_ids in chunks
+            }
+            for future in as_completed(futures):
+                label, count = futures[future]
+                yield label, count, future.result()
+
+    @transaction.atomic
+    def swap(self, started):
+        """
+        Replace the live documents with the shadow ones, returning the number of documents.
+        """
+
+        live = SearchDocument.objects.filter(generation=SearchDocument.LIVE)
+        shadow = SearchDocument.objects.filter(generation=SearchDocument.SHADOW)
+
+        # Published while building
+        changed = dict(live.filter(updated_at__gte=started).values_list("page_id", "content_type_id"))
+        if changed:
+            pages = get_pages(list(changed), changed)
+            save_documents([get_page_document(page, generation=SearchDocument.SHADOW) for page in pages])
+
+        # Unpublished while building
+        shadow.filter(page__live=False).delete()
+
+        live.delete()
+        swapped = shadow.update(generation=SearchDocument.LIVE)
+
+        bump_search_index_version()
+
+        return swapped
+
+    def rebuild_admin_index(self):
+        now = timezone.now()
+
+        for model in index.get_indexed_models():
+            content_type = ContentType.objects.get_for_model(model)
+            object_ids = model.get_indexed_objects().values_list("pk", flat=True).iterator(chunk_size=1000)
+
+            IndexQueueEntry.objects.bulk_create(
+                (IndexQueueEntry(content_type=content_type, object_id=str(pk), queued_at=now) for pk in object_ids),
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["content_type", "object_id"],
+                update_fields=["queued_at"],
+            )
+
+        total = 0
+        while updated := process_queue():
+            total += updated
+            self.stdout.write(f"Admin search index: {total} objects")
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('search', '0001_initial'),
+        ('wagtailcore', '0094_alter_page_locale'),
+        migrations.swappable_dependency(settings.WAGTAIL_PAGE_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=255)),
+                ('queued_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'indexqueueentry',
+                'verbose_name_plural': 'indexqueueentries',
+            },
+        ),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='generation',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='searchdocument',
+            name='page',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.WAGTAIL_PAGE_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('page', 'generation'), name='unique_search_document_generation'),
+        ),
+        migrations.AddField(
+            model_name='indexqueueentry',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='indexqueueentry',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_index_queue_entry'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+from wagtail.models import Locale, Page
+
+
+class SearchDocument(models.Model):
+    """
+    The analysed text of a live page indexed by our search engine. See `search.engine`
+
+    `terms` maps each folded word of the page to the sum of the boosts of the fields it
+    appears in, repeated as many times as it appears.
+
+    Searches only read the `LIVE` generation. A full rebuild writes its documents as the
+    `SHADOW` generation and swaps them in at the end. See `rebuild_search_index`
+    """
+
+    LIVE = 0
+    SHADOW = 1
+
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="+")
+    generation = models.PositiveSmallIntegerField(default=LIVE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+")
+    locale = models.ForeignKey(Locale, on_delete=models.CASCADE, related_name="+")
+    terms = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "searchdocument"
+        verbose_name_plural = "searchdocuments"
+        constraints = [
+            models.UniqueConstraint(fields=["page", "generation"], name="unique_search_document_generation"),
+        ]
+
+    def __str__(self):
+        return f"SearchDocument of page {self.page_id}"
+
+
+class IndexQueueEntry(models.Model):
+    """
+    An indexed object saved or deleted since the search indexes were last updated with
+    it. See `search.queue`
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+")
+    object_id = models.CharField(max_length=255)
+    queued_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "indexqueueentry"
+        verbose_name_plural = "indexqueueentries"
+        constraints = [
+            models.UniqueConstraint(fields=["content_type", "object_id"], name="unique_index_queue_entry"),
+        ]
+
+    def __str__(self):
+        return f"IndexQueueEntry of {self.content_type_id}:{self.object_id}"
@@ -0,0 +1,177 @@
+"""
+Search index updates off the editor's request.
+
+Saving or deleting an indexed object (pages, images, documents, snippets...) only upserts its
+`IndexQueueEntry`. A background thread of each web worker, started by the WSGI entry point
+(`main.wsgi`) rather than by the saves, drains the queue every `SEARCH_INDEX_QUEUE_INTERVAL`
+seconds in batches of `SEARCH_INDEX_BATCH_SIZE` entries: the objects of a batch are fetched
+with a query per model and written with a bulk insert per model to wagtail's search backends
+(the admin search, configured with `AUTO_UPDATE` off so wagtail doesn't index them
+synchronously) and to our own engine (see `search.engine`).
+
+The queue lives in the database so the entries of a worker killed before its next flush are
+picked up by the next one. Other processes (management commands, shells) only queue, and
+`process_search_index_queue` drains it from cron or a deploy.
+An object saved several times before a flush is indexed once.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from wagtail.models import Page
+from wagtail.search import index
+from wagtail.search.backends import get_search_backends
+
+from search.engine import index_pages, remove_pages
+from search.models import IndexQueueEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_content_type_id(instance):
+    """
+    Pages are queued as their specific type, even when saved as a plain `Page`.
+    """
+
+    if isinstance(instance, Page) and instance.content_type_id:
+        return instance.content_type_id
+
+    return ContentType.objects.get_for_model(instance).pk
+
+
+def update_objects(model, object_ids):
+    """
+    Index the objects of the model with the given ids, removing the ones deleted or no
+    longer indexed.
+    """
+
+    objects = list(model.get_indexed_objects().filter(pk__in=object_ids))
+    found = {str(obj.pk) for obj in objects}
+    missing = [model(pk=object_id) for object_id in object_ids if object_id not in found]
+
+    for backend in get_search_backends():
+        if objects:
+            backend.add_bulk(model, objects)
+        for obj in missing:
+            backend.delete(obj)
+
+    if issubclass(model, Page):
+        index_pages(objects)
+        remove_pages([obj.pk for obj in missing])
+
+    return len(objects) + len(missing)
+
+
+def process_queue(batch_size=None):
+    """
+    Apply the oldest batch of queued updates, returning the number of objects updated.
+    """
+
+    entries = list(IndexQueueEntry.objects.order_by("queued_at")[: batch_size or settings.SEARCH_INDEX_BATCH_SIZE])
+    if not entries:
+        return 0
+
+    ids_by_content_type = defaultdict(set)
+    for entry in entries:
+        ids_by_content_type[entry.content_type_id].add(entry.object_id)
+
+    updated = 0
+
+    with transaction.atomic():
+        for content_type_id, object_ids in ids_by_content_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None or not index.class_is_indexed(model):
+                continue
+
+            updated += update_objects(model, sorted(object_ids))
+
+        # Objects queued again while the batch was processed keep their entry for the next one
+        IndexQueueEntry.objects.filter(
+            pk__in=[entry.pk for entry in entries],
+            queued_at__lte=entries[-1].queued_at,
+        ).delete()
+
+    logger.info("updated the search indexes with %s objects" % updated)
+
+    return updated
+
+
+def process_all(batch_size=None):
+    """
+    Drain the queue, returning the number of objects updated.
+    """
+
+    total = 0
+    while updated := process_queue(batch_size):
+        total += updated
+
+    return total
+
+
+class IndexQueueWorker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        """
+        Start the thread of this process. Called by the WSGI entry point, which gunicorn imports
+        in each worker after the fork; with `--preload` the forked workers start their own.
+        """
+
+        if not settings.SEARCH_INDEX_ASYNC:
+            return
+
+        if self.thread is not None and self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name="search-index", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.SEARCH_INDEX_QUEUE_INTERVAL)
+
+            try:
+                process_all()
+            except Exception:
+                logger.exception("could not update the search indexes")
+            finally:
+                close_old_connections()
+
+
+worker = IndexQueueWorker()
+
+
+def enqueue(instance):
+    """
+    Queue the object to be (re)indexed or removed from the search indexes.
+    """
+
+    content_type_id = get_content_type_id(instance)
+
+    if not getattr(settings, "SEARCH_INDEX_ASYNC", True):
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is not None and index.class_is_indexed(model):
+            update_objects(model, [str(instance.pk)])
+        return
+
+    IndexQueueEntry.objects.bulk_create(
+        [IndexQueueEntry(content_type_id=content_type_id, object_id=str(instance.pk), queued_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=["content_type", "object_id"],
+        update_fields=["queued_at"],
+    )
@@ -0,0 +1,38 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+
+from wagtail.contrib.search_promotions.models import SearchPromotion
+from wagtail.search import index
+
+from search.engine import bump_search_promotions_version
+from search.queue import enqueue
+
+
+logger = logging.getLogger(__name__)
+
+
+def indexed_object_changed_receiver(sender, instance, raw=False, **kwargs):
+    """
+    Queue every saved or deleted indexed object, publishing and unpublishing pages included
+    since both save the page. See `search.queue`
+    """
+
+    if raw:
+        return
+
+    enqueue(instance)
+
+
+def search_promotion_changed_receiver(sender, instance, **kwargs):
+    bump_search_promotions_version()
+
+
+for model in index.get_indexed_models():
+    if getattr(model, "search_auto_update", True):
+        dispatch_uid = f"search-index-{model._meta.label}"
+        post_save.connect(indexed_object_changed_receiver, sender=model, dispatch_uid=dispatch_uid)
+        post_delete.connect(indexed_object_changed_receiver, sender=model, dispatch_uid=dispatch_uid)
+
+post_save.connect(search_promotion_changed_receiver, sender=SearchPromotion, dispatch_uid="search-promotions")
+post_delete.connect(search_promotion_changed_receiver, sender=SearchPromotion, dispatch_uid="search-promotions")
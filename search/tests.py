@@ -0,0 +1,263 @@
+import logging
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from wagtail.contrib.search_promotions.models import Query, QueryDailyHits, SearchPromotion
+from wagtail.models import Page, Site
+from wagtail.test.utils import WagtailPageTestCase
+
+from blog.models import BlogIndexPage, BlogPage
+from home.models import HomePage
+from locations.models import CityIndexPage, CityPage
+from search.engine import SearchIndex, search
+from search.hits import flush_search_hits, search_hits
+from search.management.commands.rebuild_search_index import Command as RebuildCommand, build_documents
+from search.models import IndexQueueEntry, SearchDocument
+from search.queue import process_queue
+from search.text import fold, stem, tokenize
+
+
+logger = logging.getLogger(__name__)
+
+
+class TextTests(SimpleTestCase):
+    """
+    Test suite for the analysis of text shared by the index and the queries.
+    """
+
+    def test_fold_strips_accents(self):
+        self.assertEqual(fold("Asunción"), "asuncion")
+        self.assertEqual(fold("ENCARNACIÓN"), "encarnacion")
+        self.assertEqual(fold("São Paulo"), "sao paulo")
+
+    def test_tokenize_drops_stopwords(self):
+        self.assertEqual(tokenize("Pasajes de micro a Ciudad del Este"), ["pasajes", "micro", "ciudad", "este"])
+
+    def test_stem_matches_plurals_and_languages(self):
+        self.assertEqual(stem("pasajes"), stem("pasaje"))
+        self.assertEqual(stem("ciudades"), stem("ciudad"))
+        self.assertEqual(stem("buses"), stem("bus"))
+        self.assertEqual(stem("estaciones"), stem("estacion"))
+        self.assertEqual(stem("estacoes"), stem("estacao"))
+        self.assertEqual(stem("2024"), "2024")
+
+
+class SearchEngineTests(WagtailPageTestCase):
+    """
+    Test suite for the site search engine.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+
+        cls.home_page = HomePage(title="Home", slug="home-search")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        city_index = CityIndexPage(title="Ciudades", slug="ciudades")
+        cls.home_page.add_child(instance=city_index)
+        city_index.save_revision().publish()
+
+        cls.asuncion = CityPage(title="Asunción", slug="asuncion", intro="Capital del Paraguay")
+        cls.encarnacion = CityPage(title="Encarnación", slug="encarnacion", intro="Playas sobre el río Paraná")
+        cls.draft = CityPage(title="Asunción borrador", slug="borrador", live=False)
+
+        for page in (cls.asuncion, cls.encarnacion):
+            city_index.add_child(instance=page)
+            page.save_revision().publish()
+        city_index.add_child(instance=cls.draft)
+
+        blog_index = BlogIndexPage(title="Blog", slug="blog")
+        cls.home_page.add_child(instance=blog_index)
+        blog_index.save_revision().publish()
+
+        cls.post = BlogPage(title="Viajar barato", slug="viajar", intro="Pasajes baratos a Asunción")
+        blog_index.add_child(instance=cls.post)
+        cls.post.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(search_hits.hits.clear)
+
+    def test_only_live_pages_of_search_models_are_indexed(self):
+        indexed = set(SearchDocument.objects.values_list("page_id", flat=True))
+
+        self.assertEqual(indexed, {self.asuncion.pk, self.encarnacion.pk, self.post.pk})
+
+    def test_search_is_accent_insensitive(self):
+        self.assertEqual(search("asuncion")[0], self.asuncion)
+        self.assertEqual(search("ENCARNACION")[0], self.encarnacion)
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual(search("asuncoin")[0], self.asuncion)
+        self.assertEqual(search("encarnasion")[0], self.encarnacion)
+
+    def test_search_matches_stems(self):
+        self.assertEqual(search("pasaje barato"), [self.post])
+
+    def test_title_outranks_body(self):
+        results = search("asuncion")
+
+        self.assertEqual(results, [self.asuncion, self.post])
+        self.assertGreater(results[0].search_score, results[1].search_score)
+
+    def test_results_are_typed_in_a_fixed_number_of_queries(self):
+        search("asuncion")
+
+        # active locale + one query per page type of the results
+        with self.assertNumQueries(3):
+            results = search("asuncion")
+
+        self.assertIsInstance(results[0], CityPage)
+        self.assertIsInstance(results[1], BlogPage)
+
+    def test_unpublished_pages_leave_the_index(self):
+        self.encarnacion.unpublish()
+
+        self.assertEqual(search("encarnacion"), [])
+
+    def test_results_are_cached_by_normalized_query(self):
+        search("Asunción capital")
+
+        with mock.patch.object(SearchIndex, "load", side_effect=AssertionError("index loaded")):
+            results = search("CAPITAL asuncion")
+
+        self.assertEqual(results[0], self.asuncion)
+
+    def test_publishing_invalidates_cached_results(self):
+        self.assertEqual(search("villarrica"), [])
+
+        villarrica = CityPage(title="Villarrica", slug="villarrica")
+        self.asuncion.get_parent().add_child(instance=villarrica)
+        villarrica.save_revision().publish()
+
+        self.assertEqual(search("villarrica"), [villarrica])
+
+    def test_search_view(self):
+        response = self.client.get(reverse("search"), {"query": "asunsion"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["search_results"]), [self.asuncion, self.post])
+        self.assertContains(response, self.asuncion.url)
+
+    def test_search_hits_are_flushed_in_batches(self):
+        for query in ("Asunción", "asunción", "Encarnación"):
+            self.client.get(reverse("search"), {"query": query})
+
+        self.assertFalse(QueryDailyHits.objects.exists())
+        self.assertEqual(flush_search_hits(), 3)
+
+        self.assertEqual(Query.get("asunción").hits, 2)
+        self.assertEqual(Query.get("encarnación").hits, 1)
+        self.assertEqual(flush_search_hits(), 0)
+
+    def test_search_view_shows_promotions(self):
+        SearchPromotion.objects.create(query=Query.get("ofertas"), page=self.post, description="Mejores precios")
+
+        response = self.client.get(reverse("search"), {"query": "Ofertas"})
+
+        self.assertContains(response, "Mejores precios")
+        self.assertContains(response, self.post.url)
+        self.assertNotContains(response, "No results found")
+
+
+class SearchIndexQueueTests(WagtailPageTestCase):
+    """
+    Test suite for the queued updates and the rebuild of the search indexes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+
+        cls.home_page = HomePage(title="Home", slug="home-search-queue")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        cls.city_index = CityIndexPage(title="Ciudades", slug="ciudades")
+        cls.home_page.add_child(instance=cls.city_index)
+        cls.city_index.save_revision().publish()
+
+        cls.cities = []
+        for title in ("Asunción", "Encarnación", "Concepción"):
+            city = CityPage(title=title, slug=title.lower())
+            cls.city_index.add_child(instance=city)
+            city.save_revision().publish()
+            cls.cities.append(city)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(search_hits.hits.clear)
+
+    def get_live_documents(self):
+        return set(SearchDocument.objects.filter(generation=SearchDocument.LIVE).values_list("page_id", flat=True))
+
+    @override_settings(SEARCH_INDEX_ASYNC=True)
+    def test_updates_are_queued_and_applied_in_batches(self):
+        villarrica = CityPage(title="Villarrica", slug="villarrica")
+        self.city_index.add_child(instance=villarrica)
+        villarrica.save_revision().publish()
+        villarrica.save_revision().publish()
+
+        self.assertEqual(IndexQueueEntry.objects.filter(object_id=str(villarrica.pk)).count(), 1)
+        self.assertEqual(search("villarrica"), [])
+        self.assertEqual(list(CityPage.objects.search("villarrica")), [])
+
+        process_queue()
+
+        self.assertEqual(search("villarrica"), [villarrica])
+        self.assertEqual(list(CityPage.objects.search("villarrica")), [villarrica])
+        self.assertFalse(IndexQueueEntry.objects.exists())
+
+    @override_settings(SEARCH_INDEX_ASYNC=True)
+    def test_deleted_pages_leave_the_indexes(self):
+        asuncion = self.cities[0]
+
+        asuncion.delete()
+
+        process_queue()
+
+        self.assertEqual(search("asuncion"), [])
+        self.assertEqual(list(CityPage.objects.search("asuncion")), [])
+
+    def test_rebuild_swaps_in_the_shadow_index(self):
+        SearchDocument.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("rebuild_search_index", chunk_size=2, workers=1, admin=True, stdout=stdout)
+
+        self.assertEqual(self.get_live_documents(), {city.pk for city in self.cities})
+        self.assertFalse(SearchDocument.objects.filter(generation=SearchDocument.SHADOW).exists())
+        self.assertIn("locations.CityPage: 2/3 pages", stdout.getvalue())
+        self.assertIn("locations.CityPage: 3/3 pages", stdout.getvalue())
+        self.assertEqual(search("concepcion"), [self.cities[2]])
+
+    def test_rebuild_catches_up_with_pages_changed_meanwhile(self):
+        started = timezone.now()
+        page_ids = [city.pk for city in self.cities]
+        SearchDocument.objects.bulk_create(build_documents("locations.CityPage", page_ids))
+
+        asuncion, encarnacion, _ = self.cities
+        asuncion.title = "Asunción del Paraguay"
+        asuncion.save_revision().publish()
+        encarnacion.unpublish()
+
+        RebuildCommand().swap(started)
+
+        self.assertEqual(self.get_live_documents(), {asuncion.pk, self.cities[2].pk})
+        self.assertEqual(search("paraguay"), [asuncion])
@@ -0,0 +1,97 @@
+"""
+Text analysis shared by the search index and the queries.
+
+Text is folded to lowercase ascii (Asunción -> asuncion, São Paulo -> sao paulo), split in
+words and stripped of spanish, portuguese and english stopwords. Words are reduced with a
+light stemmer for spanish and portuguese that only normalises plurals, gender and a few
+common suffixes, which is enough to match `pasajes` with `pasaje` or `estación` with
+`estações` without the false positives of an aggressive stemmer.
+"""
+
+import re
+import unicodedata
+
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+VOWELS = frozenset("aeiou")
+
+STOPWORDS = frozenset(
+    """
+    a al and as com como con da das de del do dos e el em en es la las lo los mas na nas no nos
+    o of os para pela pelo per por que se sin sus su the to um uma un una uno y
+    """.split()
+)
+
+# Suffix -> replacement, longest first. Applied once and only when at least three letters remain
+SUFFIXES = (
+    ("amente", ""),
+    ("aciones", "ac"),
+    ("mente", ""),
+    ("acion", "ac"),
+    ("acoes", "ac"),
+    ("iones", ""),
+    ("acao", "ac"),
+    ("ion", ""),
+    ("oes", ""),
+)
+
+MIN_STEM_LENGTH = 3
+
+
+def fold(text):
+    """
+    Lowercase the text and strip its accents.
+    """
+
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """
+    Return the folded words of the text without stopwords.
+    """
+
+    return [word for word in WORD_RE.findall(fold(text)) if word not in STOPWORDS]
+
+
+def stem(word):
+    """
+    Light spanish / portuguese stemmer for a folded word.
+    """
+
+    if len(word) <= MIN_STEM_LENGTH or word.isdigit():
+        return word
+
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[: -len(suffix)] + replacement
+
+    if word.endswith("es") and len(word) - 2 >= MIN_STEM_LENGTH and word[-3] not in VOWELS:
+        word = word[:-2]
+    elif word.endswith("s") and len(word) - 1 >= MIN_STEM_LENGTH:
+        word = word[:-1]
+
+    if word[-1] in "aoe" and len(word) - 1 >= MIN_STEM_LENGTH:
+        word = word[:-1]
+
+    return word
+
+
+def trigrams(word):
+    """
+    Set of trigrams of a word padded like postgres' pg_trgm so short words still get a few.
+    """
+
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(word, other):
+    """
+    Trigram similarity between two words, from 0 to 1.
+    """
+
+    a, b = trigrams(word), trigrams(other)
+    return len(a & b) / len(a | b)
@@ -1,41 +1,41 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.template.response import TemplateResponse
 
-from wagtail.models import Page
+from wagtail.models import Locale
 
+from base.pagination import CURSOR_PARAM, KeysetPaginator
+from search.engine import get_result_pages, get_search_promotions, get_search_results
+from search.hits import record_search_hit
 
-# To enable logging of search queries for use with the "Promoted search results" module
-# <https://docs.wagtail.org/en/stable/reference/contrib/searchpromotions.html>
-# uncomment the following line and the lines indicated in the search function
-# (after adding wagtail.contrib.search_promotions to INSTALLED_APPS):
 
-# from wagtail.contrib.search_promotions.models import Query
+def get_result_key(result):
+    """
+    Sort key of a (page id, content type id, score) search result, the order of the results.
+    """
+
+    page_id, _, score = result
+    return (-score, page_id)
 
 
 def search(request):
     search_query = request.GET.get("query", None)
-    page = request.GET.get("page", 1)
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-
-        # To log this query for use with the "Promoted search results" module:
+        search_results = get_search_results(search_query, Locale.get_active().pk)
+        search_promotions = get_search_promotions(search_query)
 
-        # query = Query.get(search_query)
-        # query.add_hit()
+        # Logged for the "Promoted search results" module without a write per request
+        # <https://docs.wagtail.org/en/stable/reference/contrib/searchpromotions.html>
+        record_search_hit(search_query)
 
     else:
-        search_results = Page.objects.none()
+        search_results = []
+        search_promotions = []
 
-    # Pagination
-    paginator = Paginator(search_results, 10)
-    try:
-        search_results = paginator.page(page)
-    except PageNotAnInteger:
-        search_results = paginator.page(1)
-    except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+    # Keyset pagination over the cached results so only the pages shown are fetched
+    paginator = KeysetPaginator(search_results, 10, key=get_result_key)
+    search_results = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    search_results.object_list = get_result_pages(search_results.object_list)
 
     return TemplateResponse(
         request,
@@ -43,5 +43,7 @@ def search(request):
         {
             "search_query": search_query,
             "search_results": search_results,
+            "search_promotions": search_promotions,
+            "page_obj": search_results,
         },
     )
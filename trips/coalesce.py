@@ -0,0 +1,153 @@
+"""
+Single flight for the trip searches: identical searches running at the same time are
+computed once and shared.
+
+On holiday peaks hundreds of buyers search the same origin, destination and date within
+seconds. The result of a search is cached for `TRIP_SEARCH_CACHE_TIMEOUT` seconds and, while
+it is being computed:
+
+- the other threads of the worker wait for the thread computing it (an event per key)
+- the other workers wait for the worker computing it, which holds a lock in the shared cache
+  (`cache.add`), polling the cache for the result
+
+A search is only computed again when the one running fails or takes longer than
+`TRIP_SEARCH_COALESCE_TIMEOUT` seconds, so a stuck worker never blocks the rest.
+
+Across workers the coalescing is best effort: it is exact only with a cache backend whose
+`add` is atomic (ex: Redis, memcached, the database cache). With the file based cache two
+workers may both take the lock and compute the same search, which wastes the work but never
+returns a wrong result, and a worker taking the lock looks at the cache again first.
+
+Computations, cache hits and searches that waited for another one are counted by each worker
+and added up in the shared cache (see `base.counters`), `get_trip_search_stats` returns them.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from base.counters import CacheCounters
+
+
+logger = logging.getLogger(__name__)
+
+TRIP_SEARCH_PREFIX = "trips:search"
+POLL_INTERVAL = 0.02  # seconds between looks at the cache for the result of another worker
+
+MISSING = object()
+
+trip_search_counters = CacheCounters(f"{TRIP_SEARCH_PREFIX}:counter")
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class Flight:
+    """
+    A computation running in this worker, the threads asking for the same key wait for it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+def incr_trip_search_counter(name):
+    trip_search_counters.incr(name)
+
+
+def get_trip_search_stats():
+    """
+    Return the counters of the trip searches, shared by all workers. `saved` is the number
+    of computations avoided.
+    """
+
+    stats = trip_search_counters.get(["computed", "cached", "coalesced"])
+    stats["saved"] = stats["cached"] + stats["coalesced"]
+
+    return stats
+
+
+def compute_once(key, compute, timeout):
+    """
+    Compute and cache the result unless another worker is already at it, then wait for
+    theirs instead.
+    """
+
+    lock_key = f"{key}:lock"
+    wait = settings.TRIP_SEARCH_COALESCE_TIMEOUT
+    deadline = time.monotonic() + wait
+
+    locked = cache.add(lock_key, 1, timeout=wait)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+
+        result = cache.get(key, MISSING)
+        if result is not MISSING:
+            incr_trip_search_counter("coalesced")
+            return result
+
+        # The other worker failed and gave the lock back
+        locked = cache.add(lock_key, 1, timeout=wait)
+
+    if not locked:
+        logger.warning("gave up waiting for another worker to compute %s" % key)
+
+    try:
+        # The other worker may have stored its result and given the lock back between two
+        # looks, so the lock is no proof that the result is still missing
+        result = cache.get(key, MISSING)
+        if result is not MISSING:
+            incr_trip_search_counter("coalesced")
+            return result
+
+        result = compute()
+        cache.set(key, result, timeout=timeout)
+        incr_trip_search_counter("computed")
+        return result
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def single_flight(key, compute, timeout=None):
+    """
+    Return the result of `compute` cached under the key, computing it at most once at a time
+    across the threads and workers asking for it.
+    """
+
+    timeout = timeout or settings.TRIP_SEARCH_CACHE_TIMEOUT
+
+    result = cache.get(key, MISSING)
+    if result is not MISSING:
+        incr_trip_search_counter("cached")
+        return result
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+
+    if not leader:
+        if flight.done.wait(settings.TRIP_SEARCH_COALESCE_TIMEOUT) and not flight.failed:
+            incr_trip_search_counter("coalesced")
+            return flight.result
+
+        logger.warning("gave up waiting for another thread to compute %s" % key)
+        return compute_once(key, compute, timeout)
+
+    try:
+        flight.result = compute_once(key, compute, timeout)
+        return flight.result
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
@@ -0,0 +1,349 @@
+"""
+Trips with transfers, found with a round based search over the departures (RAPTOR).
+
+Each worker keeps the timetable of the days searched in memory: the legs on sale (see
+`trips.index`) leaving each stop sorted by time, the minimum transfer time of every stop
+and the footpaths between nearby stops (see `trips.transfers`). Since a leg already covers
+a ride between any two stops of a bus, round `k` of the search is `k` rides:
+
+1. every bus leaving the origin marks the stops it reaches with their arrival time
+2. from each stop marked in the previous round, after the transfer time there (or the walk
+   to a nearby stop), the buses leaving in the next `TRIP_MAX_WAIT` minutes mark the stops
+   they reach earlier than any earlier round did
+
+and so on for up to `TRIP_MAX_TRANSFERS` transfers. Arrivals later than the best one at the
+destination are pruned, so a round only looks at the buses that could still improve a trip.
+The search runs once per bus leaving the origin on the day, latest bus first, keeping the
+earliest arrivals found by the later buses: an earlier bus is only followed where it gets
+somewhere sooner. That yields the trips that leave later or arrive sooner or change fewer
+times than the rest (the Pareto set), within a latency budget of `TRIP_CONNECTIONS_BUDGET`
+seconds. A search over the budget misses the earliest buses of the day, so it is cached
+briefly and computed again rather than served as complete.
+
+Results are cached until the next change to the index, so repeated searches of a popular
+route on a day are a cache hit. The buses that already left are dropped when reading them,
+like `trips.search.search_trips` does for direct trips.
+"""
+
+import bisect
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from base.cache import get_version
+from trips.index import TRIP_INDEX_VERSION_KEY
+from trips.models import DepartureLeg, Footpath, Stop
+
+
+logger = logging.getLogger(__name__)
+
+_timetables = OrderedDict()
+_timetables_lock = threading.Lock()
+
+
+def to_minutes(value):
+    return int(value.timestamp() // 60)
+
+
+class Hop:
+    """
+    A leg of the timetable, times in minutes since the epoch.
+    """
+
+    __slots__ = ("leg_id", "departure_id", "origin", "destination", "departs", "arrives")
+
+    def __init__(self, leg_id, departure_id, origin, destination, departs, arrives):
+        self.leg_id = leg_id
+        self.departure_id = departure_id
+        self.origin = origin
+        self.destination = destination
+        self.departs = departs
+        self.arrives = arrives
+
+
+class Timetable:
+    """
+    The legs leaving on a day and the next (for overnight transfers) with the transfers
+    between stops.
+    """
+
+    def __init__(self, date, hops, transfer_times, footpaths, version=None):
+        self.date = date
+        self.version = version
+        self.transfer_times = transfer_times  # stop id -> minutes
+        self.footpaths = footpaths  # stop id -> [(stop id, minutes)]
+        self.first_day = set()  # leg ids leaving on `date`
+
+        hops_by_stop = defaultdict(list)
+        for hop, leg_date in hops:
+            hops_by_stop[hop.origin].append(hop)
+            if leg_date == date:
+                self.first_day.add(hop.leg_id)
+
+        self.hops = {}  # stop id -> (departure times, hops) sorted by departure
+        for stop_id, stop_hops in hops_by_stop.items():
+            stop_hops.sort(key=lambda hop: hop.departs)
+            self.hops[stop_id] = ([hop.departs for hop in stop_hops], stop_hops)
+
+    @classmethod
+    def load(cls, date, version=None):
+        legs = DepartureLeg.objects.filter(date__in=[date, date + timedelta(days=1)]).values_list(
+            "pk", "departure_id", "origin_id", "destination_id", "departs_at", "arrives_at", "date"
+        )
+        hops = [
+            (Hop(pk, departure_id, origin, destination, to_minutes(departs_at), to_minutes(arrives_at)), leg_date)
+            for pk, departure_id, origin, destination, departs_at, arrives_at, leg_date in legs.iterator(
+                chunk_size=2000
+            )
+        ]
+
+        transfer_times = {
+            stop_id: settings.TRIP_MIN_TRANSFER_TIME if minutes is None else minutes
+            for stop_id, minutes in Stop.objects.values_list("pk", "station__min_transfer_time")
+        }
+
+        footpaths = defaultdict(list)
+        for origin, destination, duration in Footpath.objects.values_list("origin_id", "destination_id", "duration"):
+            footpaths[origin].append((destination, duration))
+
+        return cls(date, hops, transfer_times, footpaths, version=version)
+
+    def __len__(self):
+        return sum(len(hops) for _, hops in self.hops.values())
+
+    def get_hops(self, stop_id, start, end):
+        """
+        The legs leaving the stop between the two times.
+        """
+
+        times, hops = self.hops.get(stop_id, ((), ()))
+        return hops[bisect.bisect_left(times, start) : bisect.bisect_right(times, end)]
+
+    def get_transfers(self, stop_id, arrival):
+        """
+        The stops a passenger arriving at the stop can board a bus at, with the time.
+        """
+
+        yield stop_id, arrival + self.transfer_times.get(stop_id, settings.TRIP_MIN_TRANSFER_TIME)
+        for other_stop_id, minutes in self.footpaths.get(stop_id, ()):
+            yield other_stop_id, arrival + minutes
+
+    def scan(self, first_hops, targets, earliest):
+        """
+        The trips to the targets starting with the bus of the first hops that arrive sooner
+        than the ones found so far with as many transfers or fewer, fewest transfers first.
+
+        `earliest` holds, per number of transfers, the earliest arrival at each stop found
+        by the scans of the buses leaving later, and is updated in place: a stop reached
+        sooner by a later bus is not worth continuing from (RAPTOR over departure times).
+        """
+
+        max_transfers = len(earliest) - 1
+        marked = {}  # stop id -> path of hops reaching it sooner in this round
+        trips = []
+
+        def improves(transfers, hop):
+            if hop.arrives >= earliest[transfers].get(hop.destination, math.inf):
+                return False
+            for labels in earliest[transfers:]:
+                if hop.arrives < labels.get(hop.destination, math.inf):
+                    labels[hop.destination] = hop.arrives
+            return True
+
+        for hop in first_hops:
+            if improves(0, hop):
+                marked[hop.destination] = (hop,)
+
+        for transfers in range(max_transfers + 1):
+            reached = [marked[target] for target in targets if target in marked]
+            if reached:
+                trips.append(min(reached, key=lambda path: path[-1].arrives))
+
+            if transfers == max_transfers:
+                break
+
+            best_target = min((earliest[transfers + 1].get(target, math.inf) for target in targets), default=math.inf)
+            next_marked = {}
+            for stop_id, path in marked.items():
+                if stop_id in targets:
+                    continue
+
+                last = path[-1]
+                for transfer_stop, ready in self.get_transfers(stop_id, last.arrives):
+                    for hop in self.get_hops(transfer_stop, ready, ready + settings.TRIP_MAX_WAIT):
+                        if hop.departure_id == last.departure_id or hop.arrives >= best_target:
+                            continue
+                        if improves(transfers + 1, hop):
+                            next_marked[hop.destination] = path + (hop,)
+                            if hop.destination in targets:
+                                best_target = hop.arrives
+
+            if not next_marked:
+                break
+            marked = next_marked
+
+        return trips
+
+    def search(self, origins, destinations, max_transfers=None, budget=None):
+        """
+        Return the paths of hops from the origin stops to the destination stops leaving on
+        the day, none of them leaving sooner, arriving later and changing more than another,
+        and whether every bus was scanned (False when the search ran over the budget).
+        """
+
+        max_transfers = settings.TRIP_MAX_TRANSFERS if max_transfers is None else max_transfers
+        deadline = time.perf_counter() + (budget or settings.TRIP_CONNECTIONS_BUDGET)
+        targets = set(destinations)
+
+        # The legs of each bus leaving the origin on the day, latest bus first
+        buses = defaultdict(list)
+        for origin in origins:
+            for hop in self.get_hops(origin, -math.inf, math.inf):
+                if hop.leg_id in self.first_day:
+                    buses[hop.departure_id].append(hop)
+
+        earliest = [{} for _ in range(max_transfers + 1)]
+        paths = []
+        buses = sorted(buses.values(), key=lambda hops: min(hop.departs for hop in hops), reverse=True)
+        for scanned, first_hops in enumerate(buses):
+            if time.perf_counter() > deadline:
+                logger.warning("connection search over budget after %s of %s buses" % (scanned, len(buses)))
+                return get_pareto_set(paths), False
+            paths += self.scan(first_hops, targets, earliest)
+
+        return get_pareto_set(paths), True
+
+
+def get_pareto_set(paths):
+    """
+    The paths no other one beats on departure, arrival and transfers, earliest arrival first.
+    """
+
+    def key(path):
+        return (-path[0].departs, path[-1].arrives, len(path))
+
+    paths = sorted(set(paths), key=lambda path: (path[-1].arrives, -path[0].departs, len(path)))
+    kept = []
+    for path in paths:
+        departs, arrives, legs = key(path)
+        if not any(
+            -other[0].departs <= departs and other[-1].arrives <= arrives and len(other) <= legs for other in kept
+        ):
+            kept.append(path)
+
+    return kept
+
+
+def get_timetable(date):
+    """
+    The timetable of the day in this worker, reloaded when the index changed since it was
+    loaded. Only the last `TRIP_TIMETABLE_DAYS` days searched are kept.
+    """
+
+    version = get_version(TRIP_INDEX_VERSION_KEY)
+    with _timetables_lock:
+        timetable = _timetables.get(date)
+
+    if timetable is None or timetable.version != version:
+        start = time.perf_counter()
+        timetable = Timetable.load(date, version=version)
+        logger.info(
+            "loaded timetable of %s with %s legs in %.3fs" % (date, len(timetable), time.perf_counter() - start)
+        )
+
+    # The request thread and the round trip pool (see `trips.roundtrip`) share the timetables
+    with _timetables_lock:
+        _timetables[date] = timetable
+        _timetables.move_to_end(date)
+        while len(_timetables) > settings.TRIP_TIMETABLE_DAYS:
+            _timetables.popitem(last=False)
+
+    return timetable
+
+
+@dataclass
+class Connection:
+    """
+    A trip of one or more legs, changing buses between them.
+    """
+
+    legs: list
+
+    @property
+    def departs_at(self):
+        return self.legs[0].departs_at
+
+    @property
+    def arrives_at(self):
+        return self.legs[-1].arrives_at
+
+    @property
+    def price(self):
+        return sum(leg.price for leg in self.legs)
+
+    @property
+    def transfers(self):
+        return len(self.legs) - 1
+
+    @property
+    def duration_display(self):
+        minutes = (self.arrives_at - self.departs_at) // timedelta(minutes=1)
+        return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+def get_connection_paths(origin_stops, destination_stops, date):
+    """
+    The leg ids of each trip, cached until the index changes. A search that ran over the
+    budget missed the earliest buses, it is only cached for a few seconds.
+    """
+
+    version = get_version(TRIP_INDEX_VERSION_KEY)
+    stops = f"{sorted(origin_stops)}:{sorted(destination_stops)}"
+    key = f"trips:connections:{version}:{date}:{hashlib.md5(stops.encode()).hexdigest()}"
+
+    paths = cache.get(key)
+    if paths is None:
+        hops, complete = get_timetable(date).search(origin_stops, destination_stops)
+        paths = [[hop.leg_id for hop in path] for path in hops]
+        timeout = (
+            settings.TRIP_CONNECTIONS_CACHE_TIMEOUT if complete else settings.TRIP_CONNECTIONS_PARTIAL_CACHE_TIMEOUT
+        )
+        cache.set(key, paths, timeout=timeout)
+
+    return paths
+
+
+def search_connections(origin, destination, date):
+    """
+    Return the trips with transfers from the origin place to the destination place leaving
+    on the date that no direct trip or other connection beats, earliest arrival first.
+    """
+
+    if not origin["stops"] or not destination["stops"]:
+        return []
+
+    paths = [path for path in get_connection_paths(origin["stops"], destination["stops"], date) if len(path) > 1]
+    if not paths:
+        return []
+
+    legs = DepartureLeg.objects.filter(pk__in={leg_id for path in paths for leg_id in path})
+    legs = legs.select_related("operator", "origin", "destination").in_bulk()
+    connections = [
+        Connection([legs[leg_id] for leg_id in path]) for path in paths if all(leg_id in legs for leg_id in path)
+    ]
+
+    if date == timezone.localdate():
+        # The paths are cached for the whole day, leave out the buses that already left
+        now = timezone.now()
+        connections = [connection for connection in connections if connection.departs_at > now]
+
+    return connections
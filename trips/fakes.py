@@ -0,0 +1,80 @@
+"""
+A fake operator inventory system on a local port, for the tests and local development of
+the operator adapters (see `trips.operators`).
+
+    with FakeOperatorServer(trips=[...], delay=2) as server:
+        settings.TRIP_OPERATOR_ADAPTERS = {
+            "nsa": {"BACKEND": "trips.operators.HttpOperatorAdapter", "OPTIONS": {"url": server.url}},
+        }
+
+It answers every request like `HttpOperatorAdapter` expects, after `delay` seconds and with
+`status`, and keeps the query of each request in `requests`.
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeOperatorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        fake = self.server.fake
+        fake.requests.append(dict(parse_qsl(urlsplit(self.path).query)))
+
+        time.sleep(fake.delay)
+
+        body = json.dumps({"trips": fake.trips} if fake.status == 200 else {"error": "unavailable"}).encode()
+        try:
+            self.send_response(fake.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the adapter gave up waiting
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class FakeOperatorServer:
+    def __init__(self, trips=(), delay=0, status=200):
+        self.trips = list(trips)
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/availability/"
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOperatorHandler)
+        self.server.daemon_threads = True
+        self.server.block_on_close = False  # don't wait for the slow answers on stop
+        self.server.fake = self
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-operator", daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,147 @@
+"""
+The fare calendar: the cheapest trip between two places on each day, for the date picker of
+the search form and the route pages.
+
+The minimum price of the legs on sale (see `trips.index`) between each pair of stops on each
+of the next `FARE_CALENDAR_DAYS` days is precomputed into a `FareCalendar` row, four bytes a
+day, so a month of a route between two cities is a handful of rows read in one query.
+
+The index updates the calendars of only the pairs of stops whose legs it rebuilt or
+repriced, with one grouped query over their legs. `build_fare_calendar` rebuilds all of
+them, run daily it moves the window of days forward.
+"""
+
+import calendar
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from trips.models import DepartureLeg, FareCalendar
+
+
+logger = logging.getLogger(__name__)
+
+PRICE_WIDTH = 4  # bytes a day, fares up to 4.294.967.295
+
+
+def encode_prices(prices):
+    return b"".join((price or 0).to_bytes(PRICE_WIDTH, "little") for price in prices)
+
+
+def decode_prices(data):
+    data = bytes(data or b"")
+    return [
+        int.from_bytes(data[start : start + PRICE_WIDTH], "little") or None
+        for start in range(0, len(data), PRICE_WIDTH)
+    ]
+
+
+def update_fare_calendar(pairs=None):
+    """
+    Recompute the calendars of the pairs of (origin, destination) stop ids from the legs on
+    sale, all of them by default, returning how many calendars were written.
+    """
+
+    if pairs is not None:
+        pairs = set(pairs)
+        if not pairs:
+            return 0
+
+    start = timezone.localdate()
+    days = settings.FARE_CALENDAR_DAYS
+
+    legs = DepartureLeg.objects.filter(date__gte=start, date__lt=start + timedelta(days=days))
+    calendars = FareCalendar.objects.all()
+    if pairs is not None:
+        stops = {"origin_id__in": {origin for origin, _ in pairs}, "destination_id__in": {dest for _, dest in pairs}}
+        legs = legs.filter(**stops)
+        calendars = calendars.filter(**stops)
+
+    prices = defaultdict(lambda: [None] * days)
+    cheapest = legs.order_by().values_list("origin_id", "destination_id", "date").annotate(price=Min("price"))
+    for origin, destination, date, price in cheapest:
+        if pairs is None or (origin, destination) in pairs:
+            prices[(origin, destination)][(date - start).days] = int(price)
+
+    with transaction.atomic():
+        # Pairs with nothing on sale anymore
+        stale = [
+            pk
+            for pk, origin, destination in calendars.values_list("pk", "origin_id", "destination_id")
+            if (pairs is None or (origin, destination) in pairs) and (origin, destination) not in prices
+        ]
+        FareCalendar.objects.filter(pk__in=stale).delete()
+
+        FareCalendar.objects.bulk_create(
+            [
+                FareCalendar(origin_id=origin, destination_id=destination, start=start, prices=encode_prices(by_day))
+                for (origin, destination), by_day in prices.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["origin", "destination"],
+            update_fields=["start", "prices", "updated_at"],
+        )
+
+    return len(prices)
+
+
+def get_fare_calendar(origin_stops, destination_stops, start, end):
+    """
+    The cheapest price between any of the origin stops and any of the destination stops on
+    each day from `start` until `end` (excluded), `None` for days without trips.
+    """
+
+    days = (end - start).days
+    prices = [None] * max(days, 0)
+    if not days or not origin_stops or not destination_stops:
+        return prices
+
+    calendars = FareCalendar.objects.filter(origin_id__in=origin_stops, destination_id__in=destination_stops)
+    for calendar_start, data in calendars.values_list("start", "prices"):
+        offset = (calendar_start - start).days
+        for day, price in enumerate(decode_prices(data)):
+            if price is not None and 0 <= day + offset < days:
+                prices[day + offset] = price if prices[day + offset] is None else min(prices[day + offset], price)
+
+    return prices
+
+
+def get_month_grid(origin, destination, year, month):
+    """
+    The month as weeks from Monday to Sunday for the places from `trips.search.resolve_place`,
+    each day with its cheapest price and whether it's the cheapest of the month. Days of
+    the adjacent months are `None`.
+    """
+
+    weeks = calendar.Calendar().monthdatescalendar(year, month)
+    start, end = weeks[0][0], weeks[-1][-1] + timedelta(days=1)
+    prices = get_fare_calendar(origin["stops"], destination["stops"], start, end)
+
+    in_month = [price for day, price in enumerate(prices) if (start + timedelta(days=day)).month == month]
+    lowest = min((price for price in in_month if price is not None), default=None)
+
+    return {
+        "origin": {"id": origin["id"], "name": origin["name"]},
+        "destination": {"id": destination["id"], "name": destination["name"]},
+        "month": f"{year}-{month:02d}",
+        "min_price": lowest,
+        "weeks": [
+            [
+                None
+                if date.month != month
+                else {
+                    "date": date.isoformat(),
+                    "price": prices[(date - start).days],
+                    "cheapest": lowest is not None and prices[(date - start).days] == lowest,
+                }
+                for date in week
+            ]
+            for week in weeks
+        ],
+    }
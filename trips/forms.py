@@ -0,0 +1,80 @@
+import logging
+
+from django import forms
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from trips.search import resolve_place
+
+
+logger = logging.getLogger(__name__)
+
+DATE_INPUT_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d/%m/%y"]
+
+
+class TripSearchForm(forms.Form):
+    """
+    The trip search of `includes/search_form.html`. Origin and destination are the page ids
+    the autocomplete fills in, falling back to the names typed in when it couldn't. A return
+    date makes it a round trip.
+    """
+
+    trip_type = forms.ChoiceField(
+        choices=[("one_way", _("Solo Ida")), ("round_trip", _("Ida y Vuelta"))],
+        required=False,
+    )
+    num_of_passengers = forms.IntegerField(min_value=1, max_value=5, required=False)
+    origin = forms.CharField(max_length=100, required=False)
+    origin_name = forms.CharField(max_length=100, required=False)
+    destination = forms.CharField(max_length=100, required=False)
+    destination_name = forms.CharField(max_length=100, required=False)
+    departure = forms.DateField(input_formats=DATE_INPUT_FORMATS)
+    return_date = forms.DateField(input_formats=DATE_INPUT_FORMATS, required=False)
+
+    def clean_departure(self):
+        departure = self.cleaned_data["departure"]
+        if departure < timezone.localdate():
+            raise forms.ValidationError(_("La fecha de salida ya pasó"), code="past_date")
+
+        return departure
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        for name in ("origin", "destination"):
+            value = cleaned_data.get(name) or cleaned_data.get(f"{name}_name")
+            place = resolve_place(value) if value else None
+            if place is None:
+                self.add_error(name, forms.ValidationError(_("No encontramos ese lugar"), code="unknown_place"))
+            else:
+                cleaned_data[name] = place
+
+        origin, destination = cleaned_data.get("origin"), cleaned_data.get("destination")
+        departure, return_date = cleaned_data.get("departure"), cleaned_data.get("return_date")
+
+        if origin and destination and origin["id"] == destination["id"]:
+            self.add_error("destination", forms.ValidationError(_("Elegí un destino distinto al origen")))
+
+        if departure and return_date and return_date < departure:
+            self.add_error("return_date", forms.ValidationError(_("La vuelta es antes de la ida")))
+
+        if cleaned_data.get("trip_type") == "round_trip" and not return_date and "return_date" not in self.errors:
+            self.add_error("return_date", forms.ValidationError(_("Elegí la fecha de vuelta")))
+
+        return cleaned_data
+
+    def get_session_data(self):
+        """
+        The query as the search form shows it again, see `request.session.q`.
+        """
+
+        cd = self.cleaned_data
+
+        return {
+            "origin": cd["origin"]["name"],
+            "destination": cd["destination"]["name"],
+            "departure": self.data.get("departure", ""),
+            "return": self.data.get("return_date", ""),
+            "num_of_passengers": str(cd["num_of_passengers"] or 1),
+            "trip_type": "round_trip" if cd["return_date"] else "one_way",
+        }
@@ -0,0 +1,217 @@
+"""
+The origin - destination index of the departures on sale.
+
+A departure of a route with `n` stops sells `n * (n - 1) / 2` trips, one per pair of stops
+in the order the bus goes through them. Each of them is precomputed into a `DepartureLeg`
+with the times at both stops and the fare valid on the day, so a search for a pair of stops
+on a date is one indexed query instead of walking routes, stops and fares on every request.
+
+The legs of a departure are rebuilt when it is saved, the legs of the upcoming departures of
+a route when the route (with its stops and fares) is saved or its operator is activated or
+deactivated, and only the prices of a pair of stops when one of its fares changes on its own.
+`build_trip_index` rebuilds all of them. The fare calendars of the pairs of stops rebuilt
+follow, see `trips.fares`.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from trips.fares import update_fare_calendar
+from trips.models import Departure, DepartureLeg, Route
+
+
+logger = logging.getLogger(__name__)
+
+TRIP_INDEX_VERSION_KEY = "trips:index:version"
+
+_deferred = threading.local()
+
+
+def bump_trip_index_version():
+    cache.set(TRIP_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_fare(fares, date):
+    """
+    The fare valid on the date, the one starting the latest when several overlap.
+    """
+
+    valid = [fare for fare in fares if fare.is_valid_on(date)]
+    if not valid:
+        return None
+
+    return max(valid, key=lambda fare: (fare.valid_from or date.min, fare.pk or 0))
+
+
+def get_departure_legs(departure, route_stops, fares, operator_id):
+    """
+    The unsaved legs of a departure. Pairs of stops without a fare are not on sale.
+    """
+
+    legs = []
+
+    for i, origin in enumerate(route_stops):
+        departs_at = departure.departs_at + timedelta(minutes=origin.departure)
+        date = timezone.localdate(departs_at)
+
+        for j, destination in enumerate(route_stops[i + 1 :], start=i + 1):
+            fare = get_fare(fares.get((origin.stop_id, destination.stop_id), ()), date)
+            if fare is None:
+                continue
+
+            legs.append(
+                DepartureLeg(
+                    departure=departure,
+                    operator_id=operator_id,
+                    origin_id=origin.stop_id,
+                    destination_id=destination.stop_id,
+                    origin_position=i,
+                    destination_position=j,
+                    date=date,
+                    departs_at=departs_at,
+                    arrives_at=departure.departs_at + timedelta(minutes=destination.arrival),
+                    price=fare.price,
+                )
+            )
+
+    return legs
+
+
+def get_fares_by_stops(route):
+    fares = defaultdict(list)
+    for fare in route.fares.all():
+        fares[(fare.origin_id, fare.destination_id)].append(fare)
+
+    return fares
+
+
+def index_departures(departures):
+    """
+    Rebuild the legs of the departures, returning the number of legs on sale.
+    """
+
+    departures = list(departures)
+    if not departures:
+        return 0
+
+    routes = Route.objects.filter(
+        pk__in={departure.route_id for departure in departures}, is_active=True, operator__is_active=True
+    )
+    routes = {route.pk: route for route in routes.prefetch_related("route_stops", "fares")}
+    fares = {route_id: get_fares_by_stops(route) for route_id, route in routes.items()}
+
+    legs = []
+    for departure in departures:
+        route = routes.get(departure.route_id)
+        if departure.is_cancelled or route is None:
+            continue
+        legs += get_departure_legs(departure, list(route.route_stops.all()), fares[route.pk], route.operator_id)
+
+    with transaction.atomic():
+        previous = DepartureLeg.objects.filter(departure__in=[departure.pk for departure in departures])
+        pairs = set(previous.order_by().values_list("origin_id", "destination_id").distinct())
+        previous.delete()
+        DepartureLeg.objects.bulk_create(legs, batch_size=500)
+
+    bump_trip_index_version()
+    update_fare_calendar(pairs | {(leg.origin_id, leg.destination_id) for leg in legs})
+
+    return len(legs)
+
+
+def get_upcoming_departures():
+    """
+    Departures that can still be on sale, including the ones that left the first stop of
+    their route up to a day ago and still have stops ahead.
+    """
+
+    return Departure.objects.filter(departs_at__gte=timezone.now() - timedelta(days=1))
+
+
+def index_route(route):
+    """
+    Rebuild the legs of the upcoming departures of the route.
+    """
+
+    return index_departures(get_upcoming_departures().filter(route=route))
+
+
+def index_operator(operator):
+    """
+    Rebuild the legs of the upcoming departures of the routes of the operator, after it was
+    activated or deactivated.
+    """
+
+    return index_departures(get_upcoming_departures().filter(route__operator=operator))
+
+
+@contextmanager
+def defer_fare_updates():
+    """
+    Don't reprice the legs for each fare saved within, ex: the fares saved along with their
+    route, which indexes all of its departures once they are in place.
+    """
+
+    _deferred.depth = getattr(_deferred, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _deferred.depth -= 1
+
+
+def are_fare_updates_deferred():
+    return getattr(_deferred, "depth", 0) > 0
+
+
+def update_fare_prices(route_id, origin_id, destination_id):
+    """
+    Reprice the upcoming legs of a route between two stops after one of their fares changed.
+    Legs that lost their fare leave the index and the ones that got one join it.
+    """
+
+    route = Route.objects.filter(pk=route_id, is_active=True, operator__is_active=True)
+    route = route.prefetch_related("route_stops").first()
+    if route is None:
+        return 0
+
+    route_stops = list(route.route_stops.all())
+    stop_ids = [route_stop.stop_id for route_stop in route_stops if route_stop.stop_id in (origin_id, destination_id)]
+    if stop_ids != [origin_id, destination_id]:
+        return 0  # the bus doesn't go from one to the other
+
+    fares = {(origin_id, destination_id): list(route.fares.filter(origin_id=origin_id, destination_id=destination_id))}
+    departures = get_upcoming_departures().filter(route=route, is_cancelled=False)
+    legs = DepartureLeg.objects.filter(departure__in=departures, origin_id=origin_id, destination_id=destination_id)
+    indexed = {leg.departure_id: leg for leg in legs}
+
+    changed, removed, added = [], [], []
+    for departure in departures:
+        new_legs = get_departure_legs(departure, route_stops, fares, route.operator_id)
+        leg = indexed.get(departure.pk)
+
+        if leg is None:
+            added += new_legs
+        elif not new_legs:
+            removed.append(leg.pk)
+        elif leg.price != new_legs[0].price:
+            leg.price = new_legs[0].price
+            changed.append(leg)
+
+    with transaction.atomic():
+        DepartureLeg.objects.filter(pk__in=removed).delete()
+        DepartureLeg.objects.bulk_update(changed, ["price"], batch_size=500)
+        DepartureLeg.objects.bulk_create(added, batch_size=500)
+
+    if changed or removed or added:
+        bump_trip_index_version()
+        update_fare_calendar([(origin_id, destination_id)])
+
+    return len(changed) + len(removed) + len(added)
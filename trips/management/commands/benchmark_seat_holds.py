@@ -0,0 +1,140 @@
+import logging
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.utils import timezone
+
+from trips.models import Departure, DepartureLeg, Fare, Operator, Route, RouteStop, SeatInventory, Stop
+from trips.seats import SeatUnavailable, confirm_hold, decode_segments, from_bitmap, get_taken_seats, hold_seats
+
+
+logger = logging.getLogger(__name__)
+
+
+def pick_seats(leg_id, count, attempts, seed):
+    """
+    A buyer picking `count` free seats of the leg and paying for them, picking again when
+    someone was faster. Run by the worker processes.
+    """
+
+    rng = random.Random(seed)
+    leg = DepartureLeg.objects.select_related("departure").get(pk=leg_id)
+    result = {"seats": [], "conflicts": 0, "locked": 0, "latencies": []}
+
+    try:
+        for _ in range(attempts):
+            free = sorted(set(range(1, leg.departure.seats + 1)) - set(get_taken_seats(leg)))
+            if len(free) < count:
+                break
+
+            start = time.perf_counter()
+            try:
+                hold = hold_seats(leg, rng.sample(free, count))
+                result["seats"] = confirm_hold(hold.token)
+            except SeatUnavailable:
+                result["conflicts"] += 1
+                continue
+            except OperationalError:
+                result["locked"] += 1  # gave up waiting for the write lock
+                continue
+            finally:
+                result["latencies"].append(time.perf_counter() - start)
+
+            break
+    finally:
+        close_old_connections()
+
+    return result
+
+
+class Command(BaseCommand):
+    """
+    Command that checks no seat is ever sold twice when many buyers pick seats of the same
+    bus at once. See `trips.seats`
+
+    It creates a throwaway departure, lets `--buyers` buyers spread over `--workers`
+    processes (each with its own database connection, like gunicorn workers) race for its
+    seats, checks every seat was sold at most once and matches the inventory, prints the
+    throughput and latencies and deletes the departure.
+    """
+
+    help = "Race concurrent buyers for the seats of a throwaway departure and check none is sold twice"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=300, help="Number of buyers racing for the seats")
+        parser.add_argument("--workers", type=int, default=min(16, (os.cpu_count() or 1) * 4), help="Processes")
+        parser.add_argument("--seats", type=int, default=44, help="Seats of the bus")
+        parser.add_argument("--seats-per-buyer", type=int, default=2, help="Seats picked by each buyer")
+        parser.add_argument("--attempts", type=int, default=5, help="Picks of a buyer before giving up")
+
+    def handle(self, *args, **kwargs):
+        leg = self.create_leg(kwargs["seats"])
+
+        try:
+            connections.close_all()
+
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=kwargs["workers"], initializer=django.setup) as executor:
+                futures = [
+                    executor.submit(pick_seats, leg.pk, kwargs["seats_per_buyer"], kwargs["attempts"], seed)
+                    for seed in range(kwargs["buyers"])
+                ]
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - start
+
+            self.report(leg, results, elapsed)
+        finally:
+            Operator.objects.filter(pk=leg.operator_id).delete()
+            Stop.objects.filter(pk__in=[leg.origin_id, leg.destination_id]).delete()
+
+        self.stdout.write("All Done.")
+
+    def create_leg(self, seats):
+        slug = f"benchmark-{time.time_ns()}"
+        operator = Operator.objects.create(name="Benchmark", slug=slug)
+        origin, destination = Stop.objects.create(name="Benchmark A"), Stop.objects.create(name="Benchmark B")
+
+        route = Route(operator=operator, name=slug)
+        route.route_stops = [RouteStop(stop=origin), RouteStop(stop=destination, arrival=60, departure=60)]
+        route.fares = [Fare(origin=origin, destination=destination, price=Decimal("1"))]
+        route.save()
+
+        departure = Departure.objects.create(route=route, departs_at=timezone.now() + timedelta(days=1), seats=seats)
+
+        return DepartureLeg.objects.get(departure=departure)
+
+    def report(self, leg, results, elapsed):
+        sold = Counter(seat for result in results for seat in result["seats"])
+        inventory = SeatInventory.objects.filter(departure_id=leg.departure_id).values_list("sold", flat=True).first()
+        segments = decode_segments(inventory)
+        in_inventory = from_bitmap(segments[0]) if segments else []
+
+        latencies = sorted(latency for result in results for latency in result["latencies"])
+        buyers = sum(1 for result in results if result["seats"])
+
+        self.stdout.write(f"{len(results)} buyers, {buyers} got seats, {len(sold)} seats sold in {elapsed:.2f}s")
+        self.stdout.write(
+            f"{sum(r['conflicts'] for r in results)} picks lost to a faster buyer, "
+            f"{sum(r['locked'] for r in results)} timed out on the write lock"
+        )
+        if latencies:
+            self.stdout.write(
+                f"{len(latencies) / elapsed:.0f} picks/s, "
+                f"hold + confirm p50 {statistics.median(latencies) * 1000:.1f}ms "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms"
+            )
+
+        oversold = [seat for seat, count in sold.items() if count > 1]
+        if oversold or sorted(sold) != in_inventory:
+            raise CommandError(f"Seats sold twice: {oversold}, inventory: {in_inventory}, buyers: {sorted(sold)}")
+
+        self.stdout.write(self.style.SUCCESS("No seat was sold twice."))
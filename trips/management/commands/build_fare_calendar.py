@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from trips.fares import update_fare_calendar
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that rebuilds the cheapest fare of each day between every pair of stops.
+    See `trips.fares`
+
+    The index keeps the calendars of the pairs of stops it changes up to date, this moves
+    the window of `FARE_CALENDAR_DAYS` days forward so it should run once a day.
+    """
+
+    help = "Rebuild the fare calendars of every pair of stops from the legs on sale"
+
+    def handle(self, *args, **kwargs):
+        calendars = update_fare_calendar()
+
+        self.stdout.write(f"Built {calendars} fare calendars.")
+        self.stdout.write("All Done.")
@@ -0,0 +1,27 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from trips.index import bump_trip_index_version
+from trips.transfers import build_footpaths
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that rebuilds the footpaths between nearby stops. See `trips.transfers`
+
+    The footpaths of a stop are rebuilt when it or its place changes, this is for stops
+    loaded in bulk or after changing the walking settings.
+    """
+
+    help = "Rebuild the footpaths between nearby stops"
+
+    def handle(self, *args, **kwargs):
+        footpaths = build_footpaths()
+        bump_trip_index_version()
+
+        self.stdout.write(f"Built {footpaths} footpaths.")
+        self.stdout.write("All Done.")
@@ -0,0 +1,36 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from trips.index import get_upcoming_departures, index_departures
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that rebuilds the origin - destination index of the upcoming departures.
+    See `trips.index`
+
+    Departures, routes and fares keep the index up to date when they are saved, this is for
+    departures loaded in bulk (ex: a timetable import) which skip the signals.
+    """
+
+    help = "Rebuild the legs on sale of the upcoming departures"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Number of departures per transaction")
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs["chunk_size"]
+        departure_ids = list(get_upcoming_departures().order_by("pk").values_list("pk", flat=True))
+        legs = 0
+
+        for start in range(0, len(departure_ids), chunk_size):
+            chunk = departure_ids[start : start + chunk_size]
+            legs += index_departures(get_upcoming_departures().filter(pk__in=chunk))
+            self.stdout.write(f"{start + len(chunk)}/{len(departure_ids)} departures")
+
+        self.stdout.write(f"Indexed {legs} legs.")
+        self.stdout.write("All Done.")
@@ -0,0 +1,28 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from trips.coalesce import get_trip_search_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command that prints how many trip searches were computed and how many were answered
+    from the cache or by waiting for an identical search. See `trips.coalesce`
+    """
+
+    help = "Print the computations saved by the trip search cache and single flight"
+
+    def handle(self, *args, **kwargs):
+        stats = get_trip_search_stats()
+        total = stats["computed"] + stats["saved"]
+
+        self.stdout.write(f"{total} searches, {stats['computed']} computed")
+        self.stdout.write(f"{stats['cached']} from the cache, {stats['coalesced']} waited for an identical search")
+        if total:
+            self.stdout.write(f"{stats['saved'] / total:.0%} of the computations saved")
+
+        self.stdout.write("All Done.")
@@ -0,0 +1,129 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:44
+
+import django.db.models.deletion
+import modelcluster.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('locations', '0007_citypage_stationpage_coordinates'),
+        ('partners', '0007_partnerindexpage_ld_schema_partnerpage_ld_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Operator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='name')),
+                ('slug', models.SlugField(unique=True, verbose_name='slug')),
+                ('is_active', models.BooleanField(default=True, verbose_name='active')),
+                ('partner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operators', to='partners.partnerpage')),
+            ],
+            options={
+                'verbose_name': 'Operator',
+                'verbose_name_plural': 'Operators',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='name')),
+                ('code', models.CharField(blank=True, max_length=20, verbose_name='code')),
+                ('is_active', models.BooleanField(default=True, verbose_name='active')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='trips.operator')),
+            ],
+            options={
+                'verbose_name': 'Route',
+                'verbose_name_plural': 'Routes',
+                'ordering': ['operator', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Departure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departs_at', models.DateTimeField(db_index=True, verbose_name='departs at')),
+                ('seats', models.PositiveSmallIntegerField(default=44, verbose_name='seats')),
+                ('is_cancelled', models.BooleanField(default=False, verbose_name='cancelled')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='trips.route')),
+            ],
+            options={
+                'verbose_name': 'Departure',
+                'verbose_name_plural': 'Departures',
+                'ordering': ['departs_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Stop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='name')),
+                ('city', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stops', to='locations.citypage')),
+                ('station', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stops', to='locations.stationpage')),
+            ],
+            options={
+                'verbose_name': 'Stop',
+                'verbose_name_plural': 'Stops',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RouteStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sort_order', models.IntegerField(blank=True, editable=False, null=True)),
+                ('arrival', models.PositiveIntegerField(default=0, help_text='Minutes after the first departure', verbose_name='arrival')),
+                ('departure', models.PositiveIntegerField(default=0, help_text='Minutes after the first departure', verbose_name='departure')),
+                ('route', modelcluster.fields.ParentalKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_stops', to='trips.route')),
+                ('stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_stops', to='trips.stop')),
+            ],
+            options={
+                'verbose_name': 'Route stop',
+                'verbose_name_plural': 'Route stops',
+                'ordering': ['sort_order'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Fare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=0, help_text='In guaraníes', max_digits=12, verbose_name='price')),
+                ('valid_from', models.DateField(blank=True, null=True, verbose_name='valid from')),
+                ('valid_until', models.DateField(blank=True, null=True, verbose_name='valid until')),
+                ('route', modelcluster.fields.ParentalKey(on_delete=django.db.models.deletion.CASCADE, related_name='fares', to='trips.route')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.stop')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.stop')),
+            ],
+            options={
+                'verbose_name': 'Fare',
+                'verbose_name_plural': 'Fares',
+            },
+        ),
+        migrations.CreateModel(
+            name='DepartureLeg',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('departs_at', models.DateTimeField()),
+                ('arrives_at', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('departure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legs', to='trips.departure')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.operator')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.stop')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.stop')),
+            ],
+            options={
+                'ordering': ['departs_at', 'price'],
+                'indexes': [models.Index(fields=['origin', 'destination', 'date', 'departs_at'], name='trips_leg_od_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('departure', 'origin', 'destination'), name='trips_leg_unique')],
+            },
+        ),
+    ]
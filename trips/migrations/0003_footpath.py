@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_departureleg_positions_seat_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Footpath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField()),
+                ('duration', models.PositiveSmallIntegerField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.stop')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='footpaths', to='trips.stop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination'), name='trips_footpath_unique')],
+            },
+        ),
+    ]
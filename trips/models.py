@@ -1 +1,315 @@
-# Create your models here.
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from wagtail.admin.panels import FieldPanel, FieldRowPanel, InlinePanel, MultiFieldPanel
+from wagtail.models import Orderable
+
+from modelcluster.fields import ParentalKey
+from modelcluster.models import ClusterableModel
+
+
+class Operator(models.Model):
+    """
+    A bus company selling seats on its routes, linked to its partner page when it has one.
+    """
+
+    name = models.CharField(_("name"), max_length=100)
+    slug = models.SlugField(_("slug"), unique=True)
+    partner = models.ForeignKey(
+        "partners.PartnerPage",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="operators",
+    )
+    is_active = models.BooleanField(_("active"), default=True)
+
+    panels = [
+        FieldPanel("name"),
+        FieldPanel("slug"),
+        FieldPanel("partner"),
+        FieldPanel("is_active"),
+    ]
+
+    class Meta:
+        verbose_name = "Operator"
+        verbose_name_plural = "Operators"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class Stop(models.Model):
+    """
+    A place where buses pick up or drop off passengers. Usually a terminal (station page)
+    of a city, otherwise a stop on the road of the city.
+    """
+
+    name = models.CharField(_("name"), max_length=100)
+    city = models.ForeignKey(
+        "locations.CityPage",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="stops",
+    )
+    station = models.ForeignKey(
+        "locations.StationPage",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="stops",
+    )
+
+    panels = [
+        FieldPanel("name"),
+        FieldPanel("city"),
+        FieldPanel("station"),
+    ]
+
+    class Meta:
+        verbose_name = "Stop"
+        verbose_name_plural = "Stops"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class Footpath(models.Model):
+    """
+    A transfer between two nearby stops, ex: two terminals of the same city, precomputed by
+    `trips.transfers` with the minutes it takes including the time to board at the other end.
+    """
+
+    origin = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="footpaths")
+    destination = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    distance = models.FloatField()  # km
+    duration = models.PositiveSmallIntegerField()  # minutes
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["origin", "destination"], name="trips_footpath_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} - {self.destination} ({self.duration} min)"
+
+
+class Route(ClusterableModel):
+    """
+    The ordered stops a bus of an operator goes through, with the fares between them.
+    """
+
+    operator = models.ForeignKey(Operator, on_delete=models.CASCADE, related_name="routes")
+    name = models.CharField(_("name"), max_length=100)
+    code = models.CharField(_("code"), max_length=20, blank=True)
+    is_active = models.BooleanField(_("active"), default=True)
+
+    panels = [
+        FieldPanel("operator"),
+        FieldRowPanel([FieldPanel("name"), FieldPanel("code")]),
+        FieldPanel("is_active"),
+        InlinePanel("route_stops", heading="Stops", label="Stop", min_num=2),
+        InlinePanel("fares", heading="Fares", label="Fare"),
+    ]
+
+    class Meta:
+        verbose_name = "Route"
+        verbose_name_plural = "Routes"
+        ordering = ["operator", "name"]
+
+    def __str__(self):
+        return f"{self.operator} - {self.name}"
+
+    def save(self, *args, **kwargs):
+        """
+        The stops and fares edited inline are saved with the route, so its departures are
+        indexed once all of them are in place.
+        """
+
+        from trips.index import defer_fare_updates, index_route
+
+        with defer_fare_updates():
+            super().save(*args, **kwargs)
+
+        index_route(self)
+
+
+class RouteStop(Orderable):
+    """
+    A stop of a route, with the minutes after the departure from the first stop the bus
+    arrives and leaves.
+    """
+
+    route = ParentalKey(Route, on_delete=models.CASCADE, related_name="route_stops")
+    stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="route_stops")
+    arrival = models.PositiveIntegerField(_("arrival"), default=0, help_text="Minutes after the first departure")
+    departure = models.PositiveIntegerField(_("departure"), default=0, help_text="Minutes after the first departure")
+
+    panels = [
+        FieldPanel("stop"),
+        FieldRowPanel([FieldPanel("arrival"), FieldPanel("departure")]),
+    ]
+
+    class Meta(Orderable.Meta):
+        verbose_name = "Route stop"
+        verbose_name_plural = "Route stops"
+
+    def __str__(self):
+        return f"{self.route} - {self.stop}"
+
+
+class Fare(models.Model):
+    """
+    The price of a seat between two stops of a route, optionally for a period of time.
+    """
+
+    route = ParentalKey(Route, on_delete=models.CASCADE, related_name="fares")
+    origin = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    destination = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    price = models.DecimalField(_("price"), max_digits=12, decimal_places=0, help_text="In guaraníes")
+    valid_from = models.DateField(_("valid from"), null=True, blank=True)
+    valid_until = models.DateField(_("valid until"), null=True, blank=True)
+
+    panels = [
+        FieldRowPanel([FieldPanel("origin"), FieldPanel("destination")]),
+        FieldPanel("price"),
+        MultiFieldPanel([FieldRowPanel([FieldPanel("valid_from"), FieldPanel("valid_until")])], heading="Validity"),
+    ]
+
+    class Meta:
+        verbose_name = "Fare"
+        verbose_name_plural = "Fares"
+
+    def __str__(self):
+        return f"{self.origin} - {self.destination}: {self.price}"
+
+    def is_valid_on(self, date):
+        return (self.valid_from is None or self.valid_from <= date) and (
+            self.valid_until is None or self.valid_until >= date
+        )
+
+
+class Departure(models.Model):
+    """
+    A bus leaving the first stop of a route at a given time.
+    """
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="departures")
+    departs_at = models.DateTimeField(_("departs at"), db_index=True)
+    seats = models.PositiveSmallIntegerField(_("seats"), default=44)
+    is_cancelled = models.BooleanField(_("cancelled"), default=False)
+
+    panels = [
+        FieldPanel("route"),
+        FieldPanel("departs_at"),
+        FieldPanel("seats"),
+        FieldPanel("is_cancelled"),
+    ]
+
+    class Meta:
+        verbose_name = "Departure"
+        verbose_name_plural = "Departures"
+        ordering = ["departs_at"]
+
+    def __str__(self):
+        return f"{self.route} {timezone.localtime(self.departs_at):%Y-%m-%d %H:%M}"
+
+
+class DepartureLeg(models.Model):
+    """
+    A trip on sale between two stops of a departure: a row of the origin - destination
+    index searched by `trips.search`, kept up to date by `trips.index`.
+    """
+
+    departure = models.ForeignKey(Departure, on_delete=models.CASCADE, related_name="legs")
+    operator = models.ForeignKey(Operator, on_delete=models.CASCADE, related_name="+")
+    origin = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    destination = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    origin_position = models.PositiveSmallIntegerField(default=0)  # of the stops in the route
+    destination_position = models.PositiveSmallIntegerField(default=1)
+    date = models.DateField()  # local date of departure from the origin
+    departs_at = models.DateTimeField()
+    arrives_at = models.DateTimeField()
+    price = models.DecimalField(max_digits=12, decimal_places=0)
+
+    class Meta:
+        ordering = ["departs_at", "price"]
+        indexes = [models.Index(fields=["origin", "destination", "date", "departs_at"], name="trips_leg_od_date_idx")]
+        constraints = [
+            models.UniqueConstraint(fields=["departure", "origin", "destination"], name="trips_leg_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} - {self.destination} {timezone.localtime(self.departs_at):%Y-%m-%d %H:%M}"
+
+    @property
+    def duration(self):
+        return self.arrives_at - self.departs_at
+
+    @property
+    def duration_display(self):
+        minutes = self.duration // timedelta(minutes=1)
+        return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+class FareCalendar(models.Model):
+    """
+    The cheapest leg on sale between two stops on each day from `start`, four bytes per day
+    and zero for days without one. Kept up to date from the index by `trips.fares`.
+    """
+
+    origin = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    destination = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name="+")
+    start = models.DateField()
+    prices = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["origin", "destination"], name="trips_fare_calendar_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} - {self.destination} from {self.start}"
+
+
+class SeatInventory(models.Model):
+    """
+    The seats sold on a departure, a bitmap per segment of its route (between a stop and the
+    next one) so a seat sold from the first stop to a stop halfway is on sale again from there.
+    See `trips.seats`
+    """
+
+    departure = models.OneToOneField(Departure, on_delete=models.CASCADE, primary_key=True, related_name="inventory")
+    sold = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.departure} inventory"
+
+
+class SeatHold(models.Model):
+    """
+    Seats kept for a buyer between two stops of a departure until `expires_at`, so nobody
+    else can pick them while the order is paid. See `trips.seats`
+    """
+
+    departure = models.ForeignKey(Departure, on_delete=models.CASCADE, related_name="holds")
+    token = models.CharField(max_length=32, unique=True)
+    seats = models.BinaryField()  # bitmap of the seat numbers held
+    origin_position = models.PositiveSmallIntegerField()
+    destination_position = models.PositiveSmallIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["departure", "expires_at"], name="trips_hold_departure_idx")]
+
+    def __str__(self):
+        return self.token
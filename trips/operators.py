@@ -0,0 +1,369 @@
+"""
+Availability of the operators selling through their own inventory systems.
+
+Operators with an adapter in `TRIP_OPERATOR_ADAPTERS` are asked for their trips on every
+search, all at once on an asyncio loop:
+
+    TRIP_OPERATOR_ADAPTERS = {
+        "nsa": {
+            "BACKEND": "trips.operators.HttpOperatorAdapter",
+            "OPTIONS": {"url": "https://api.nsa.com.py/availability/", "timeout": 2},
+        },
+    }
+
+Each operator has `timeout` seconds (`TRIP_OPERATOR_TIMEOUT` by default) and all of them
+together `TRIP_OPERATORS_DEADLINE` seconds, well under the gunicorn timeout. The search shows
+the trips of the operators that answered in time and tells the buyer some didn't (partial
+results) instead of failing or waiting.
+
+An operator failing `TRIP_OPERATOR_FAILURE_THRESHOLD` times in a row is not asked again for
+`TRIP_OPERATOR_RESET_TIMEOUT` seconds (its circuit is open), then a single search tries it
+and closes the circuit again if it answers. Circuits are kept per worker.
+
+Adapters subclass `OperatorAdapter`. `trips.fakes` has a local operator server for tests.
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from asgiref.sync import async_to_sync
+
+from trips.models import Operator
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RESPONSE_SIZE = 2 * 1024 * 1024  # bytes
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class OperatorError(Exception):
+    pass
+
+
+@dataclass
+class OperatorTrip:
+    """
+    A trip on sale in the inventory system of an operator.
+    """
+
+    operator: Operator
+    departs_at: object
+    arrives_at: object
+    price: Decimal
+    seats: int | None = None
+
+    @property
+    def duration_display(self):
+        minutes = int((self.arrives_at - self.departs_at).total_seconds() // 60)
+        return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+@dataclass
+class Availability:
+    """
+    The trips of the operators that answered, earliest first, and why the rest didn't.
+    """
+
+    trips: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)  # operator slug -> reason
+
+    @property
+    def partial(self):
+        return bool(self.failed)
+
+
+class CircuitBreaker:
+    """
+    Stops asking an operator after `threshold` failures in a row, lets one request through
+    `reset_timeout` seconds later and asks it again as usual once that one succeeds.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trying = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.trying else "open"
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if not self.trying and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trying = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trying = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trying = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def get_breaker(slug):
+    with _breakers_lock:
+        if slug not in _breakers:
+            _breakers[slug] = CircuitBreaker(
+                settings.TRIP_OPERATOR_FAILURE_THRESHOLD, settings.TRIP_OPERATOR_RESET_TIMEOUT
+            )
+        return _breakers[slug]
+
+
+class OperatorAdapter:
+    """
+    Asks the inventory system of an operator for its trips. Subclasses implement `search`.
+    """
+
+    def __init__(self, operator, timeout=None):
+        self.operator = operator
+        self.timeout = timeout or settings.TRIP_OPERATOR_TIMEOUT
+
+    async def search(self, origin, destination, date):
+        """
+        The `OperatorTrip`s between the places (as resolved by `trips.search.resolve_place`)
+        leaving on the date.
+        """
+
+        raise NotImplementedError
+
+
+async def get_json(url, params=None):
+    """
+    GET the url with the params added to its query string and return the decoded json body.
+    Plain asyncio streams so the request is cancelled with the task, HTTP/1.0 so the body is
+    never chunked and ends with the connection.
+    """
+
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    query = urlencode(parse_qsl(parts.query) + list((params or {}).items()))
+
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or (443 if secure else 80), ssl=ssl.create_default_context() if secure else None
+    )
+    try:
+        request = (
+            f"GET {parts.path or '/'}?{query} HTTP/1.0\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Accept: application/json\r\n"
+            "User-Agent: Ventanita\r\n\r\n"
+        )
+        writer.write(request.encode())
+        await writer.drain()
+
+        response = b""
+        while chunk := await reader.read(64 * 1024):
+            response += chunk
+            if len(response) > MAX_RESPONSE_SIZE:
+                raise OperatorError(f"response of {url} over {MAX_RESPONSE_SIZE} bytes")
+    finally:
+        writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    try:
+        status = int(head.split(b" ", 2)[1])
+    except (IndexError, ValueError):
+        raise OperatorError(f"invalid response from {url}")
+
+    if status != 200:
+        raise OperatorError(f"{url} answered {status}")
+
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise OperatorError(f"invalid json from {url}")
+
+
+class HttpOperatorAdapter(OperatorAdapter):
+    """
+    An inventory system answering `GET <url>?origin=<name>&destination=<name>&date=<YYYY-MM-DD>`
+    with `{"trips": [{"departs_at": <iso>, "arrives_at": <iso>, "price": <int>, "seats": <int>}]}`.
+    """
+
+    def __init__(self, operator, url, timeout=None):
+        super().__init__(operator, timeout=timeout)
+        self.url = url
+
+    async def search(self, origin, destination, date):
+        params = {"origin": origin["name"], "destination": destination["name"], "date": date.isoformat()}
+        data = await get_json(self.url, params)
+
+        try:
+            return [self.get_trip(trip) for trip in data["trips"]]
+        except (KeyError, TypeError, ValueError, ArithmeticError) as error:
+            raise OperatorError(f"invalid trips from {self.url}: {error!r}")
+
+    def get_trip(self, trip):
+        departs_at, arrives_at = parse_datetime(trip["departs_at"]), parse_datetime(trip["arrives_at"])
+        if departs_at is None or arrives_at is None:
+            raise ValueError("departs_at and arrives_at must be iso datetimes")
+
+        return OperatorTrip(
+            operator=self.operator,
+            departs_at=departs_at if timezone.is_aware(departs_at) else timezone.make_aware(departs_at),
+            arrives_at=arrives_at if timezone.is_aware(arrives_at) else timezone.make_aware(arrives_at),
+            price=Decimal(str(trip["price"])),
+            seats=trip.get("seats"),
+        )
+
+
+def get_adapters():
+    """
+    The adapters of the active operators with one in `TRIP_OPERATOR_ADAPTERS`.
+    """
+
+    config = settings.TRIP_OPERATOR_ADAPTERS
+    if not config:
+        return []
+
+    return [
+        import_string(config[operator.slug]["BACKEND"])(operator, **config[operator.slug].get("OPTIONS", {}))
+        for operator in Operator.objects.filter(slug__in=config, is_active=True)
+    ]
+
+
+def get_answer(task, slug, breaker):
+    """
+    The operator slug, its trips and why it failed (None when it answered) of a finished or
+    cancelled search, recorded in the circuit of the operator.
+    """
+
+    if task.cancelled() or isinstance(task.exception(), TimeoutError):
+        logger.warning("operator %s timed out" % slug)
+        breaker.record_failure()
+        return slug, [], "timeout"
+
+    if error := task.exception():
+        logger.warning("operator %s failed: %r" % (slug, error))
+        breaker.record_failure()
+        return slug, [], "error"
+
+    breaker.record_success()
+    return slug, sorted(task.result(), key=lambda trip: (trip.departs_at, trip.price)), None
+
+
+async def iter_answers(adapters, origin, destination, date, deadline=None):
+    """
+    Ask all the adapters at once, yielding the answer of each one (see `get_answer`) as it
+    arrives and the failure of the ones still pending at the deadline.
+    """
+
+    tasks = {}
+    for adapter in adapters:
+        slug = adapter.operator.slug
+        breaker = get_breaker(slug)
+        if not breaker.allow():
+            yield slug, [], "circuit open"
+            continue
+
+        search = asyncio.wait_for(adapter.search(origin, destination, date), adapter.timeout)
+        tasks[asyncio.ensure_future(search)] = (slug, breaker)
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + (deadline or settings.TRIP_OPERATORS_DEADLINE)
+    pending = set(tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(end - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+
+            for task in done:
+                yield get_answer(task, *tasks[task])
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for task in pending:
+        yield get_answer(task, *tasks[task])
+
+
+async def gather_availability(adapters, origin, destination, date, deadline=None):
+    """
+    All the trips the adapters answered within their timeouts and the deadline.
+    """
+
+    availability = Availability()
+
+    async for slug, trips, failure in iter_answers(adapters, origin, destination, date, deadline=deadline):
+        if failure:
+            availability.failed[slug] = failure
+        availability.trips += trips
+
+    availability.trips.sort(key=lambda trip: (trip.departs_at, trip.price))
+
+    return availability
+
+
+def search_operators(origin, destination, date):
+    """
+    The trips on sale in the inventory systems of the operators between the places on the
+    date, see `gather_availability`.
+    """
+
+    adapters = get_adapters()
+    if not adapters:
+        return Availability()
+
+    return async_to_sync(gather_availability)(adapters, origin, destination, date)
+
+
+def stream_operators(origin, destination, date):
+    """
+    The answers of the operators as they arrive (see `get_answer`) for streaming responses.
+    The loop only runs while the next answer is awaited, so the caller can send each one
+    before asking for the next.
+    """
+
+    adapters = get_adapters()
+    if not adapters:
+        return
+
+    loop = asyncio.new_event_loop()
+    answers = iter_answers(adapters, origin, destination, date)
+
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(answers))
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(answers.aclose())
+        loop.close()
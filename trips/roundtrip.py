@@ -0,0 +1,151 @@
+"""
+Round trip search: the trips there and back, and the cheapest ways to combine them.
+
+Both directions are searched at once, the outbound one in the request thread and the return
+one in a pool of `TRIP_SEARCH_THREADS` threads shared by the requests of the worker, so a
+round trip takes about as long as a one way search. The pool is bounded so a peak of round
+trips queues instead of opening a thread and a database connection per search.
+
+Each direction goes through `trips.search.get_search_results`, so it shares the cache (and
+the single flight) with the one way searches of the same places and date.
+
+Every outbound trip (direct or with transfers) is paired with the cheapest return leaving
+after it arrives: the returns are sorted by departure with the cheapest of the ones leaving
+from each position on, so pairing is a binary search per outbound trip instead of trying
+every combination. The pairs are ranked by total fare, then by time on the bus.
+
+The operators selling through their own systems (see `trips.operators`) are only asked for
+the way there, as on a one way search, and their trips are not paired: they are booked on
+the systems of the operators, not here.
+"""
+
+import bisect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.translation import gettext_lazy as _
+
+from trips.connections import Connection
+from trips.search import get_search_results
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    The thread pool of this worker. Created on first use since gunicorn forks its workers
+    after importing the app and threads do not survive a fork.
+    """
+
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=settings.TRIP_SEARCH_THREADS, thread_name_prefix="trip-search")
+            _executor_pid = os.getpid()
+
+        return _executor
+
+
+def run_in_pool(function, *args):
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+def get_duration(option):
+    return option.arrives_at - option.departs_at
+
+
+@dataclass
+class RoundTrip:
+    """
+    A trip there and one back, each direct or with transfers.
+    """
+
+    outbound: Connection
+    inbound: Connection
+
+    @property
+    def price(self):
+        return self.outbound.price + self.inbound.price
+
+    @property
+    def duration(self):
+        return get_duration(self.outbound) + get_duration(self.inbound)
+
+    @property
+    def directions(self):
+        return [(_("Ida"), self.outbound), (_("Vuelta"), self.inbound)]
+
+
+def get_options(results):
+    """
+    The direct trips and the ones with transfers of a direction, all as connections.
+    """
+
+    return [Connection([leg]) for leg in results["results"]] + list(results["connections"])
+
+
+def rank_round_trips(outbound, inbound, limit=None):
+    """
+    Pair each outbound trip with the cheapest return leaving after it arrives, cheapest
+    pair first.
+    """
+
+    def key(option):
+        return (option.price, get_duration(option))
+
+    inbound = sorted(inbound, key=lambda option: option.departs_at)
+    departures = [option.departs_at for option in inbound]
+
+    cheapest_from = [None] * len(inbound)  # the cheapest return leaving at each position or later
+    for position in reversed(range(len(inbound))):
+        following = cheapest_from[position + 1] if position + 1 < len(inbound) else None
+        if following is not None and key(following) < key(inbound[position]):
+            cheapest_from[position] = following
+        else:
+            cheapest_from[position] = inbound[position]
+
+    round_trips = []
+    for option in outbound:
+        position = bisect.bisect_left(departures, option.arrives_at)
+        if position < len(inbound):
+            round_trips.append(RoundTrip(option, cheapest_from[position]))
+
+    round_trips.sort(key=lambda trip: (trip.price, trip.duration, trip.outbound.departs_at))
+
+    return round_trips[: limit or settings.TRIP_ROUND_TRIP_RESULTS]
+
+
+def search_round_trip(origin, destination, departure, return_date):
+    """
+    The trips from the origin on the departure date and back on the return date, plus the
+    best combinations of the two.
+    """
+
+    if settings.TRIP_SEARCH_THREADS:
+        returns = get_executor().submit(run_in_pool, get_search_results, destination, origin, return_date)
+        outbound = get_search_results(origin, destination, departure)
+        inbound = returns.result()
+    else:
+        outbound = get_search_results(origin, destination, departure)
+        inbound = get_search_results(destination, origin, return_date)
+
+    return {
+        **outbound,
+        "return_results": inbound["results"],
+        "return_connections": inbound["connections"],
+        "round_trips": rank_round_trips(get_options(outbound), get_options(inbound)),
+    }
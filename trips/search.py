@@ -0,0 +1,149 @@
+"""
+Trip search: the trips on sale between two places on a date.
+
+A place is a city or a station page, in any of its translations, as picked in the search form
+by the autocomplete (see `locations.autocomplete`). Each worker keeps in memory the stops of
+every place, the ones of a station and all the stops in a city, so resolving the origin and
+destination is a couple of dict lookups. The trips are then read from the precomputed origin
+- destination index (see `trips.index`) with one query on its `(origin, destination, date)`
+index, whatever the number of routes, stops and fares behind them.
+"""
+
+import logging
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import get_language
+
+from wagtail.models import Page
+
+from base.cache import get_version
+from locations.autocomplete import get_autocomplete_index
+from trips.coalesce import TRIP_SEARCH_PREFIX, single_flight
+from trips.connections import search_connections
+from trips.index import TRIP_INDEX_VERSION_KEY
+from trips.models import DepartureLeg, Stop
+
+
+logger = logging.getLogger(__name__)
+
+TRIP_PLACES_VERSION_KEY = "trips:places:version"
+
+_places = None
+
+
+class PlaceStops:
+    """
+    The stops of every city and station page, by page id of any of their translations.
+    """
+
+    def __init__(self, pages, stops, version=None):
+        self.version = version
+        self.pages = {}  # page id -> {"id", "name", "stops"}
+
+        stops_by_key = defaultdict(set)
+        for stop_id, city_key, station_key in stops:
+            for translation_key in (city_key, station_key):
+                if translation_key is not None:
+                    stops_by_key[translation_key].add(stop_id)
+
+        for page_id, title, translation_key in pages:
+            self.pages[page_id] = {"id": page_id, "name": title, "stops": sorted(stops_by_key[translation_key])}
+
+    @classmethod
+    def load(cls, version=None):
+        stops = list(Stop.objects.values_list("pk", "city__translation_key", "station__translation_key"))
+        translation_keys = {key for _, *keys in stops for key in keys if key is not None}
+        pages = Page.objects.filter(translation_key__in=translation_keys).values_list("pk", "title", "translation_key")
+
+        return cls(pages, stops, version=version)
+
+    def get(self, page_id):
+        return self.pages.get(page_id)
+
+
+def bump_trip_places_version():
+    cache.set(TRIP_PLACES_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_place_stops():
+    """
+    The stops of the places of this worker, reloaded when a stop or a place changed.
+    """
+
+    global _places
+
+    version = get_version(TRIP_PLACES_VERSION_KEY)
+
+    if _places is None or _places.version != version:
+        start = time.perf_counter()
+        _places = PlaceStops.load(version=version)
+        logger.info("loaded stops of %s places in %.3fs" % (len(_places.pages), time.perf_counter() - start))
+
+    return _places
+
+
+def resolve_place(value):
+    """
+    The place of a page id, or of the best autocomplete match of a name, as a dict with
+    its `id`, `name` and `stops`. None when there is no such place.
+    """
+
+    value = str(value).strip()
+
+    if value.isdigit():
+        place = get_place_stops().get(int(value))
+        if place is not None:
+            return place
+
+        # A place without stops yet, there just are no trips from or to it
+        page = Page.objects.live().filter(pk=value).values("pk", "title").first()
+        return {"id": page["pk"], "name": page["title"], "stops": []} if page else None
+
+    matches = get_autocomplete_index().complete(value, language_code=get_language(), limit=1)
+    if not matches:
+        return None
+
+    return get_place_stops().get(matches[0]["id"]) or {"id": matches[0]["id"], "name": matches[0]["name"], "stops": []}
+
+
+def search_trips(origin, destination, date):
+    """
+    Return the legs on sale from the stops of the origin place to the stops of the destination
+    place leaving on the date, earliest first.
+    """
+
+    if not origin["stops"] or not destination["stops"]:
+        return []
+
+    legs = DepartureLeg.objects.filter(
+        origin_id__in=origin["stops"],
+        destination_id__in=destination["stops"],
+        date=date,
+    ).select_related("operator", "origin", "destination")
+
+    if date == timezone.localdate():
+        legs = legs.filter(departs_at__gt=timezone.now())
+
+    return list(legs.order_by("departs_at", "price"))
+
+
+def get_search_results(origin, destination, date):
+    """
+    Our trips between the places on the date, direct and with transfers, cached and computed
+    once for identical searches at the same time (see `trips.coalesce`). One way and round
+    trip searches share them in both directions.
+    """
+
+    version = get_version(TRIP_INDEX_VERSION_KEY)
+    key = f"{TRIP_SEARCH_PREFIX}:{version}:{origin['id']}:{destination['id']}:{date}"
+
+    return single_flight(
+        key,
+        lambda: {
+            "results": search_trips(origin, destination, date),
+            "connections": search_connections(origin, destination, date),
+        },
+    )
@@ -0,0 +1,196 @@
+"""
+Seat inventory of the departures.
+
+The seats sold on a departure are kept in a single `SeatInventory` row as a bitmap per
+segment of its route, bit `n - 1` of a segment standing for seat `n`. A trip from the 2nd
+to the 4th stop takes a seat on segments 1 and 2 only, so the same seat is sold again
+from the 4th stop on. A 44 seat bus with 10 stops fits in 55 bytes.
+
+Picking seats holds them (`hold_seats`) for `SEAT_HOLD_TIMEOUT` seconds while the order is
+paid, the payment confirms the hold into the inventory (`confirm_hold`) and abandoned holds
+simply stop counting once they expire: nothing has to run to free them.
+
+Every operation checks and writes in one transaction. On SQLite our connections open their
+transactions with `BEGIN IMMEDIATE` (see `DATABASES`), which takes the database write lock
+up front, so two workers can never both see a seat free and both take it; the loser waits
+on `busy_timeout` and then sees the seat taken. On databases with row locks the inventory
+row of the departure is locked with `SELECT ... FOR UPDATE` to the same effect.
+`benchmark_seat_holds` checks it under contention.
+"""
+
+import logging
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from trips.models import SeatHold, SeatInventory
+
+
+logger = logging.getLogger(__name__)
+
+
+class SeatUnavailable(Exception):
+    def __init__(self, seats):
+        super().__init__("Seats %s are not available" % ", ".join(map(str, seats)))
+        self.seats = seats
+
+
+class HoldNotFound(Exception):
+    pass
+
+
+def to_bitmap(seats):
+    bitmap = 0
+    for seat in seats:
+        bitmap |= 1 << (seat - 1)
+
+    return bitmap
+
+
+def from_bitmap(bitmap):
+    return [position + 1 for position in range(bitmap.bit_length()) if bitmap >> position & 1]
+
+
+def encode_segments(segments):
+    """
+    A width byte followed by the bitmap of every segment in that many bytes.
+    """
+
+    width = max([1] + [-(-segment.bit_length() // 8) for segment in segments])
+    return bytes([width]) + b"".join(segment.to_bytes(width, "little") for segment in segments)
+
+
+def decode_segments(data):
+    data = bytes(data or b"")
+    if not data:
+        return []
+
+    width = data[0]
+    return [int.from_bytes(data[start : start + width], "little") for start in range(1, len(data), width)]
+
+
+def get_taken(departure_id, origin_position, destination_position, now=None):
+    """
+    Bitmap of the seats sold or held on any segment between the two stops.
+    """
+
+    now = now or timezone.now()
+    taken = 0
+
+    inventory = SeatInventory.objects.filter(departure_id=departure_id).values_list("sold", flat=True).first()
+    for segment in decode_segments(inventory)[origin_position:destination_position]:
+        taken |= segment
+
+    holds = SeatHold.objects.filter(
+        departure_id=departure_id,
+        expires_at__gt=now,
+        origin_position__lt=destination_position,
+        destination_position__gt=origin_position,
+    )
+    for seats in holds.values_list("seats", flat=True):
+        taken |= int.from_bytes(seats, "little")
+
+    return taken
+
+
+def get_taken_seats(leg):
+    """
+    The seat numbers nobody else can pick for the leg.
+    """
+
+    return from_bitmap(get_taken(leg.departure_id, leg.origin_position, leg.destination_position))
+
+
+def lock_inventory(departure_id):
+    """
+    The inventory row of the departure, locked until the end of the transaction.
+    """
+
+    SeatInventory.objects.get_or_create(departure_id=departure_id)
+    return SeatInventory.objects.select_for_update().get(departure_id=departure_id)
+
+
+def hold_seats(leg, seats, timeout=None, replaces=None):
+    """
+    Hold the seats of the leg for the buyer, raising `SeatUnavailable` with the ones taken
+    (or not in the bus) meanwhile.
+
+    `replaces` is the token of a hold of the buyer to give back in the same transaction, ex:
+    they went back to pick other seats. It is kept when the new seats can't be held and its
+    seats don't count as taken, so the buyer can keep some of them.
+    """
+
+    seats = sorted(set(seats))
+    invalid = [seat for seat in seats if not 1 <= seat <= leg.departure.seats]
+    if not seats or invalid:
+        raise SeatUnavailable(invalid)
+
+    requested = to_bitmap(seats)
+    now = timezone.now()
+
+    with transaction.atomic():
+        lock_inventory(leg.departure_id)
+
+        SeatHold.objects.filter(departure_id=leg.departure_id, expires_at__lte=now).delete()
+
+        if replaces:
+            # Rolled back along with the rest when the new seats are not available
+            SeatHold.objects.filter(token=replaces).delete()
+
+        conflict = requested & get_taken(leg.departure_id, leg.origin_position, leg.destination_position, now=now)
+        if conflict:
+            raise SeatUnavailable(from_bitmap(conflict))
+
+        return SeatHold.objects.create(
+            departure_id=leg.departure_id,
+            token=secrets.token_hex(16),
+            seats=requested.to_bytes(-(-requested.bit_length() // 8), "little"),
+            origin_position=leg.origin_position,
+            destination_position=leg.destination_position,
+            expires_at=now + timedelta(seconds=timeout or settings.SEAT_HOLD_TIMEOUT),
+        )
+
+
+def release_hold(token):
+    """
+    Give the seats of a hold back, ex: the buyer went back to pick others.
+    """
+
+    deleted, _ = SeatHold.objects.filter(token=token).delete()
+    return bool(deleted)
+
+
+def confirm_hold(token):
+    """
+    Sell the seats of a hold that has not expired, returning their numbers.
+    """
+
+    with transaction.atomic():
+        hold = SeatHold.objects.filter(token=token, expires_at__gt=timezone.now()).first()
+        if hold is None:
+            raise HoldNotFound(token)
+
+        inventory = lock_inventory(hold.departure_id)
+
+        # Confirmed by a concurrent request while waiting for the lock
+        if not SeatHold.objects.filter(pk=hold.pk).exists():
+            raise HoldNotFound(token)
+
+        seats = int.from_bytes(hold.seats, "little")
+
+        segments = decode_segments(inventory.sold)
+        segments += [0] * (hold.destination_position - len(segments))
+
+        for position in range(hold.origin_position, hold.destination_position):
+            if segments[position] & seats:
+                raise SeatUnavailable(from_bitmap(segments[position] & seats))
+            segments[position] |= seats
+
+        inventory.sold = encode_segments(segments)
+        inventory.save(update_fields=["sold", "updated_at"])
+        hold.delete()
+
+    return from_bitmap(seats)
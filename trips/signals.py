@@ -0,0 +1,92 @@
+import logging
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from wagtail.signals import page_published, page_unpublished
+
+from locations.autocomplete import PLACE_KINDS
+from trips.fares import update_fare_calendar
+from trips.index import (
+    are_fare_updates_deferred,
+    bump_trip_index_version,
+    index_departures,
+    index_operator,
+    update_fare_prices,
+)
+from trips.models import Departure, Fare, Operator, Stop
+from trips.search import bump_trip_places_version
+from trips.transfers import update_footpaths
+
+
+logger = logging.getLogger(__name__)
+
+
+def departure_changed_receiver(sender, instance, **kwargs):
+    index_departures([instance])
+
+
+def departure_deleted_receiver(sender, instance, **kwargs):
+    bump_trip_index_version()
+
+    # Its legs are gone, the pairs of stops it sold are the ones with a fare
+    update_fare_calendar(Fare.objects.filter(route_id=instance.route_id).values_list("origin_id", "destination_id"))
+
+
+def fare_changed_receiver(sender, instance, **kwargs):
+    if are_fare_updates_deferred():
+        return  # saved with its route, which indexes all of its departures
+
+    update_fare_prices(instance.route_id, instance.origin_id, instance.destination_id)
+
+
+def operator_saving_receiver(sender, instance, **kwargs):
+    instance._was_active = sender.objects.filter(pk=instance.pk).values_list("is_active", flat=True).first()
+
+
+def operator_changed_receiver(sender, instance, created, **kwargs):
+    """
+    Only the trips of active operators are on sale.
+    """
+
+    if not created and instance._was_active != instance.is_active:
+        index_operator(instance)
+
+
+def stop_changed_receiver(sender, instance, **kwargs):
+    """
+    A stop moved to another place, or was deleted along with its footpaths.
+    """
+
+    bump_trip_places_version()
+    if kwargs.get("signal") is post_save:
+        update_footpaths([instance.pk])
+    bump_trip_index_version()
+
+
+def place_changed_receiver(sender, instance, **kwargs):
+    """
+    The stops of a place, their location or the transfer time of their station changed.
+    """
+
+    bump_trip_places_version()
+    stops = Stop.objects.filter(Q(city_id=instance.pk) | Q(station_id=instance.pk))
+    update_footpaths(stops.values_list("pk", flat=True))
+    bump_trip_index_version()
+
+
+post_save.connect(departure_changed_receiver, sender=Departure, dispatch_uid="departure_saved_receiver")
+post_delete.connect(departure_deleted_receiver, sender=Departure, dispatch_uid="departure_deleted_receiver")
+post_save.connect(fare_changed_receiver, sender=Fare, dispatch_uid="fare_saved_receiver")
+post_delete.connect(fare_changed_receiver, sender=Fare, dispatch_uid="fare_deleted_receiver")
+pre_save.connect(operator_saving_receiver, sender=Operator, dispatch_uid="operator_saving_receiver")
+post_save.connect(operator_changed_receiver, sender=Operator, dispatch_uid="operator_saved_receiver")
+post_save.connect(stop_changed_receiver, sender=Stop, dispatch_uid="stop_saved_receiver")
+post_delete.connect(stop_changed_receiver, sender=Stop, dispatch_uid="stop_deleted_receiver")
+
+for place_model in PLACE_KINDS:
+    name = place_model._meta.model_name
+    page_published.connect(place_changed_receiver, sender=place_model, dispatch_uid=f"trips_{name}_published_receiver")
+    page_unpublished.connect(
+        place_changed_receiver, sender=place_model, dispatch_uid=f"trips_{name}_unpublished_receiver"
+    )
@@ -1 +1,1058 @@
-# Create your tests here.
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from wagtail.models import Page, Site
+from wagtail.test.utils import WagtailPageTestCase
+
+from home.models import HomePage
+from locations.models import CityIndexPage, CityPage, StationIndexPage, StationPage
+from trips.coalesce import compute_once, get_trip_search_stats, single_flight, trip_search_counters
+from trips.connections import Timetable, get_timetable, search_connections
+from trips.fakes import FakeOperatorServer
+from trips.fares import get_fare_calendar
+from trips.models import (
+    Departure,
+    DepartureLeg,
+    Fare,
+    FareCalendar,
+    Footpath,
+    Operator,
+    Route,
+    RouteStop,
+    SeatHold,
+    Stop,
+)
+from trips.operators import get_breaker, search_operators
+from trips.roundtrip import rank_round_trips, search_round_trip
+from trips.search import resolve_place, search_trips
+from trips.seats import (
+    HoldNotFound,
+    SeatUnavailable,
+    confirm_hold,
+    decode_segments,
+    encode_segments,
+    get_taken_seats,
+    hold_seats,
+    release_hold,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class TripSearchTests(WagtailPageTestCase):
+    """
+    Test suite for the origin - destination index and the trip search.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+
+        cls.home_page = HomePage(title="Home", slug="home-trips")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        city_index = CityIndexPage(title="Ciudades", slug="ciudades")
+        cls.home_page.add_child(instance=city_index)
+        city_index.save_revision().publish()
+
+        cls.asuncion = CityPage(title="Asunción", slug="asuncion")
+        cls.oviedo = CityPage(title="Coronel Oviedo", slug="coronel-oviedo")
+        cls.encarnacion = CityPage(title="Encarnación", slug="encarnacion")
+        for city in (cls.asuncion, cls.oviedo, cls.encarnacion):
+            city_index.add_child(instance=city)
+            city.save_revision().publish()
+
+        cls.asuncion_stop = Stop.objects.create(name="Terminal de Asunción", city=cls.asuncion)
+        cls.oviedo_stop = Stop.objects.create(name="Parada Coronel Oviedo", city=cls.oviedo)
+        cls.encarnacion_stop = Stop.objects.create(name="Terminal de Encarnación", city=cls.encarnacion)
+
+        cls.operator = Operator.objects.create(name="La Encarnacena", slug="la-encarnacena")
+
+        cls.route = Route(operator=cls.operator, name="Asunción - Encarnación")
+        cls.route.route_stops = [
+            RouteStop(stop=cls.asuncion_stop, arrival=0, departure=0),
+            RouteStop(stop=cls.oviedo_stop, arrival=120, departure=130),
+            RouteStop(stop=cls.encarnacion_stop, arrival=360, departure=360),
+        ]
+        cls.route.fares = [
+            Fare(origin=cls.asuncion_stop, destination=cls.oviedo_stop, price=Decimal("50000")),
+            Fare(origin=cls.asuncion_stop, destination=cls.encarnacion_stop, price=Decimal("120000")),
+            Fare(origin=cls.oviedo_stop, destination=cls.encarnacion_stop, price=Decimal("80000")),
+        ]
+        cls.route.save()
+
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+        cls.departures = [
+            Departure.objects.create(
+                route=cls.route,
+                departs_at=timezone.make_aware(
+                    datetime.combine(cls.tomorrow, datetime.min.time()) + timedelta(hours=hour)
+                ),
+            )
+            for hour in (7, 14, 22)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        trip_search_counters.clear()
+
+        # Per worker indexes of earlier tests would be stale against the cleared versions
+        self.enterContext(mock.patch("locations.autocomplete._index", None))
+        self.enterContext(mock.patch("trips.search._places", None))
+        self.enterContext(mock.patch.dict("trips.connections._timetables", clear=True))
+
+    def search(self, origin, destination, date=None):
+        return search_trips(resolve_place(origin.pk), resolve_place(destination.pk), date or self.tomorrow)
+
+    def test_every_priced_pair_of_stops_is_indexed(self):
+        self.assertEqual(DepartureLeg.objects.count(), 3 * 3)
+
+        leg = DepartureLeg.objects.get(departure=self.departures[0], origin=self.oviedo_stop)
+        self.assertEqual(leg.departs_at, self.departures[0].departs_at + timedelta(minutes=130))
+        self.assertEqual(leg.arrives_at, self.departures[0].departs_at + timedelta(minutes=360))
+        self.assertEqual(leg.price, Decimal("80000"))
+        self.assertEqual(leg.duration_display, "3h 50m")
+
+    def test_search_returns_the_trips_of_the_day_earliest_first(self):
+        results = self.search(self.asuncion, self.encarnacion)
+
+        self.assertEqual([leg.departure for leg in results], self.departures)
+        self.assertEqual(self.search(self.encarnacion, self.asuncion), [])
+
+    def test_late_departures_leave_the_origin_on_the_next_day(self):
+        results = self.search(self.oviedo, self.encarnacion, self.tomorrow + timedelta(days=1))
+
+        self.assertEqual([leg.departure for leg in results], [self.departures[2]])
+
+    def test_search_is_a_single_query(self):
+        origin, destination = resolve_place(self.asuncion.pk), resolve_place(self.encarnacion.pk)
+
+        with self.assertNumQueries(1):
+            results = search_trips(origin, destination, self.tomorrow)
+            self.assertEqual(results[0].operator, self.operator)
+
+    def test_fare_changes_reprice_the_index(self):
+        fare = Fare.objects.get(origin=self.asuncion_stop, destination=self.encarnacion_stop)
+        fare.price = Decimal("110000")
+        fare.save()
+
+        Fare.objects.create(
+            route=self.route,
+            origin=self.asuncion_stop,
+            destination=self.encarnacion_stop,
+            price=Decimal("150000"),
+            valid_from=self.tomorrow,
+            valid_until=self.tomorrow,
+        )
+
+        prices = {leg.price for leg in self.search(self.asuncion, self.encarnacion)}
+        self.assertEqual(prices, {Decimal("150000")})
+
+        Fare.objects.filter(origin=self.oviedo_stop).delete()
+        self.assertEqual(self.search(self.oviedo, self.encarnacion), [])
+
+    def test_cancelled_departures_leave_the_index(self):
+        departure = self.departures[1]
+        departure.is_cancelled = True
+        departure.save()
+
+        results = self.search(self.asuncion, self.encarnacion)
+        self.assertNotIn(departure, [leg.departure for leg in results])
+
+    def test_route_changes_rebuild_the_index(self):
+        self.route.route_stops = [
+            RouteStop(stop=self.asuncion_stop, arrival=0, departure=0),
+            RouteStop(stop=self.encarnacion_stop, arrival=300, departure=300),
+        ]
+        self.route.save()
+
+        self.assertEqual(self.search(self.asuncion, self.oviedo), [])
+        leg = self.search(self.asuncion, self.encarnacion)[0]
+        self.assertEqual(leg.arrives_at, self.departures[0].departs_at + timedelta(hours=5))
+
+    def test_fares_saved_with_their_route_are_indexed_once(self):
+        fares = list(self.route.fares.all())
+        fares[1].price = Decimal("130000")
+        self.route.fares = fares
+
+        with mock.patch("trips.signals.update_fare_prices") as update_fare_prices:
+            self.route.save()
+
+        update_fare_prices.assert_not_called()
+        self.assertEqual(self.search(self.asuncion, self.encarnacion)[0].price, Decimal("130000"))
+
+    def test_inactive_operators_leave_the_index(self):
+        self.operator.is_active = False
+        self.operator.save()
+
+        self.assertEqual(self.search(self.asuncion, self.encarnacion), [])
+        self.assertEqual(self.fare_calendar(self.asuncion_stop, self.encarnacion_stop), [None, None, None])
+
+        fare = Fare.objects.get(origin=self.asuncion_stop, destination=self.encarnacion_stop)
+        fare.save()
+        self.assertEqual(self.search(self.asuncion, self.encarnacion), [])
+
+        self.operator.is_active = True
+        self.operator.save()
+
+        self.assertEqual(len(self.search(self.asuncion, self.encarnacion)), 3)
+
+    def test_build_trip_index(self):
+        DepartureLeg.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("build_trip_index", chunk_size=2, stdout=stdout)
+
+        self.assertEqual(DepartureLeg.objects.count(), 3 * 3)
+        self.assertIn("2/3 departures", stdout.getvalue())
+
+    def fare_calendar(self, origin, destination, days=3):
+        return get_fare_calendar([origin.pk], [destination.pk], self.tomorrow, self.tomorrow + timedelta(days=days))
+
+    def test_fare_calendar_has_the_cheapest_fare_of_each_day(self):
+        self.assertEqual(FareCalendar.objects.count(), 3)
+        self.assertEqual(self.fare_calendar(self.asuncion_stop, self.encarnacion_stop), [120000, None, None])
+        self.assertEqual(self.fare_calendar(self.oviedo_stop, self.encarnacion_stop), [80000, 80000, None])
+
+    def test_fare_calendar_follows_the_index(self):
+        Fare.objects.create(
+            route=self.route,
+            origin=self.asuncion_stop,
+            destination=self.encarnacion_stop,
+            price=Decimal("99000"),
+            valid_from=self.tomorrow,
+            valid_until=self.tomorrow,
+        )
+        self.assertEqual(self.fare_calendar(self.asuncion_stop, self.encarnacion_stop), [99000, None, None])
+
+        self.departures[2].delete()
+        self.assertEqual(self.fare_calendar(self.oviedo_stop, self.encarnacion_stop), [80000, None, None])
+
+        Fare.objects.filter(origin=self.oviedo_stop).delete()
+        self.assertFalse(FareCalendar.objects.filter(origin=self.oviedo_stop).exists())
+
+    def test_build_fare_calendar(self):
+        FareCalendar.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("build_fare_calendar", stdout=stdout)
+
+        self.assertIn("Built 3 fare calendars.", stdout.getvalue())
+        self.assertEqual(self.fare_calendar(self.asuncion_stop, self.oviedo_stop), [50000, None, None])
+
+    def test_fare_calendar_view(self):
+        data = {"origin": self.asuncion.pk, "destination": "Encarnacion", "month": f"{self.tomorrow:%Y-%m}"}
+        response = self.client.get(reverse("trips:fare-calendar"), data)
+
+        self.assertEqual(response.status_code, 200)
+        grid = response.json()
+        days = [day for week in grid["weeks"] for day in week if day is not None]
+        self.assertEqual(grid["destination"]["id"], self.encarnacion.pk)
+        self.assertEqual(len(grid["weeks"][0]), 7)
+        self.assertEqual(days[self.tomorrow.day - 1], {"date": f"{self.tomorrow}", "price": 120000, "cheapest": True})
+        self.assertEqual(grid["min_price"], 120000)
+
+        response = self.client.get(reverse("trips:fare-calendar"), {**data, "month": "2025-13"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_results_view(self):
+        data = {
+            "origin": self.asuncion.pk,
+            "destination": self.encarnacion.pk,
+            "departure": f"{self.tomorrow:%d/%m/%Y}",
+        }
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["results"]), 3)
+        self.assertContains(response, "La Encarnacena")
+        self.assertContains(response, "Gs. 120\xa0000")
+        self.assertEqual(self.client.session["q"]["origin"], "Asunción")
+
+    def test_search_results_view_falls_back_to_typed_names(self):
+        data = {"origin_name": "asunc", "destination_name": "Encarnacion", "departure": f"{self.tomorrow:%Y-%m-%d}"}
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(response.context["query"]["destination"]["id"], self.encarnacion.pk)
+        self.assertEqual(len(response.context["results"]), 3)
+
+    def test_search_results_view_rejects_past_dates(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        data = {"origin": self.asuncion.pk, "destination": self.encarnacion.pk, "departure": f"{yesterday:%Y-%m-%d}"}
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertNotIn("results", response.context)
+        self.assertContains(response, "La fecha de salida ya pasó")
+
+    def create_return_route(self):
+        route = Route(operator=self.operator, name="Encarnación - Asunción")
+        route.route_stops = [
+            RouteStop(stop=self.encarnacion_stop, arrival=0, departure=0),
+            RouteStop(stop=self.asuncion_stop, arrival=360, departure=360),
+        ]
+        route.fares = [Fare(origin=self.encarnacion_stop, destination=self.asuncion_stop, price=Decimal("110000"))]
+        route.save()
+
+        return_date = self.tomorrow + timedelta(days=2)
+        for hour, price in ((8, None), (15, Decimal("90000"))):
+            departure = timezone.make_aware(datetime.combine(return_date, datetime.min.time()) + timedelta(hours=hour))
+            Departure.objects.create(route=route, departs_at=departure)
+            if price:
+                DepartureLeg.objects.filter(departure__departs_at=departure).update(price=price)
+
+        return return_date
+
+    @override_settings(TRIP_SEARCH_THREADS=0)
+    def test_search_results_view_ranks_round_trips_by_total_fare(self):
+        return_date = self.create_return_route()
+        data = {
+            "trip_type": "round_trip",
+            "origin": self.asuncion.pk,
+            "destination": self.encarnacion.pk,
+            "departure": f"{self.tomorrow}",
+            "return_date": f"{return_date}",
+        }
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        round_trips = response.context["round_trips"]
+        self.assertEqual(len(response.context["results"]), 3)
+        self.assertEqual(len(response.context["return_results"]), 2)
+        self.assertEqual(len(round_trips), 3)
+        self.assertEqual({trip.price for trip in round_trips}, {Decimal("210000")})
+        self.assertEqual(round_trips[0].outbound.legs, [response.context["results"][0]])
+        self.assertContains(response, "Ida y vuelta más baratas")
+        self.assertContains(response, "Gs. 210\xa0000")
+        self.assertEqual(self.client.session["q"]["trip_type"], "round_trip")
+
+        # The way back is the same search as a one way one
+        data = {"origin": self.encarnacion.pk, "destination": self.asuncion.pk, "departure": f"{return_date}"}
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(len(response.context["results"]), 2)
+        self.assertEqual(get_trip_search_stats(), {"computed": 2, "cached": 1, "coalesced": 0, "saved": 1})
+
+    @override_settings(TRIP_SEARCH_THREADS=2)
+    def test_round_trips_search_the_way_back_in_the_pool(self):
+        return_date = self.create_return_route()
+
+        # Searched one way first, so the pool thread finds it in the cache instead of the
+        # database, which the test transaction hides from other threads
+        data = {"origin": self.encarnacion.pk, "destination": self.asuncion.pk, "departure": f"{return_date}"}
+        self.client.get(reverse("trips:search-results"), data)
+
+        closed = []
+        data = {
+            "trip_type": "round_trip",
+            "origin": self.asuncion.pk,
+            "destination": self.encarnacion.pk,
+            "departure": f"{self.tomorrow}",
+            "return_date": f"{return_date}",
+        }
+        with mock.patch(
+            "trips.roundtrip.close_old_connections", lambda: closed.append(threading.current_thread().name)
+        ):
+            response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(len(response.context["return_results"]), 2)
+        self.assertEqual(len(response.context["round_trips"]), 3)
+        self.assertEqual(len(closed), 1)
+        self.assertTrue(closed[0].startswith("trip-search"))
+        self.assertEqual(get_trip_search_stats(), {"computed": 2, "cached": 1, "coalesced": 0, "saved": 1})
+
+    @override_settings(TRIP_SEARCH_THREADS=0, TRIP_OPERATOR_TIMEOUT=0.2, TRIP_SEARCH_STREAMING=0)
+    def test_operators_are_only_asked_for_the_way_there(self):
+        adapters = self.get_operator_adapters()
+        return_date = self.create_return_route()
+        data = {
+            "trip_type": "round_trip",
+            "origin": self.asuncion.pk,
+            "destination": self.encarnacion.pk,
+            "departure": f"{self.tomorrow}",
+            "return_date": f"{return_date}",
+        }
+        with self.settings(TRIP_OPERATOR_ADAPTERS=adapters), self.assertLogs("trips.operators", level="WARNING"):
+            response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual([request["date"] for request in self.nsa.requests], [f"{self.tomorrow}"])
+        self.assertEqual(len(response.context["availability"].trips), 1)
+        self.assertEqual({trip.price for trip in response.context["round_trips"]}, {Decimal("210000")})
+
+    def test_round_trips_need_a_return_date(self):
+        data = {
+            "trip_type": "round_trip",
+            "origin": self.asuncion.pk,
+            "destination": self.encarnacion.pk,
+            "departure": f"{self.tomorrow}",
+        }
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertNotIn("results", response.context)
+        self.assertContains(response, "Elegí la fecha de vuelta")
+
+    def test_search_results_view_caches_identical_searches(self):
+        data = {"origin": self.asuncion.pk, "destination": self.encarnacion.pk, "departure": f"{self.tomorrow}"}
+        self.client.get(reverse("trips:search-results"), data)
+
+        with mock.patch("trips.search.search_trips") as search:
+            response = self.client.get(reverse("trips:search-results"), data)
+
+        search.assert_not_called()
+        self.assertEqual(len(response.context["results"]), 3)
+        self.assertEqual(get_trip_search_stats(), {"computed": 1, "cached": 1, "coalesced": 0, "saved": 1})
+
+        # A change to the index is a new search
+        self.departures[0].save()
+        self.client.get(reverse("trips:search-results"), data)
+        self.assertEqual(get_trip_search_stats()["computed"], 2)
+
+    def get_operator_adapters(self):
+        """
+        A fast operator with a trip and one too slow to answer in time.
+        """
+
+        Operator.objects.create(name="NSA", slug="nsa")
+        Operator.objects.create(name="Rysa", slug="rysa")
+        trip = {"departs_at": f"{self.tomorrow}T09:00:00", "arrives_at": f"{self.tomorrow}T15:30:00", "price": 99000}
+        nsa = FakeOperatorServer(trips=[trip]).start()
+        rysa = FakeOperatorServer(delay=2).start()
+        self.addCleanup(nsa.stop)
+        self.addCleanup(rysa.stop)
+        self.nsa = nsa
+
+        return {
+            "nsa": {"BACKEND": "trips.operators.HttpOperatorAdapter", "OPTIONS": {"url": nsa.url}},
+            "rysa": {"BACKEND": "trips.operators.HttpOperatorAdapter", "OPTIONS": {"url": rysa.url}},
+        }
+
+    @override_settings(TRIP_OPERATOR_TIMEOUT=0.2, TRIP_SEARCH_STREAMING=0)
+    def test_search_results_view_shows_the_operators_that_answered(self):
+        adapters = self.get_operator_adapters()
+        data = {"origin": self.asuncion.pk, "destination": self.encarnacion.pk, "departure": f"{self.tomorrow}"}
+
+        with self.settings(TRIP_OPERATOR_ADAPTERS=adapters), self.assertLogs("trips.operators", level="WARNING"):
+            response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(len(response.context["results"]), 3)
+        self.assertContains(response, "Gs. 99\xa0000")
+        self.assertContains(response, "6h 30m")
+        self.assertContains(response, "Algunas empresas no respondieron a tiempo")
+
+    @override_settings(TRIP_OPERATOR_TIMEOUT=0.5)
+    def test_search_results_view_streams_the_operators_as_they_answer(self):
+        adapters = self.get_operator_adapters()
+        data = {"origin": self.asuncion.pk, "destination": self.encarnacion.pk, "departure": f"{self.tomorrow}"}
+
+        with self.settings(TRIP_OPERATOR_ADAPTERS=adapters), self.assertLogs("trips.operators", level="WARNING"):
+            start = time.perf_counter()
+            response = self.client.get(reverse("trips:search-results"), data)
+            chunks = iter(response.streaming_content)
+
+            page = next(chunks).decode()
+            self.assertLess(time.perf_counter() - start, 0.4)
+            self.assertIn("La Encarnacena", page)
+            self.assertIn("Buscando pasajes de más empresas", page)
+            self.assertNotIn("NSA", page)
+
+            self.assertIn("Gs. 99\xa0000", next(chunks).decode())
+            self.assertIn("Algunas empresas no respondieron a tiempo", next(chunks).decode())
+            self.assertIn("</html>", b"".join(chunks).decode())
+
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+
+    def test_streamed_page_ends_when_the_operators_fail(self):
+        data = {"origin": self.asuncion.pk, "destination": self.encarnacion.pk, "departure": f"{self.tomorrow}"}
+        adapters = {"nsa": {"BACKEND": "trips.operators.HttpOperatorAdapter", "OPTIONS": {"url": "http://nsa"}}}
+
+        with (
+            self.settings(TRIP_OPERATOR_ADAPTERS=adapters),
+            mock.patch("trips.views.stream_operators", side_effect=RuntimeError),
+            self.assertLogs("trips.views", level="ERROR"),
+        ):
+            response = self.client.get(reverse("trips:search-results"), data)
+            page = b"".join(response.streaming_content).decode()
+
+        self.assertIn("La Encarnacena", page)
+        self.assertIn("Algunas empresas no respondieron a tiempo", page)
+        self.assertIn("</html>", page)
+
+
+class RoundTripTests(SimpleTestCase):
+    """
+    Test suite for the pairing of the trips there and back.
+    """
+
+    start = datetime(2025, 1, 10, tzinfo=timezone.get_fixed_timezone(-180))
+
+    def option(self, day, hour, hours, price):
+        departs_at = self.start + timedelta(days=day, hours=hour)
+        return SimpleNamespace(departs_at=departs_at, arrives_at=departs_at + timedelta(hours=hours), price=price)
+
+    def test_each_trip_there_takes_the_cheapest_return_after_it(self):
+        early, late = self.option(0, 8, 6, 100), self.option(0, 20, 6, 80)
+        back_early, back_cheap, back_late = (
+            self.option(1, 7, 6, 90),
+            self.option(1, 10, 6, 70),
+            self.option(1, 18, 5, 75),
+        )
+
+        round_trips = rank_round_trips([early, late], [back_late, back_early, back_cheap])
+
+        self.assertEqual(
+            [(trip.outbound, trip.inbound) for trip in round_trips], [(late, back_cheap), (early, back_cheap)]
+        )
+        self.assertEqual(round_trips[0].price, 150)
+
+    def test_returns_before_the_arrival_are_left_out(self):
+        overnight = self.option(0, 22, 12, 100)
+        self.assertEqual(rank_round_trips([overnight], [self.option(1, 8, 6, 50)]), [])
+
+    def test_both_ways_are_searched_at_once(self):
+        def get_search_results(origin, destination, date):
+            time.sleep(0.2)
+            return {"results": [], "connections": []}
+
+        origin, destination = {"id": 1}, {"id": 2}
+        with mock.patch("trips.roundtrip.get_search_results", get_search_results):
+            start = time.perf_counter()
+            results = search_round_trip(origin, destination, self.start.date(), self.start.date())
+            self.assertLess(time.perf_counter() - start, 0.35)
+
+            with self.settings(TRIP_SEARCH_THREADS=0):
+                start = time.perf_counter()
+                search_round_trip(origin, destination, self.start.date(), self.start.date())
+                self.assertGreaterEqual(time.perf_counter() - start, 0.4)
+
+        self.assertEqual(results["round_trips"], [])
+
+    @override_settings(TRIP_TIMETABLE_DAYS=1)
+    def test_timetables_are_shared_by_the_threads(self):
+        def load(date, version=None):
+            return Timetable(date, [], {}, {}, version=version)
+
+        dates = [self.start.date() + timedelta(days=day) for day in range(3)]
+        with (
+            mock.patch.dict("trips.connections._timetables", clear=True),
+            mock.patch("trips.connections.Timetable.load", load),
+            ThreadPoolExecutor(max_workers=8) as executor,
+        ):
+            timetables = list(executor.map(get_timetable, dates * 200))
+
+        self.assertEqual([timetable.date for timetable in timetables], dates * 200)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Test suite for the coalescing of identical trip searches.
+    """
+
+    def setUp(self):
+        cache.clear()
+        trip_search_counters.clear()
+
+    def test_concurrent_searches_are_computed_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ["result"]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            leader = executor.submit(single_flight, "trips:search:test", compute)
+            started.wait(5)
+            followers = [executor.submit(single_flight, "trips:search:test", compute) for _ in range(7)]
+            time.sleep(0.05)
+            release.set()
+
+            results = [future.result() for future in [leader, *followers]]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["result"]] * 8)
+        self.assertEqual(get_trip_search_stats(), {"computed": 1, "cached": 0, "coalesced": 7, "saved": 7})
+
+    def test_waits_for_the_search_of_another_worker(self):
+        cache.add("trips:search:test:lock", 1)
+        threading.Timer(0.05, cache.set, ["trips:search:test", ["theirs"]]).start()
+
+        result = single_flight("trips:search:test", lambda: ["ours"])
+
+        self.assertEqual(result, ["theirs"])
+        self.assertEqual(get_trip_search_stats()["coalesced"], 1)
+
+    def test_does_not_compute_again_after_taking_the_lock(self):
+        # ex: the other worker stored its result and gave the lock back before this one took it
+        cache.set("trips:search:test", ["theirs"])
+
+        result = compute_once("trips:search:test", lambda: ["ours"], timeout=60)
+
+        self.assertEqual(result, ["theirs"])
+        self.assertIsNone(cache.get("trips:search:test:lock"))
+
+    @override_settings(TRIP_SEARCH_COALESCE_TIMEOUT=0.05)
+    def test_computes_when_the_other_worker_is_stuck(self):
+        cache.add("trips:search:test:lock", 1)
+
+        with self.assertLogs("trips.coalesce", level="WARNING"):
+            result = single_flight("trips:search:test", lambda: ["ours"])
+
+        self.assertEqual(result, ["ours"])
+        self.assertEqual(single_flight("trips:search:test", lambda: ["again"]), ["ours"])
+
+    def test_failures_are_not_cached(self):
+        def fail():
+            raise ValueError("down")
+
+        with self.assertRaises(ValueError):
+            single_flight("trips:search:test", fail)
+
+        self.assertEqual(single_flight("trips:search:test", lambda: ["result"]), ["result"])
+        self.assertIsNone(cache.get("trips:search:test:lock"))
+
+    def test_trip_search_stats(self):
+        single_flight("trips:search:test", lambda: ["result"])
+        single_flight("trips:search:test", lambda: ["result"])
+        stdout = StringIO()
+
+        call_command("trip_search_stats", stdout=stdout)
+
+        self.assertIn("2 searches, 1 computed", stdout.getvalue())
+        self.assertIn("50% of the computations saved", stdout.getvalue())
+
+
+class SeatInventoryTests(TestCase):
+    """
+    Test suite for the seat holds and sales of the departures.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        stops = [Stop.objects.create(name=name) for name in ("Asunción", "Coronel Oviedo", "Villarrica")]
+        operator = Operator.objects.create(name="Guaireña", slug="guairena")
+
+        route = Route(operator=operator, name="Asunción - Villarrica")
+        route.route_stops = [RouteStop(stop=stop, arrival=60 * i, departure=60 * i) for i, stop in enumerate(stops)]
+        route.fares = [
+            Fare(origin=origin, destination=destination, price=Decimal("40000"))
+            for i, origin in enumerate(stops)
+            for destination in stops[i + 1 :]
+        ]
+        route.save()
+
+        cls.departure = Departure.objects.create(route=route, departs_at=timezone.now() + timedelta(days=1), seats=12)
+        legs = DepartureLeg.objects.filter(departure=cls.departure)
+        cls.first = legs.get(origin=stops[0], destination=stops[1])
+        cls.second = legs.get(origin=stops[1], destination=stops[2])
+        cls.whole = legs.get(origin=stops[0], destination=stops[2])
+
+    def test_segments_round_trip(self):
+        segments = [0, 1 << 43 | 1, 1 << 7]
+
+        self.assertEqual(decode_segments(encode_segments(segments)), segments)
+        self.assertEqual(len(encode_segments(segments)), 1 + 3 * 6)
+
+    def test_held_seats_cannot_be_held_again(self):
+        hold_seats(self.whole, [3, 4])
+
+        with self.assertRaises(SeatUnavailable) as raised:
+            hold_seats(self.first, [4, 5])
+
+        self.assertEqual(raised.exception.seats, [4])
+        self.assertEqual(get_taken_seats(self.second), [3, 4])
+
+    def test_seats_are_sold_again_after_the_passenger_gets_off(self):
+        confirm_hold(hold_seats(self.first, [1]).token)
+
+        self.assertEqual(get_taken_seats(self.first), [1])
+        self.assertEqual(get_taken_seats(self.whole), [1])
+        self.assertEqual(get_taken_seats(self.second), [])
+
+        confirm_hold(hold_seats(self.second, [1]).token)
+        self.assertEqual(get_taken_seats(self.whole), [1])
+
+    def test_seats_outside_the_bus_are_rejected(self):
+        with self.assertRaises(SeatUnavailable):
+            hold_seats(self.first, [0, 13])
+
+    def test_holds_expire(self):
+        hold = hold_seats(self.whole, [7])
+        SeatHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(get_taken_seats(self.whole), [])
+        with self.assertRaises(HoldNotFound):
+            confirm_hold(hold.token)
+
+        hold_seats(self.whole, [7])
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_confirmed_holds_are_sold_once(self):
+        hold = hold_seats(self.whole, [2, 9])
+
+        self.assertEqual(confirm_hold(hold.token), [2, 9])
+        with self.assertRaises(HoldNotFound):
+            confirm_hold(hold.token)
+        with self.assertRaises(SeatUnavailable):
+            hold_seats(self.second, [9])
+
+    def test_released_seats_are_free_again(self):
+        hold = hold_seats(self.whole, [5])
+
+        self.assertTrue(release_hold(hold.token))
+        self.assertEqual(get_taken_seats(self.whole), [])
+
+    @override_settings(SEAT_HOLD_TIMEOUT=60)
+    def test_seats_view_holds_the_picked_seats(self):
+        url = f"{reverse('trips:seats')}?leg={self.whole.pk}"
+        hold_seats(self.first, [1])
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["taken"], [1])
+
+        response = self.client.post(url, {"seats": ["1"]})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+        response = self.client.post(url, {"seats": ["2", "3"]})
+        self.assertRedirects(response, reverse("trips:order"), fetch_redirect_response=False)
+        self.assertEqual(get_taken_seats(self.second), [2, 3])
+
+        hold = SeatHold.objects.get(token=self.client.session["hold"])
+        self.assertLessEqual(hold.expires_at, timezone.now() + timedelta(seconds=60))
+
+        # Picking again gives back the seats picked before
+        self.client.post(url, {"seats": ["4"]})
+        self.assertEqual(get_taken_seats(self.second), [4])
+
+        # and keeps them when the new ones are taken
+        response = self.client.post(url, {"seats": ["1", "4"]})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(get_taken_seats(self.second), [4])
+
+    def test_replaced_hold_is_given_back_with_the_new_one(self):
+        hold = hold_seats(self.whole, [5, 6])
+
+        new_hold = hold_seats(self.whole, [6, 7], replaces=hold.token)
+
+        self.assertEqual(get_taken_seats(self.whole), [6, 7])
+        self.assertFalse(SeatHold.objects.filter(pk=hold.pk).exists())
+        self.assertTrue(SeatHold.objects.filter(pk=new_hold.pk).exists())
+
+
+class ConnectionSearchTests(WagtailPageTestCase):
+    """
+    Test suite for the search of trips with transfers.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.objects.get(id=1)
+
+        cls.home_page = HomePage(title="Home", slug="home-connections")
+        root.add_child(instance=cls.home_page)
+        cls.home_page.save_revision().publish()
+
+        site = Site.objects.get(id=1)
+        site.root_page = cls.home_page
+        site.save()
+
+        city_index = CityIndexPage(title="Ciudades", slug="ciudades")
+        station_index = StationIndexPage(title="Terminales", slug="terminales")
+        for page in (city_index, station_index):
+            cls.home_page.add_child(instance=page)
+            page.save_revision().publish()
+
+        cls.san_juan = CityPage(title="San Juan Nepomuceno", slug="san-juan")
+        cls.este = CityPage(title="Ciudad del Este", slug="ciudad-del-este")
+        cls.hernandarias = CityPage(title="Hernandarias", slug="hernandarias")
+        for city in (cls.san_juan, cls.este, cls.hernandarias):
+            city_index.add_child(instance=city)
+            city.save_revision().publish()
+
+        cls.terminal = StationPage(
+            title="Terminal de Asunción",
+            slug="terminal",
+            address="Av. Fernando de la Mora",
+            lat_long="-25.3069, -57.6186",
+        )
+        cls.terminal.min_transfer_time = 30
+        # About 500m east of the terminal
+        cls.shopping = StationPage(
+            title="Parada Shopping", slug="shopping", address="Avenida", lat_long="-25.3069, -57.6136"
+        )
+        for station in (cls.terminal, cls.shopping):
+            station_index.add_child(instance=station)
+            station.save_revision().publish()
+
+        stops = {
+            "san_juan": Stop.objects.create(name="San Juan", city=cls.san_juan),
+            "terminal": Stop.objects.create(name="Terminal de Asunción", station=cls.terminal),
+            "shopping": Stop.objects.create(name="Parada Shopping", station=cls.shopping),
+            "este": Stop.objects.create(name="Terminal de Ciudad del Este", city=cls.este),
+            "hernandarias": Stop.objects.create(name="Hernandarias", city=cls.hernandarias),
+        }
+        cls.stops = stops
+
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+        timetable = [
+            # operator, origin, destination, departs (hours), duration (minutes)
+            ("Yacyretá", "san_juan", "terminal", 6, 180),
+            ("Rysa", "terminal", "este", 9 + 20 / 60, 300),  # leaves before the 30 minutes transfer
+            ("Rysa", "terminal", "este", 10, 300),
+            ("Crucero", "shopping", "este", 9.75, 285),  # a short walk away, arrives first
+            ("Guaraní", "este", "hernandarias", 16, 30),
+        ]
+        for name, origin, destination, hour, duration in timetable:
+            operator, _ = Operator.objects.get_or_create(
+                name=name, slug=name.lower().replace("á", "a").replace("í", "i")
+            )
+            route = Route(operator=operator, name=f"{origin} - {destination}")
+            route.route_stops = [
+                RouteStop(stop=stops[origin]),
+                RouteStop(stop=stops[destination], arrival=duration, departure=duration),
+            ]
+            route.fares = [Fare(origin=stops[origin], destination=stops[destination], price=Decimal("50000"))]
+            route.save()
+
+            departs_at = datetime.combine(cls.tomorrow, datetime.min.time()) + timedelta(hours=hour)
+            Departure.objects.create(route=route, departs_at=timezone.make_aware(departs_at))
+
+    def setUp(self):
+        cache.clear()
+
+        # Per worker indexes of earlier tests would be stale against the cleared versions
+        self.enterContext(mock.patch("trips.search._places", None))
+        self.enterContext(mock.patch.dict("trips.connections._timetables", clear=True))
+
+    def search(self, origin, destination):
+        return search_connections(resolve_place(origin.pk), resolve_place(destination.pk), self.tomorrow)
+
+    def get_hour(self, value):
+        return timezone.localtime(value).hour
+
+    def get_route(self, connection):
+        return [(leg.origin.name, leg.destination.name) for leg in connection.legs]
+
+    def test_footpaths_join_nearby_stations(self):
+        footpath = Footpath.objects.get(origin=self.stops["terminal"], destination=self.stops["shopping"])
+
+        self.assertAlmostEqual(footpath.distance, 0.5, delta=0.05)
+        self.assertEqual(footpath.duration, 7 + 15)  # walk + minimum transfer time at the shopping
+        self.assertFalse(Footpath.objects.filter(origin=self.stops["san_juan"]).exists())
+
+    def test_footpaths_of_a_changed_place_are_rebuilt(self):
+        footpaths = set(Footpath.objects.values_list("pk", flat=True))
+
+        self.san_juan.save_revision().publish()
+        self.assertEqual(set(Footpath.objects.values_list("pk", flat=True)), footpaths)
+
+        self.shopping.lat_long = "-25.2069, -57.6136"  # 11km away
+        self.shopping.save_revision().publish()
+        self.assertFalse(Footpath.objects.exists())
+
+        self.stops["shopping"].station = self.terminal
+        self.stops["shopping"].save()
+        footpath = Footpath.objects.get(origin=self.stops["terminal"], destination=self.stops["shopping"])
+        self.assertEqual(footpath.duration, 30)  # same station, the transfer time of the terminal
+
+    def test_one_transfer_walking_to_the_first_bus_to_arrive(self):
+        connections = self.search(self.san_juan, self.este)
+
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(
+            self.get_route(connections[0]),
+            [("San Juan", "Terminal de Asunción"), ("Parada Shopping", "Terminal de Ciudad del Este")],
+        )
+        self.assertEqual(connections[0].transfers, 1)
+        self.assertEqual(connections[0].price, Decimal("100000"))
+        self.assertEqual(connections[0].duration_display, "8h 30m")
+
+    def test_minimum_transfer_time_of_the_station(self):
+        Footpath.objects.all().delete()
+
+        connection = self.search(self.san_juan, self.este)[0]
+
+        self.assertEqual(self.get_hour(connection.legs[1].departs_at), 10)
+
+    def test_two_transfers(self):
+        connection = self.search(self.san_juan, self.hernandarias)[0]
+
+        self.assertEqual(connection.transfers, 2)
+        self.assertEqual(self.get_hour(connection.arrives_at), 16)
+
+        with self.settings(TRIP_MAX_TRANSFERS=1):
+            cache.clear()
+            self.assertEqual(self.search(self.san_juan, self.hernandarias), [])
+
+    def test_direct_trips_are_not_connections(self):
+        self.assertEqual(self.search(self.este, self.hernandarias), [])
+
+    def test_results_are_cached_until_the_index_changes(self):
+        self.search(self.san_juan, self.este)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.search(self.san_juan, self.este)), 1)
+
+        Departure.objects.filter(route__operator__name="Crucero").delete()
+
+        connection = self.search(self.san_juan, self.este)[0]
+        self.assertEqual(connection.legs[1].operator.name, "Rysa")
+
+    @override_settings(TRIP_CONNECTIONS_BUDGET=-1, TRIP_CONNECTIONS_PARTIAL_CACHE_TIMEOUT=0)
+    def test_searches_over_budget_are_not_cached(self):
+        with self.assertLogs("trips.connections", level="WARNING"):
+            self.assertEqual(self.search(self.san_juan, self.este), [])
+
+        with self.settings(TRIP_CONNECTIONS_BUDGET=1):
+            self.assertEqual(len(self.search(self.san_juan, self.este)), 1)
+
+    def test_buses_that_already_left_are_left_out(self):
+        self.assertEqual(len(self.search(self.san_juan, self.este)), 1)
+
+        # The first bus left at 6, after that the cached result has no trip that can be taken
+        now = timezone.make_aware(datetime.combine(self.tomorrow, datetime.min.time()) + timedelta(hours=7))
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.assertEqual(self.search(self.san_juan, self.este), [])
+
+    def test_search_results_view_shows_connections(self):
+        data = {"origin": self.san_juan.pk, "destination": self.este.pk, "departure": f"{self.tomorrow:%Y-%m-%d}"}
+        response = self.client.get(reverse("trips:search-results"), data)
+
+        self.assertEqual(response.context["results"], [])
+        self.assertEqual(len(response.context["connections"]), 1)
+        self.assertContains(response, "Con transbordo")
+        self.assertContains(response, "Parada Shopping")
+
+
+class OperatorAvailabilityTests(TestCase):
+    """
+    Test suite for the trips asked to the inventory systems of the operators.
+    """
+
+    origin = {"id": 1, "name": "Asunción", "stops": []}
+    destination = {"id": 2, "name": "Encarnación", "stops": []}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nsa = Operator.objects.create(name="NSA", slug="nsa")
+        cls.rysa = Operator.objects.create(name="Rysa", slug="rysa")
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict("trips.operators._breakers", clear=True))
+
+    def get_trips(self, *hours, price=100000):
+        return [
+            {
+                "departs_at": f"{self.tomorrow}T{hour:02d}:00:00",
+                "arrives_at": f"{self.tomorrow}T{hour + 3:02d}:00:00",
+                "price": price,
+                "seats": 10,
+            }
+            for hour in hours
+        ]
+
+    def start_server(self, **kwargs):
+        server = FakeOperatorServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def search(self, **servers):
+        adapters = {
+            slug: {"BACKEND": "trips.operators.HttpOperatorAdapter", "OPTIONS": {"url": server.url}}
+            for slug, server in servers.items()
+        }
+        with self.settings(TRIP_OPERATOR_ADAPTERS=adapters):
+            return search_operators(self.origin, self.destination, self.tomorrow)
+
+    def test_operators_are_asked_at_once(self):
+        nsa = self.start_server(trips=self.get_trips(8, 20), delay=0.3)
+        rysa = self.start_server(trips=self.get_trips(14, price=90000), delay=0.3)
+
+        start = time.perf_counter()
+        availability = self.search(nsa=nsa, rysa=rysa)
+
+        self.assertLess(time.perf_counter() - start, 0.55)
+        self.assertFalse(availability.partial)
+        self.assertEqual([trip.operator for trip in availability.trips], [self.nsa, self.rysa, self.nsa])
+        self.assertEqual(availability.trips[1].price, Decimal("90000"))
+        self.assertEqual(timezone.localtime(availability.trips[0].departs_at).hour, 8)
+        self.assertEqual(
+            nsa.requests, [{"origin": "Asunción", "destination": "Encarnación", "date": f"{self.tomorrow}"}]
+        )
+
+    @override_settings(TRIP_OPERATOR_TIMEOUT=0.2)
+    def test_slow_operators_are_left_out(self):
+        nsa = self.start_server(trips=self.get_trips(8))
+        rysa = self.start_server(trips=self.get_trips(14), delay=2)
+
+        start = time.perf_counter()
+        with self.assertLogs("trips.operators", level="WARNING"):
+            availability = self.search(nsa=nsa, rysa=rysa)
+
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(availability.partial)
+        self.assertEqual(availability.failed, {"rysa": "timeout"})
+        self.assertEqual([trip.operator for trip in availability.trips], [self.nsa])
+
+    @override_settings(TRIP_OPERATORS_DEADLINE=0.2)
+    def test_the_deadline_covers_all_the_operators(self):
+        rysa = self.start_server(trips=self.get_trips(14), delay=2)
+
+        start = time.perf_counter()
+        with self.assertLogs("trips.operators", level="WARNING"):
+            availability = self.search(rysa=rysa)
+
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(availability.failed, {"rysa": "timeout"})
+
+    @override_settings(TRIP_OPERATOR_FAILURE_THRESHOLD=2, TRIP_OPERATOR_RESET_TIMEOUT=0.1)
+    def test_failing_operators_are_not_asked_until_the_circuit_resets(self):
+        nsa = self.start_server(trips=self.get_trips(8), status=500)
+
+        with self.assertLogs("trips.operators", level="WARNING"):
+            for _ in range(3):
+                availability = self.search(nsa=nsa)
+
+        self.assertEqual(len(nsa.requests), 2)
+        self.assertEqual(availability.failed, {"nsa": "circuit open"})
+        self.assertEqual(get_breaker("nsa").state, "open")
+
+        time.sleep(0.1)
+        nsa.status = 200
+
+        self.assertEqual(len(self.search(nsa=nsa).trips), 1)
+        self.assertEqual(get_breaker("nsa").state, "closed")
+
+    def test_invalid_answers_are_failures(self):
+        nsa = self.start_server(trips=[{"departs_at": "soon"}])
+
+        with self.assertLogs("trips.operators", level="WARNING"):
+            availability = self.search(nsa=nsa)
+
+        self.assertEqual(availability.failed, {"nsa": "error"})
+
+    def test_inactive_operators_are_not_asked(self):
+        Operator.objects.filter(pk=self.nsa.pk).update(is_active=False)
+        nsa = self.start_server(trips=self.get_trips(8))
+
+        self.assertEqual(self.search(nsa=nsa).trips, [])
+        self.assertEqual(nsa.requests, [])
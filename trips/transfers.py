@@ -0,0 +1,119 @@
+"""
+Footpaths between nearby stops, precomputed for the connection search (see `trips.connections`).
+
+Changing buses at a stop takes the minimum transfer time of its station (or
+`TRIP_MIN_TRANSFER_TIME` for stops on the road). Changing to another stop takes the walk
+between them at `TRIP_WALKING_SPEED` plus the minimum transfer time of the stop walked to:
+stops of the same station are a transfer away, stops within `TRIP_FOOTPATH_MAX_DISTANCE`
+km of each other a walk away. A stop is located by its station, otherwise by its city.
+
+The footpaths from and to a stop are rebuilt whenever it or its station or city changes,
+`build_footpaths` rebuilds all of them. The stops are swept by latitude so only the ones less
+than the maximum distance apart are measured.
+"""
+
+import bisect
+import logging
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from locations.geo import KM_PER_DEGREE, haversine
+from trips.models import Footpath, Stop
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_transfer_time(stop):
+    if stop.station_id is not None:
+        return stop.station.min_transfer_time
+
+    return settings.TRIP_MIN_TRANSFER_TIME
+
+
+def get_coordinates(stop):
+    for place in (stop.station, stop.city):
+        if place is not None and place.has_coordinates:
+            return place.latitude, place.longitude
+
+    return None
+
+
+def get_footpaths(stops, touching=None):
+    """
+    The unsaved footpaths between the stops, both ways. Only the ones from or to the stop
+    ids in `touching` when given.
+    """
+
+    footpaths = []
+    max_distance = settings.TRIP_FOOTPATH_MAX_DISTANCE
+
+    located = [(coordinates, stop) for stop in stops if (coordinates := get_coordinates(stop)) is not None]
+    located.sort(key=lambda item: item[0])
+    latitudes = [coordinates[0] for coordinates, _ in located]
+
+    for (latitude, longitude), origin in located:
+        end = bisect.bisect_right(latitudes, latitude + max_distance / KM_PER_DEGREE)
+        start = bisect.bisect_left(latitudes, latitude - max_distance / KM_PER_DEGREE)
+
+        for (other_latitude, other_longitude), destination in located[start:end]:
+            if destination.pk == origin.pk:
+                continue
+            if touching is not None and origin.pk not in touching and destination.pk not in touching:
+                continue
+
+            same_station = origin.station_id is not None and origin.station_id == destination.station_id
+            distance = 0.0 if same_station else haversine(latitude, longitude, other_latitude, other_longitude)
+            if distance > max_distance:
+                continue
+
+            walk = math.ceil(distance / settings.TRIP_WALKING_SPEED * 60)
+            footpaths.append(
+                Footpath(
+                    origin=origin,
+                    destination=destination,
+                    distance=round(distance, 3),
+                    duration=walk + get_transfer_time(destination),
+                )
+            )
+
+    return footpaths
+
+
+def build_footpaths():
+    """
+    Replace all the footpaths, returning how many there are.
+    """
+
+    stops = Stop.objects.select_related("station", "city")
+    footpaths = get_footpaths(stops)
+
+    with transaction.atomic():
+        Footpath.objects.all().delete()
+        Footpath.objects.bulk_create(footpaths, batch_size=500)
+
+    logger.info("built %s footpaths" % len(footpaths))
+
+    return len(footpaths)
+
+
+def update_footpaths(stop_ids):
+    """
+    Replace the footpaths from and to the stops after they moved or their transfer time
+    changed, returning how many there are now.
+    """
+
+    stop_ids = set(stop_ids)
+    if not stop_ids:
+        return 0
+
+    footpaths = get_footpaths(Stop.objects.select_related("station", "city"), touching=stop_ids)
+
+    with transaction.atomic():
+        Footpath.objects.filter(Q(origin__in=stop_ids) | Q(destination__in=stop_ids)).delete()
+        Footpath.objects.bulk_create(footpaths, batch_size=500)
+
+    return len(footpaths)
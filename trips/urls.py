@@ -6,6 +6,7 @@ from .views import (
     PaymentView,
     SearchResultsView,
     SeatsView,
+    fare_calendar,
 )
 
 
@@ -14,6 +15,7 @@ app_name = "trips"
 urlpatterns = [
     path("results/", SearchResultsView.as_view(), name="search-results"),
     path("seats/", SeatsView.as_view(), name="seats"),
+    path("fare-calendar/", fare_calendar, name="fare-calendar"),
     path("order/", OrderView.as_view(), name="order"),
     path("payment/", PaymentView.as_view(), name="payment"),
     path("success/", PaymentSuccessView.as_view(), name="payment-success"),
@@ -1,13 +1,179 @@
+import logging
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
 from django.views.generic import TemplateView
 
+from trips.fares import get_month_grid
+from trips.forms import TripSearchForm
+from trips.models import DepartureLeg
+from trips.operators import search_operators, stream_operators
+from trips.roundtrip import search_round_trip
+from trips.search import get_search_results, resolve_place
+from trips.seats import SeatUnavailable, get_taken_seats, hold_seats
+
+
+logger = logging.getLogger(__name__)
+
+OPERATOR_TRIPS_MARKER = "<!-- operator trips -->"
+
 
 class SearchResultsView(TemplateView):
+    """
+    The trips on sale for the query of the search form, direct ones (see `trips.search`)
+    and with transfers (see `trips.connections`), plus the ones of the operators selling
+    through their own systems (see `trips.operators`). Identical searches at the same time
+    are computed once, see `trips.coalesce`. With a return date both ways are searched at
+    once and combined, see `trips.roundtrip`. The operators are only asked for the way there.
+
+    When operators are asked (and `TRIP_SEARCH_STREAMING` is on) the page is streamed: the
+    page with our own trips is sent right away and the trips of each operator are appended
+    as it answers, so the slowest one doesn't keep the buyer staring at a blank page.
+    """
+
     template_name = "trips/search_results.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        form = TripSearchForm(self.request.GET or None)
+        context["form"] = form
+
+        if form.is_valid():
+            query = form.cleaned_data
+            if query["return_date"]:
+                context.update(
+                    search_round_trip(query["origin"], query["destination"], query["departure"], query["return_date"])
+                )
+            else:
+                context.update(get_search_results(query["origin"], query["destination"], query["departure"]))
+            context["query"] = query
+            self.request.session["q"] = form.get_session_data()
+
+        return context
+
+    def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
+
+        if "query" in context and settings.TRIP_OPERATOR_ADAPTERS and settings.TRIP_SEARCH_STREAMING:
+            return self.stream_to_response(context)
+
+        if query := context.get("query"):
+            context["availability"] = search_operators(query["origin"], query["destination"], query["departure"])
+
+        return self.render_to_response(context)
+
+    def stream_to_response(self, context):
+        query = context["query"]
+        page = render_to_string(self.template_name, {**context, "streaming": True}, request=self.request)
+        head, __, tail = page.partition(OPERATOR_TRIPS_MARKER)
+
+        def stream():
+            yield head
+
+            found, partial = bool(context["results"] or context["connections"]), False
+            try:
+                for slug, trips, failure in stream_operators(query["origin"], query["destination"], query["departure"]):
+                    partial = partial or failure is not None
+                    if trips:
+                        found = True
+                        yield render_to_string("trips/includes/operator_trips.html", {"trips": trips, "query": query})
+            except Exception:
+                # The page is on its way, end it with what was found instead of cutting it off
+                logger.exception("streaming the operator trips failed")
+                partial = True
+
+            status = {"streaming": True, "empty": not found, "partial": partial}
+            yield render_to_string("trips/includes/operator_trips_status.html", status)
+            yield tail
+
+        response = StreamingHttpResponse(stream(), content_type="text/html; charset=utf-8")
+        response["X-Accel-Buffering"] = "no"  # nginx would hold the page until the last operator
+
+        return response
+
 
 class SeatsView(TemplateView):
+    """
+    The seats of the bus of a leg, the ones picked are held for the buyer while the order
+    is paid, see `trips.seats`.
+    """
+
     template_name = "trips/seats.html"
 
+    def get_leg(self):
+        leg_id = self.request.GET.get("leg")
+        if not leg_id or not leg_id.isdigit():
+            return None
+
+        return get_object_or_404(
+            DepartureLeg.objects.select_related("departure", "operator", "origin", "destination"), pk=leg_id
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        leg = self.get_leg()
+        if leg is not None:
+            taken = set(get_taken_seats(leg))
+            context["leg"] = leg
+            context["taken"] = sorted(taken)
+            context["seats"] = [(seat, seat in taken) for seat in range(1, leg.departure.seats + 1)]
+
+        return context
+
+    def post(self, request, *args, **kwargs):
+        leg = self.get_leg()
+        if leg is None:
+            return redirect("trips:search-results")
+
+        seats = [int(seat) for seat in request.POST.getlist("seats") if seat.isdigit()]
+
+        try:
+            # Picking again gives back the seats picked before, only once the new ones are held
+            hold = hold_seats(leg, seats, replaces=request.session.get("hold"))
+        except SeatUnavailable as error:
+            logger.info("seats %s of leg %s not available" % (error.seats, leg.pk))
+            messages.error(request, _("Esos asientos ya no están disponibles, elegí otros."))
+            return redirect(request.get_full_path())
+
+        request.session["hold"] = hold.token
+        request.session["leg"] = leg.pk
+
+        return redirect("trips:order")
+
+
+@require_GET
+@cache_control(max_age=60 * 5, public=True)  # five minutes
+def fare_calendar(request: HttpRequest) -> JsonResponse:
+    """
+    The cheapest fare of each day of a month between two places, for the date picker and
+    the route pages, see `trips.fares`. `month` defaults to the current one.
+
+    Ex: /fare-calendar/?origin=12&destination=34&month=2025-03
+    """
+
+    origin = resolve_place(request.GET.get("origin", "")[:100])
+    destination = resolve_place(request.GET.get("destination", "")[:100])
+    if origin is None or destination is None:
+        return JsonResponse({"error": "origin and destination are required"}, status=400)
+
+    try:
+        year, month = map(int, request.GET.get("month", f"{timezone.localdate():%Y-%m}").split("-"))
+        if not (1 <= year <= 9999 and 1 <= month <= 12):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "month must be YYYY-MM"}, status=400)
+
+    return JsonResponse(get_month_grid(origin, destination, year, month))
+
 
 class OrderView(TemplateView):
     template_name = "trips/order.html"